@@ -8,16 +8,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+from contextlib import asynccontextmanager
 
 from django.core.asgi import get_asgi_application
 from starlette.applications import Starlette
 from starlette.routing import Mount, Route
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware import Middleware
-from starlette.staticfiles import StaticFiles
 from django.conf import settings
 from pathlib import Path
-from django.contrib.staticfiles import finders
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djproject.settings")
 
@@ -27,20 +26,66 @@ django_application = get_asgi_application()
 # ───────────────────────────────────────────────
 # FastMCP Setup
 # ───────────────────────────────────────────────
+# fastmcp and the djmcp server (with the audit/drain/session/tracing modules
+# the /mcp app and its lifespan need) are imported here, since the app is
+# built at import time. Tool modules are imported on the first tools/list or
+# tools/call, the auth middleware and the metadata/health endpoints on the
+# first request (see mcp_app.lazy); `python manage.py mcp_startup_profile`
+# shows what start-up costs.
 from mcp_app.mcp_server import djmcp as mcp_instance  # your FastMCP object
 # from apps.mcp.auth_basic import BasicAuthMiddleware
 # from apps.mcp.auth_session import SessionAuthMiddleware
-from mcp_app.auth_middleware import CombinedAuthMiddleware
-from mcp_app.metadata import oauth_authorization_server, oauth_protected_resource
+from mcp_app.lazy import lazy_endpoint, lazy_middleware
+from mcp_app.sessions import SessionLimitMiddleware, session_table
+from mcp_app.drain import DrainMiddleware, drain_state
+from mcp_app import tracing
+from mcp_app.audit import audit_log
+
+oauth_authorization_server = lazy_endpoint("mcp_app.metadata.oauth_authorization_server")
+oauth_protected_resource = lazy_endpoint("mcp_app.metadata.oauth_protected_resource")
+healthz = lazy_endpoint("mcp_app.health.healthz")
+readyz = lazy_endpoint("mcp_app.health.readyz")
 
 # Optional CORS middleware
 middleware = [
+    Middleware(tracing.TracingMiddleware),  # root span per /mcp request (see mcp_app.tracing)
+    Middleware(DrainMiddleware, state=drain_state),  # refuses new sessions while shutting down
     Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
-    Middleware(CombinedAuthMiddleware),
+    Middleware(lazy_middleware("mcp_app.auth_middleware.CombinedAuthMiddleware")),
+    Middleware(SessionLimitMiddleware, table=session_table),  # needs scope["user"]
 ]
 
 # Create the FastMCP ASGI app (only once!)
 mcp_asgi_app = mcp_instance.http_app(path="/", middleware=middleware)
+session_table.attach(mcp_asgi_app)
+tracing.install()
+
+
+def make_lifespan(mcp_app):
+    """Lifespan for an app serving ``mcp_app``; mcp_run's workers use it too."""
+    @asynccontextmanager
+    async def lifespan(app):
+        from mcp_app.health import health_state
+
+        async with mcp_app.lifespan(app):  # ✅ ensures FastMCP session manager starts
+            session_table.start()
+            audit_log.start()  # batched ToolCallAudit writer (see mcp_app.audit)
+            drain_state.install_signal_handlers(session_table)
+            health_state.start(mcp_instance)  # warm-up in the background; /readyz is 503 until done
+            try:
+                yield
+            finally:
+                # normally already started by SIGTERM/SIGINT; waits up to MCP_DRAIN_TIMEOUT
+                await health_state.stop()
+                await drain_state.drain(session_table)
+                await session_table.stop()
+                await audit_log.stop()  # flush what is still queued
+
+    return lifespan
+
+
+lifespan = make_lifespan(mcp_asgi_app)
+
 
 # ───────────────────────────────────────────────
 # Compose Starlette ASGI app combining Django + MCP
@@ -52,19 +97,32 @@ application = Starlette(
               oauth_authorization_server, methods=["GET","OPTIONS"]),
         Route("/.well-known/oauth-protected-resource",
               oauth_protected_resource,  methods=["GET","OPTIONS"]),
+        # path-suffixed forms (RFC 8414 §3.1 / RFC 9728 §3.1) so clients find
+        # the documents on the first probe
+        Route("/.well-known/oauth-authorization-server/o",
+              oauth_authorization_server, methods=["GET","OPTIONS"]),
+        Route("/.well-known/oauth-protected-resource/mcp",
+              oauth_protected_resource,  methods=["GET","OPTIONS"]),
+
+        # liveness / readiness for the load balancer (see mcp_app.health)
+        Route("/healthz", healthz, methods=["GET", "HEAD"]),
+        Route("/readyz", readyz, methods=["GET", "HEAD"]),
 
         Mount("/mcp", mcp_asgi_app),  # /mcp endpoint for FastMCP tools
         Mount("/",    django_application),   # all other routes handled by Django
     ],
-    lifespan=mcp_asgi_app.lifespan  # ✅ ensures FastMCP session manager starts
+    lifespan=lifespan
 )
 
 
 # Static file serving logic
-# Serve static files (assumes collectstatic was run)
+# Serve static files (assumes collectstatic was run): precompressed .br/.gz
+# siblings, immutable caching for hashed names, small files kept in memory
 static_dir = settings.STATIC_ROOT
 if static_dir and Path(static_dir).exists():
+    from mcp_app.static import CachedStaticFiles
+
     application.routes.insert(
-        2,
-        Mount("/static", StaticFiles(directory=static_dir), name="static")
+        4,
+        Mount("/static", CachedStaticFiles(directory=static_dir), name="static")
     )
\ No newline at end of file
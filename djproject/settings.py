@@ -57,6 +57,43 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile (`python manage.py mcp_db_bench` measures it):
+# WAL so token/session reads never queue behind /o/token/ writes, pragmas run
+# on every new connection, persistent health-checked connections, and a
+# read-only alias that mcp_app.db.ReadOnlyRouter uses for auth/search reads.
+MCP_SQLITE_PRODUCTION = True
+MCP_SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",      # durable across app crashes; WAL fsyncs at checkpoints
+    "PRAGMA busy_timeout=5000",       # ms to wait for a lock instead of failing at once
+    "PRAGMA cache_size=-20000",       # ~20 MB page cache per connection
+    "PRAGMA mmap_size=268435456",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+]
+if MCP_SQLITE_PRODUCTION:
+    DATABASES["default"].update({
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "init_command": ";".join(MCP_SQLITE_PRAGMAS),
+            # take the write lock at BEGIN: avoids lock-upgrade deadlocks under WAL
+            "transaction_mode": "IMMEDIATE",
+        },
+    })
+    DATABASES["readonly"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": (BASE_DIR / "db.sqlite3").as_uri() + "?mode=ro",
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "init_command": ";".join(["PRAGMA query_only=1"] + [
+                p for p in MCP_SQLITE_PRAGMAS if "journal_mode" not in p and "synchronous" not in p
+            ]),
+        },
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ["mcp_app.db.ReadOnlyRouter"]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -81,6 +118,18 @@ STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# collectstatic writes hashed names plus .gz/.br siblings; served by
+# mcp_app.static.CachedStaticFiles from the ASGI app. With DEBUG off
+# {% static %} needs its manifest, so run collectstatic before starting
+# (launch.sh does).
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "mcp_app.static.CompressedManifestStaticFilesStorage"},
+}
+MCP_STATIC_CACHE_MAX_FILE_SIZE = 256 * 1024       # larger files stream from disk
+MCP_STATIC_CACHE_MAX_BYTES = 16 * 1024 * 1024     # in-memory LRU budget per worker
+MCP_STATIC_MAX_AGE = 3600                         # Cache-Control for non-hashed names
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = 'users.User'
@@ -97,4 +146,121 @@ OAUTH2_PROVIDER = {
     'ACCESS_TOKEN_MODEL': 'oauth2_provider.AccessToken',
     'REFRESH_TOKEN_MODEL': 'oauth2_provider.RefreshToken',
     'APPLICATION_MODEL': 'oauth2_provider.Application',
-}
\ No newline at end of file
+}
+
+# OAuth discovery (/.well-known/*). None = derive from the request's scheme/host.
+MCP_PUBLIC_BASE_URL = None         # e.g. "https://mcp.example.com"
+MCP_OAUTH_ISSUER = None            # defaults to MCP_PUBLIC_BASE_URL + "/o"
+MCP_RESOURCE_URL = None            # defaults to MCP_PUBLIC_BASE_URL + "/mcp/"
+MCP_OAUTH_METADATA_MAX_AGE = 3600
+
+# Streamable-HTTP sessions on /mcp (limits are per worker process)
+MCP_SESSION_MAX = 1000             # concurrent sessions
+MCP_SESSION_MAX_PER_USER = 20
+MCP_SESSION_IDLE_TIMEOUT = 1800    # seconds without a client request before reaping
+MCP_SESSION_EVICT_MIN_IDLE = 60    # only sessions idle this long are LRU-evicted when full
+MCP_SSE_KEEPALIVE = 15             # seconds between ": ping" comments on SSE streams
+
+# Graceful shutdown: refuse new sessions, hint SSE clients, wait for running tools
+MCP_DRAIN_TIMEOUT = 30             # seconds to wait for in-flight tool calls
+MCP_DRAIN_RETRY_MS = 2000          # SSE "retry:" hint / Retry-After sent while draining
+
+# /healthz and /readyz (see mcp_app/health.py)
+MCP_HEALTH_PROBE_TIMEOUT = 2.0     # seconds a readiness probe (database, session manager) may take
+
+# Rate limits on /mcp, shared by all workers on the node (see mcp_app/ratelimit.py)
+# Limits are (burst, requests per minute); None disables one kind of bucket
+MCP_RATELIMIT_ENABLED = True
+MCP_RATELIMIT_FILE = None          # None = /dev/shm/mcp-ratelimit-<hash of BASE_DIR and settings>, else run/ratelimit.bin
+MCP_RATELIMIT_SLOTS = 65536        # buckets in the shared table (24 bytes each)
+MCP_RATELIMIT_TOKEN = (60, 600)    # per bearer token
+MCP_RATELIMIT_USER = (120, 1200)   # per user, across all tokens and sessions
+MCP_RATELIMIT_TOOL = (30, 300)     # tools/call per user and tool
+MCP_RATELIMIT_TOOL_OVERRIDES = {}  # e.g. {"search_any": (10, 60)}
+
+# Audit log of djmcp tool calls (see mcp_app/audit.py), written in batches off the hot path
+MCP_AUDIT_ENABLED = True
+MCP_AUDIT_QUEUE_MAX = 10000        # records held in memory per worker
+MCP_AUDIT_BATCH = 200              # records per INSERT
+MCP_AUDIT_FLUSH_INTERVAL = 1.0     # seconds between writes when fewer than a batch are queued
+MCP_AUDIT_OVERLOAD_SAMPLE = 0.1    # share of successful calls kept once the queue is half full
+MCP_AUDIT_REDACT_KEYS = ["password", "passwd", "secret", "token", "authorization", "api_?key", "cookie", "credential"]
+MCP_AUDIT_MAX_VALUE = 500          # longer argument strings / error messages are truncated
+
+# Per-tool authorization (see mcp_app/permissions.py): @djmcp.tool(scopes=[...], permissions=[...])
+MCP_TOOL_DEFAULT_SCOPES = ["read"]      # scopes a tool requires when it declares none
+MCP_TOOL_PERMISSION_CACHE_TTL = 60      # seconds a user's Django permissions are cached per worker; changes wait this long
+
+# Oversized tool results are returned as spill:// resource links (see mcp_app/spill.py)
+MCP_SPILL_THRESHOLD = 256 * 1024   # characters of text returned inline; None/0 = never spill
+MCP_SPILL_PAGE_SIZE = 64 * 1024    # bytes per resources/read page (and max range length)
+MCP_SPILL_MAX_BYTES = 64 * 1024 * 1024  # spilled results kept; larger single results fail
+MCP_SPILL_TTL = 600                # seconds a spilled result stays readable
+MCP_SPILL_DIR = None               # None = memory per worker; a directory shares them across workers
+
+# Structured logging for the mcp.* loggers (see mcp_app/log.py): JSON lines written by
+# a background thread; the request path only enqueues
+MCP_LOG_LEVEL = "INFO"
+MCP_LOG_FILE = None                # None = stderr
+MCP_LOG_QUEUE_MAX = 10000          # records waiting for the sink; further ones are dropped
+MCP_LOG_SAMPLING = {               # share of records below WARNING kept, by logger prefix
+    "mcp.tools": 0.1,
+    "mcp.inspector.output": 0.05,
+    "mcp.server.lowlevel": 0.01,   # the MCP SDK's "Processing request of type ..." lines
+}
+MCP_LOG_REDACT_KEYS = ["password", "secret", "token", "authorization", "verifier", "api_?key", "cookie"]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "mcp": {
+            "()": "mcp_app.log.queue_handler",
+            "path": MCP_LOG_FILE,
+            "maxsize": MCP_LOG_QUEUE_MAX,
+            "sampling": MCP_LOG_SAMPLING,
+            "redact_keys": MCP_LOG_REDACT_KEYS,
+        },
+    },
+    "loggers": {
+        "mcp": {"handlers": ["mcp"], "level": MCP_LOG_LEVEL, "propagate": False},
+    },
+}
+
+# Request tracing on /mcp (see mcp_app/tracing.py, `manage.py mcp_traces`)
+MCP_TRACE_EXPORTER = "memory"      # "memory" (/mcp-demo/traces/), "file" (`mcp_traces`) or None
+MCP_TRACE_SAMPLE_RATE = 0.01       # share of ordinary traces kept
+MCP_TRACE_SLOW_MS = 1000           # traces this slow (or failed) are always kept
+MCP_TRACE_BUFFER = 500             # traces kept per worker by the "memory" exporter
+MCP_TRACE_FILE = BASE_DIR / "traces" / "mcp-traces.jsonl"
+MCP_TRACE_FILE_MAX_BYTES = 10 * 1024 * 1024
+MCP_TRACE_FILE_BACKUPS = 3
+
+# MCP Inspector processes started by the launcher (see mcp_app/inspector.py)
+MCP_INSPECTOR_COMMAND = None       # argv prefix; None = node_modules/.bin/mcp-inspector, else npx
+MCP_INSPECTOR_START_TIMEOUT = 60   # seconds to wait for the proxy token banner
+MCP_INSPECTOR_MAX_AGE = 8 * 3600   # running instances are stopped after this
+MCP_INSPECTOR_POOL_SIZE = 2        # instances kept pre-started once the launcher is opened (0 = off)
+MCP_INSPECTOR_POOL_RECYCLE = 3600  # idle pooled instances are replaced after this
+MCP_INSPECTOR_UI_PORT = 6274       # first UI port; each instance gets its own
+MCP_INSPECTOR_PROXY_PORT = 6277    # first proxy port
+MCP_INSPECTOR_PORT_MAX = 6400
+MCP_INSPECTOR_REGISTRY = BASE_DIR / "run" / "inspectors.json"  # ports/owners/pids shared by all workers
+MCP_INSPECTOR_TTL = 4 * 3600       # instances whose status page wasn't opened for this long are stopped
+MCP_INSPECTOR_MAX_PER_USER = 2     # a user's oldest instance is stopped when they launch one more
+
+# Authorization-code exchange (see mcp_app/oauth_exchange.py); our own /o/token/ is called in-process
+MCP_OAUTH_TOKEN_TIMEOUT = 10      # seconds, for token endpoints on other servers
+
+# search_any / search_project: largest `limit` a caller may ask for (formats: see mcp_app/encoding.py)
+MCP_SEARCH_MAX_LIMIT = 5000
+
+# Pooled client for services calling djmcp (mcp_app/mcp_client.py, McpPool.from_settings)
+MCP_CLIENT_POOL_SIZE = 4          # long-lived MCP sessions per pool
+MCP_CLIENT_MAX_CONCURRENCY = 16   # calls in flight across the pool
+MCP_CLIENT_TIMEOUT = 30           # seconds per call unless the call passes its own
+MCP_CLIENT_KEEPALIVE = 60         # seconds an idle HTTP connection is kept open
+
+# `python manage.py mcp_auth_bench` compares against this (written with --save, one per reference machine;
+# --ci fails when it is missing)
+MCP_AUTH_BENCH_BASELINE = BASE_DIR / "benchmarks" / "auth-baseline.json"
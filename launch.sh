@@ -13,9 +13,10 @@ export DJANGO_SETTINGS_MODULE=djproject.settings
 echo "Applying Django migrations..."
 python manage.py migrate
 
-# Collect static files (optional: only needed for prod)
-# echo "Collecting static files..."
-# python manage.py collectstatic --noinput
+# Collect static files: the manifest storage needs staticfiles.json once DEBUG
+# is off (also writes the .gz/.br siblings)
+echo "Collecting static files..."
+python manage.py collectstatic --noinput
 
 # Create demo superuser if not exists
 echo "Creating demo superuser (username: demo)..."
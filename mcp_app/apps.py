@@ -0,0 +1,60 @@
+import threading
+from importlib import import_module
+
+from django.apps import AppConfig, apps
+from django.conf import settings
+from django.utils.module_loading import autodiscover_modules
+
+
+class McpAppConfig(AppConfig):
+    """
+    Registry for djmcp tool modules and searchable models.
+
+    Nothing is imported in ``ready()``: tool modules (``<app>.mcp_tools`` for
+    every installed app, plus ``settings.MCP_TOOL_MODULES``) are imported the
+    first time djmcp lists or calls tools, and ``SEARCHABLE_MODELS`` entries
+    are resolved to model classes the first time each one is searched.
+    """
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "mcp_app"
+
+    def __init__(self, app_name, app_module):
+        super().__init__(app_name, app_module)
+        self._tools_loaded = False
+        self._tools_lock = threading.Lock()
+        self._searchable = {}
+
+    def load_tools(self):
+        """Import all tool modules once; later calls are a flag check."""
+        if self._tools_loaded:
+            return
+        with self._tools_lock:
+            if self._tools_loaded:
+                return
+            autodiscover_modules("mcp_tools")
+            for module in getattr(settings, "MCP_TOOL_MODULES", []):
+                import_module(module)
+            self._tools_loaded = True
+
+    def get_searchable(self, key):
+        """
+        Resolved ``SEARCHABLE_MODELS[key]`` with ``"model"`` as a class, or
+        None when the key is unknown or its app isn't installed.
+        """
+        if key in self._searchable:
+            return self._searchable[key]
+        from .mcp_search_registry import SEARCHABLE_MODELS
+
+        conf = SEARCHABLE_MODELS.get(key)
+        if conf is not None:
+            try:
+                conf = {**conf, "model": apps.get_model(conf["model"])}
+            except LookupError:
+                conf = None
+        self._searchable[key] = conf
+        return conf
+
+    def searchable_keys(self):
+        from .mcp_search_registry import SEARCHABLE_MODELS
+
+        return [key for key in SEARCHABLE_MODELS if self.get_searchable(key) is not None]
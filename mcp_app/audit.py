@@ -0,0 +1,186 @@
+# mcp_app/audit.py
+"""
+Audit trail of djmcp tool calls (ToolCallAudit), written off the hot path.
+
+``audit_log.record()`` runs in DjangoFastMCP._call_tool and only appends a
+redacted record to a bounded in-memory queue. A task started in the ASGI
+lifespan writes the queue with ``bulk_create`` every
+MCP_AUDIT_FLUSH_INTERVAL seconds, or as soon as MCP_AUDIT_BATCH records
+are waiting, so N tool calls cost one INSERT per batch instead of N.
+
+- overload: once half of MCP_AUDIT_QUEUE_MAX is in use, successful calls are
+  kept with probability MCP_AUDIT_OVERLOAD_SAMPLE; when the queue is full
+  they are dropped. Failed calls are always queued (evicting the oldest
+  successful record if need be). ``stats()`` counts what was sampled out.
+- redaction: argument keys matching MCP_AUDIT_REDACT_KEYS are replaced at
+  any depth, long strings are truncated to MCP_AUDIT_MAX_VALUE characters
+- shutdown: ``stop()`` flushes whatever is still queued
+"""
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from starlette.datastructures import Headers
+
+from .tracing import current_span
+
+logger = logging.getLogger("mcp.audit")
+
+REDACTED = "[redacted]"
+
+
+class AuditLog:
+    def __init__(self, enabled=True, queue_max=10000, batch=200, flush_interval=1.0,
+                 overload_sample=0.1, redact_keys=(), max_value=500):
+        self.enabled = enabled
+        self.queue_max = queue_max
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.overload_sample = overload_sample
+        self.redact = re.compile("|".join(redact_keys), re.IGNORECASE) if redact_keys else None
+        self.max_value = max_value
+        self._queue = deque()
+        self._wakeup = None
+        self._task = None
+        self.written_total = 0
+        self.sampled_out_total = 0
+        self.dropped_total = 0
+        self.failed_total = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            enabled=getattr(settings, "MCP_AUDIT_ENABLED", True),
+            queue_max=getattr(settings, "MCP_AUDIT_QUEUE_MAX", 10000),
+            batch=getattr(settings, "MCP_AUDIT_BATCH", 200),
+            flush_interval=getattr(settings, "MCP_AUDIT_FLUSH_INTERVAL", 1.0),
+            overload_sample=getattr(settings, "MCP_AUDIT_OVERLOAD_SAMPLE", 0.1),
+            redact_keys=getattr(settings, "MCP_AUDIT_REDACT_KEYS", ()),
+            max_value=getattr(settings, "MCP_AUDIT_MAX_VALUE", 500),
+        )
+
+    # ── hot path ───────────────────────────────────────────────
+    def record(self, tool, arguments, duration, error=None):
+        """Queue one tool call; never blocks and never touches the database."""
+        if not self.enabled:
+            return
+        if error is None and len(self._queue) >= self.queue_max // 2:
+            if len(self._queue) >= self.queue_max or random.random() >= self.overload_sample:
+                self.sampled_out_total += 1
+                return
+        if len(self._queue) >= self.queue_max:
+            # an error record displaces the oldest success; if there is none it is lost
+            for i, queued in enumerate(self._queue):
+                if not queued["error"]:
+                    del self._queue[i]
+                    break
+            else:
+                self.dropped_total += 1
+                return
+
+        user_id, session_id = request_identity()
+        span = current_span()
+        self._queue.append({
+            "created": datetime.now(timezone.utc),
+            "tool": tool,
+            "user_id": user_id,
+            "session_id": session_id,
+            "arguments": self.scrub(arguments or {}),
+            "outcome": "error" if error is not None else "ok",
+            "error": str(error)[:self.max_value] if error is not None else "",
+            "duration_ms": round(duration * 1000, 3),
+            "trace_id": span.trace.trace_id if span is not None else "",
+        })
+        if len(self._queue) >= self.batch and self._wakeup is not None:
+            self._wakeup.set()
+
+    def scrub(self, value):
+        if isinstance(value, dict):
+            return {k: REDACTED if self.redact and self.redact.search(str(k)) else self.scrub(v)
+                    for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.scrub(v) for v in value]
+        if isinstance(value, str) and len(value) > self.max_value:
+            return value[:self.max_value] + "…"
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        return self.scrub(str(value))
+
+    # ── writer ─────────────────────────────────────────────────
+    def start(self):
+        if self._task is None and self.enabled:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._flush_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._queue:
+            rows = [self._queue.popleft() for _ in range(min(self.batch, len(self._queue)))]
+            try:
+                await sync_to_async(self._write, thread_sensitive=False)(rows)
+            except Exception:
+                self.failed_total += len(rows)
+                logger.exception("Writing %d audit records failed", len(rows))
+                return
+            self.written_total += len(rows)
+
+    @staticmethod
+    def _write(rows):
+        from .models import ToolCallAudit
+
+        close_old_connections()
+        ToolCallAudit.objects.bulk_create([ToolCallAudit(**row) for row in rows])
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "queued": len(self._queue),
+            "queue_max": self.queue_max,
+            "written_total": self.written_total,
+            "sampled_out_total": self.sampled_out_total,
+            "dropped_total": self.dropped_total,
+            "failed_total": self.failed_total,
+        }
+
+
+def request_identity():
+    """(user id, MCP session id) of the /mcp request behind the current tool call."""
+    from mcp.server.lowlevel.server import request_ctx
+
+    try:
+        scope = getattr(request_ctx.get().request, "scope", None) or {}
+    except LookupError:
+        return None, ""
+    if "headers" not in scope:   # stdio / in-memory transports
+        return None, ""
+    user = scope.get("user")
+    user_id = user.pk if getattr(user, "is_authenticated", False) else None
+    return user_id, Headers(scope=scope).get("mcp-session-id", "")[:64]
+
+
+audit_log = AuditLog.from_settings()
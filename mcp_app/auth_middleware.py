@@ -1,4 +1,5 @@
-import typing, logging
+import hashlib, typing, logging, json
+from starlette.authentication import AuthCredentials
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
@@ -7,35 +8,89 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.sessions.backends.db import SessionStore
 from asgiref.sync import sync_to_async
+from django.db import close_old_connections
 from oauth2_provider.models import AccessToken
 
+from .db import use_readonly
+from .inspector import get_supervisor
+from .ratelimit import get_limiter
+from .tracing import current_span, tracer
+
 logger = logging.getLogger("mcp.auth")
 User = get_user_model()
 
 async def get_user_from_session(session_key: str) -> typing.Union[User, AnonymousUser]:
     def _load():
-        store = SessionStore(session_key)
-        data = store.load()
-        uid = data.get("_auth_user_id")
-        if uid:
-            try:
-                return User.objects.get(pk=uid)
-            except User.DoesNotExist:
-                pass
+        close_old_connections()
+        with use_readonly():
+            store = SessionStore(session_key)
+            data = store.load()
+            uid = data.get("_auth_user_id")
+            if uid:
+                try:
+                    return User.objects.get(pk=uid)
+                except User.DoesNotExist:
+                    pass
         return AnonymousUser()
     return await sync_to_async(_load, thread_sensitive=True)()
 
-async def get_user_from_bearer(token: str) -> typing.Union[User, AnonymousUser]:
+async def get_user_from_bearer(token: str) -> typing.Tuple[typing.Union[User, AnonymousUser], typing.List[str]]:
+    """The token's user and scopes (AnonymousUser and [] for an unknown or expired token)."""
+    # token_checksum is the unique index; "token" itself isn't indexed
+    return await get_user_from_token_checksum(hashlib.sha256(token.encode("utf-8")).hexdigest())
+
+async def get_user_from_token_checksum(checksum: str) -> typing.Tuple[typing.Union[User, AnonymousUser], typing.List[str]]:
     def _load():
+        # /mcp requests bypass Django's request signals, so apply
+        # CONN_MAX_AGE / CONN_HEALTH_CHECKS to the shared thread's connections here
+        close_old_connections()
         try:
-            tok = AccessToken.objects.select_related("user").get(token=token)
-            if tok.is_valid():
-                return tok.user
+            with use_readonly():
+                tok = AccessToken.objects.select_related("user").get(token_checksum=checksum)
+                if tok.is_valid():
+                    return tok.user, tok.scope.split()
         except Exception as e:
             logger.warning("DOT lookup error: %s", e)
-        return AnonymousUser()
+        return AnonymousUser(), []
     return await sync_to_async(_load, thread_sensitive=True)()
 
+async def get_user_from_proxy_session(session_token: str) -> typing.Tuple[typing.Union[User, AnonymousUser], typing.List[str], typing.Optional[str]]:
+    """
+    User, scopes and access-token checksum behind an Inspector's session
+    token: the token its registry entry was bound to at launch or hand-off.
+    AnonymousUser, [] and None for an unknown, unbound or stopped instance.
+    """
+    entry = await sync_to_async(get_supervisor().registry.by_session, thread_sensitive=False)(session_token)
+    if entry is None:
+        return AnonymousUser(), [], None
+    user, scopes = await get_user_from_token_checksum(entry["token_checksum"])
+    return user, scopes, entry["token_checksum"]
+
+async def called_tools(request: Request) -> typing.List[str]:
+    """Names of the tools a JSON-RPC POST (single or batch) calls; [] for anything else."""
+    if request.method != "POST":
+        return []
+    body = await request.body()   # cached; the MCP app reads it again
+    if b"tools/call" not in body:
+        return []
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return []
+    messages = payload if isinstance(payload, list) else [payload]
+    return [
+        str(m["params"]["name"]) for m in messages
+        if isinstance(m, dict) and m.get("method") == "tools/call"
+        and isinstance(m.get("params"), dict) and "name" in m["params"]
+    ]
+
+def _tag(span, auth_method, user):
+    if span is not None:
+        span.set("mcp.auth.method", auth_method)
+        span.set("mcp.auth.authenticated", not isinstance(user, AnonymousUser))
+        if not isinstance(user, AnonymousUser):
+            span.set("enduser.id", str(user.pk))
+
 class CombinedAuthMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         path = request.url.path
@@ -46,17 +101,14 @@ class CombinedAuthMiddleware(BaseHTTPMiddleware):
             or request.query_params.get("mcp_proxy_session_token")
         )
 
-        # 1) Trust proxy-authenticated requests
+        # 1) Inspector instances: the session token maps, through the
+        #    Inspector registry, to the access token the instance was bound to
         if proxy_token:
-            response = await call_next(request)
-            if response.status_code != 200:
-                if hasattr(response, "body"):
-                    # non-stream response: log body
-                    body = await response.body()
-                    logger.error("Proxy-forwarded MCP error %s: %s", response.status_code, body)
-                else:
-                    logger.error("Proxy-forwarded MCP error %s (streaming response)", response.status_code)
-            return response
+            with tracer.span("mcp.auth") as span:
+                user, scopes, token_checksum = await get_user_from_proxy_session(proxy_token)
+                _tag(span, "proxy", user)
+            return await self._authorized(request, call_next, user, AuthCredentials(scopes),
+                                          token_checksum=token_checksum)
 
         # 2) Allow metadata discovery
         if path.startswith("/.well-known/"):
@@ -67,7 +119,7 @@ class CombinedAuthMiddleware(BaseHTTPMiddleware):
             # Required by FastMCP to establish streaming
             request.scope["query_string"] = b"transport=streamable-http"
             response = await call_next(request)
-            if response.status_code != 200:
+            if response.status_code >= 400:
                 if hasattr(response, "body"):
                     body = await response.body()
                     logger.error("Stream handshake error %s: %s", response.status_code, body)
@@ -75,16 +127,25 @@ class CombinedAuthMiddleware(BaseHTTPMiddleware):
                     logger.error("Stream handshake error %s (streaming response)", response.status_code)
             return response
 
-        # 4) Bearer token authentication
-        auth_header = request.headers.get("Authorization", "")
-        parts = auth_header.split(None, 1)
-        if len(parts) == 2 and parts[0].lower() == "bearer":
-            user = await get_user_from_bearer(parts[1].strip())
-        else:
-            # 5) Session cookie fallback
-            session_key = request.cookies.get(settings.SESSION_COOKIE_NAME)
-            user = await get_user_from_session(session_key) if session_key else AnonymousUser()
+        with tracer.span("mcp.auth") as span:
+            # 4) Bearer token authentication
+            auth_header = request.headers.get("Authorization", "")
+            parts = auth_header.split(None, 1)
+            bearer = credentials = None
+            if len(parts) == 2 and parts[0].lower() == "bearer":
+                auth_method = "bearer"
+                bearer = parts[1].strip()
+                user, scopes = await get_user_from_bearer(bearer)
+                credentials = AuthCredentials(scopes)
+            else:
+                # 5) Session cookie fallback
+                auth_method = "session"
+                session_key = request.cookies.get(settings.SESSION_COOKIE_NAME)
+                user = await get_user_from_session(session_key) if session_key else AnonymousUser()
+            _tag(span, auth_method, user)
+        return await self._authorized(request, call_next, user, credentials, bearer)
 
+    async def _authorized(self, request, call_next, user, credentials, bearer=None, token_checksum=None):
         # 6) Reject anonymous
         if isinstance(user, AnonymousUser):
             return Response(
@@ -93,10 +154,25 @@ class CombinedAuthMiddleware(BaseHTTPMiddleware):
                 content="Authentication required",
             )
 
-        # 7) Authenticated tool calls
+        # 7) Token / user / tool rate limits shared by all workers (see ratelimit.py)
+        limit = get_limiter().check(token=bearer, user_id=user.pk, tools=await called_tools(request),
+                                    token_checksum=token_checksum)
+        if limit is not None and not limit.allowed:
+            logger.warning("Rate limit %s exceeded by user %s", limit.scope, user.pk)
+            span = current_span()
+            if span is not None:
+                span.set("mcp.ratelimit.scope", limit.scope)
+            return Response(status_code=429, headers=limit.headers(),
+                            content=f"Rate limit exceeded ({limit.scope})")
+
+        # 8) Authenticated tool calls; token scopes gate tools (see permissions.py)
         request.scope["user"] = user
+        if credentials is not None:
+            request.scope["auth"] = credentials
         response = await call_next(request)
-        if response.status_code != 200:
+        if limit is not None:
+            response.headers.update(limit.headers())
+        if response.status_code >= 400:
             if hasattr(response, "body"):
                 body = await response.body()
                 logger.error("Authenticated MCP error %s: %s", response.status_code, body)
@@ -0,0 +1,57 @@
+# mcp_app/db.py
+"""
+Read routing for the production SQLite profile (MCP_SQLITE_PRODUCTION).
+
+Code that only reads - the per-request token/session lookups and the search
+tools - runs inside ``use_readonly()``; ReadOnlyRouter then sends its queries
+to the "readonly" alias, a ``mode=ro`` connection to the same database file.
+Under WAL those reads never wait for the connection that is writing tokens,
+and ``PRAGMA query_only`` makes any accidental write fail loudly. Writes, and
+reads outside ``use_readonly()``, stay on "default".
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+
+READONLY_ALIAS = "readonly"
+
+_readonly = contextvars.ContextVar("mcp_db_readonly", default=False)
+
+
+@contextmanager
+def use_readonly():
+    """Route ORM reads in this block (and threads it spawns via asgiref) to "readonly"."""
+    token = _readonly.set(True)
+    try:
+        yield
+    finally:
+        _readonly.reset(token)
+
+
+class ReadOnlyRouter:
+    def __init__(self):
+        self.enabled = READONLY_ALIAS in settings.DATABASES
+
+    def db_for_read(self, model, **hints):
+        if self.enabled and _readonly.get():
+            return READONLY_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Instances loaded through "readonly" are saved through "default"
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db == READONLY_ALIAS:
+            return "default"
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database file
+        if {obj1._state.db, obj2._state.db} <= {"default", READONLY_ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == READONLY_ALIAS:
+            return False
+        return None
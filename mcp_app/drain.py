@@ -0,0 +1,168 @@
+# mcp_app/drain.py
+"""
+Graceful drain for the composed ASGI app.
+
+uvicorn closes its listeners on SIGTERM/SIGINT but then waits for every open
+connection - including SSE streams that never end - before running the
+lifespan shutdown. So the drain starts from the signal itself:
+
+1. new sessions are refused with 503 + Retry-After
+2. open SSE streams get a ``retry:`` hint so clients back off, not stampede
+3. running tool calls get up to MCP_DRAIN_TIMEOUT seconds to finish and
+   deliver their responses
+4. remaining sessions are terminated, which ends their streams and lets
+   uvicorn finish shutting down
+
+The hint is a complete SSE message of its own, sent between the events
+sse-starlette writes. Taking the exit flag over from sse-starlette uses
+``AppStatus`` of the version pinned in requirements.txt (terminating the
+sessions relies on the SDK internals sessions.py checks); without it the
+lifespan refuses to start.
+"""
+import asyncio
+import json
+import logging
+import signal
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from sse_starlette.sse import AppStatus
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+logger = logging.getLogger("mcp.drain")
+
+
+class DrainState:
+    def __init__(self):
+        self.draining = False
+        self.in_flight = 0
+        # send callable -> request method, for every open SSE response
+        self._streams = {}
+        self._task = None
+        self._loop = None
+
+    @property
+    def open_streams(self):
+        return len(self._streams)
+
+    @asynccontextmanager
+    async def track_tool(self):
+        """Count a running tool call (wraps DjangoFastMCP._call_tool)."""
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def install_signal_handlers(self, sessions):
+        """Chain SIGTERM/SIGINT so the drain starts before uvicorn waits on streams."""
+        if not (callable(getattr(AppStatus, "disable_automatic_graceful_drain", None))
+                and hasattr(AppStatus, "should_exit")):
+            raise ImproperlyConfigured(
+                "Graceful drain needs sse_starlette.sse.AppStatus.disable_automatic_graceful_drain(); "
+                "install the sse-starlette version pinned in requirements.txt")
+        self._loop = asyncio.get_running_loop()
+        # sse-starlette would otherwise cut every stream (and the tool calls
+        # answering on them) the moment uvicorn sees the signal; _drain()
+        # hands the exit flag back once in-flight work is done.
+        AppStatus.disable_automatic_graceful_drain()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                previous = signal.getsignal(sig)
+            except ValueError:  # not the main thread
+                return
+
+            def handler(signum, frame, previous=previous):
+                self._loop.call_soon_threadsafe(self.start, sessions)
+                if callable(previous):
+                    previous(signum, frame)
+
+            signal.signal(sig, handler)
+
+    def start(self, sessions):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._drain(sessions))
+        return self._task
+
+    async def drain(self, sessions):
+        await self.start(sessions)
+
+    def _busy(self):
+        # POST streams carry responses to requests already accepted; the
+        # standalone GET stream of a session never ends on its own.
+        return self.in_flight or any(m != "GET" for m in self._streams.values())
+
+    async def _drain(self, sessions):
+        timeout = getattr(settings, "MCP_DRAIN_TIMEOUT", 30)
+        retry_ms = getattr(settings, "MCP_DRAIN_RETRY_MS", 2000)
+        self.draining = True
+        logger.info("Draining: %d tool call(s) running, %d SSE stream(s), %d session(s)",
+                    self.in_flight, len(self._streams), len(sessions))
+
+        hint = {"type": "http.response.body", "body": f"retry: {retry_ms}\n\n".encode(), "more_body": True}
+        for send in list(self._streams):
+            try:
+                await send(hint)
+            except Exception:
+                self._streams.pop(send, None)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._busy() and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self._busy():
+            logger.warning("Drain deadline (%ss) hit with %d tool call(s) still running",
+                           timeout, self.in_flight)
+        await sessions.close_all("server draining")
+        AppStatus.should_exit = True
+        logger.info("Drain complete")
+
+
+drain_state = DrainState()
+
+
+class DrainMiddleware:
+    """
+    Pure ASGI middleware: tracks open SSE responses and, while draining,
+    refuses requests that would open a new session.
+    """
+
+    def __init__(self, app, state=None):
+        self.app = app
+        self.state = state or drain_state
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = self.state
+        if state.draining and scope["method"] == "POST" and "mcp-session-id" not in Headers(scope=scope):
+            retry_after = max(1, getattr(settings, "MCP_DRAIN_RETRY_MS", 2000) // 1000)
+            body = {"jsonrpc": "2.0", "id": "server-error",
+                    "error": {"code": -32000, "message": "Server is restarting; retry shortly"}}
+            response = Response(json.dumps(body), status_code=503, media_type="application/json",
+                                headers={"Retry-After": str(retry_after), "Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                content_type = Headers(raw=message.get("headers", [])).get("content-type", "")
+                if content_type.startswith("text/event-stream"):
+                    streaming = True
+                    state._streams[send] = scope["method"]
+            await send(message)
+            if streaming and message["type"] == "http.response.body" and not message.get("more_body"):
+                state._streams.pop(send, None)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if streaming:
+                state._streams.pop(send, None)
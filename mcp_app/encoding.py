@@ -0,0 +1,96 @@
+# mcp_app/encoding.py
+"""
+Encoders for djmcp tool results.
+
+- ``dumps``   compact JSON, through orjson when it is installed and through
+              pydantic_core (fastmcp's own encoder, without its indent=2)
+              otherwise. djmcp uses it as its tool_serializer.
+- ``table``   a tabular result in the format the caller asked for:
+
+    rows      {"results": [{"name": ..., "url": ...}, ...]}
+              one object per row; the default, and what clients always got
+    columns   {"fields": ["name", "url"], "columns": [[names...], [paths...]],
+               "prefixes": {"url": "https://psm.example/projects/"}, "count": n}
+              keys are sent once instead of once per row; for the fields the
+              caller names in ``prefixed``, the longest common prefix ending
+              in "/" is sent once under "prefixes" and cut from every value
+    msgpack   the columns document MessagePack-encoded, returned as an
+              embedded resource blob (application/vnd.msgpack); needs the
+              msgpack package, so ``formats()`` leaves it out without it
+
+Tools encode in the worker thread that ran the query and return the encoded
+text (or resource), so fastmcp's serializer never sees thousands of rows on
+the event loop.
+"""
+import base64
+import os
+
+import pydantic_core
+from fastmcp.exceptions import ToolError
+from mcp.types import BlobResourceContents, EmbeddedResource
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; pydantic_core is always there
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; the "msgpack" format is then unavailable
+    msgpack = None
+
+MSGPACK_MIME = "application/vnd.msgpack"
+
+
+def _default(obj):
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    return str(obj)
+
+
+def dumps(obj):
+    """``obj`` as compact JSON text."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:   # e.g. integers beyond 64 bits
+            pass
+    return pydantic_core.to_json(obj, fallback=_default).decode()
+
+
+def formats():
+    return ("rows", "columns", "msgpack") if msgpack is not None else ("rows", "columns")
+
+
+def check_format(fmt):
+    if fmt not in formats():
+        raise ToolError(f"Unknown format {fmt!r}; this server supports {', '.join(formats())}")
+
+
+def table(fields, rows, fmt="rows", uri="table://result", prefixed=()):
+    """
+    Encode ``rows`` (sequences ordered like ``fields``) as ``fmt``. Returns
+    JSON text, or an EmbeddedResource at ``uri`` for msgpack. ``prefixed``
+    names string fields whose shared prefix the columnar formats send once.
+    """
+    check_format(fmt)
+    if fmt == "rows":
+        return dumps({"results": [dict(zip(fields, row)) for row in rows]})
+
+    columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in fields]
+    prefixes = {}
+    for field, column in zip(fields, columns):
+        if field in prefixed and column and all(isinstance(value, str) for value in column):
+            prefix = os.path.commonprefix(column)
+            prefix = prefix[:prefix.rfind("/") + 1]
+            if prefix:
+                prefixes[field] = prefix
+                column[:] = [value[len(prefix):] for value in column]
+    document = {"fields": list(fields), "columns": columns, "count": len(rows)}
+    if prefixes:
+        document["prefixes"] = prefixes
+    if fmt == "columns":
+        return dumps(document)
+    blob = msgpack.packb(document, default=_default, use_bin_type=True)
+    return EmbeddedResource(type="resource", resource=BlobResourceContents(
+        uri=uri, mimeType=MSGPACK_MIME, blob=base64.b64encode(blob).decode("ascii")))
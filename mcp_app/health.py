@@ -0,0 +1,219 @@
+# mcp_app/health.py
+"""
+Liveness and readiness for the composed ASGI app.
+
+- ``/healthz``  200 while the event loop answers; no dependency is touched,
+  so a slow database never gets a worker restarted
+- ``/readyz``   200 only once the warm-up has finished, the database answers
+  within MCP_HEALTH_PROBE_TIMEOUT, the streamable-http session manager is
+  running and the worker isn't draining; 503 otherwise. The body reports
+  each probe's latency and how long every warm-up step took.
+
+The database probe runs on its own thread and connection, never on the
+shared sync thread the auth lookups use. A probe that outlives its timeout
+keeps running (a thread can't be cancelled); until it finishes, further
+probes fail at once instead of queueing behind it.
+
+The warm-up runs as a task started in the lifespan, so the worker accepts
+connections (and answers probes with "warming") right away. It does what
+the first requests after a deploy would otherwise pay for:
+
+- database   open the "default" and "readonly" connections on the thread
+             the auth lookups run on
+- auth       import the auth middleware and run the bearer-token and
+             session queries once; open the shared rate-limit table
+- metadata   import the metadata module and, when MCP_PUBLIC_BASE_URL is
+             set, build and cache the OAuth discovery documents; without it
+             the base URL comes from each request's Host, which isn't known
+             yet, so nothing is cached
+- tools      import the tool modules, compile the scope/permission table
+             (see permissions.py) and resolve the searchable models
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, connections
+from starlette.responses import JSONResponse
+
+from .db import READONLY_ALIAS, use_readonly
+
+logger = logging.getLogger("mcp.health")
+_MISSING = object()
+
+
+def _ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+class HealthState:
+    def __init__(self, probe_timeout=2.0):
+        self.probe_timeout = probe_timeout
+        self.warmed = False
+        self.warmup = {}            # step -> ms, or the error message
+        self.warmup_failed = False
+        self._task = None
+        self._db_probe = None       # in-flight database probe
+        self._db_executor = None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(probe_timeout=getattr(settings, "MCP_HEALTH_PROBE_TIMEOUT", 2.0))
+
+    # ── warm-up ────────────────────────────────────────────────
+    def start(self, mcp):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._warm_up(mcp))
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._db_executor is not None:
+            self._db_executor.shutdown(wait=False)
+            self._db_executor = None
+
+    async def _warm_up(self, mcp):
+        started = time.perf_counter()
+        steps = [
+            ("database", sync_to_async(_warm_database, thread_sensitive=True)),
+            ("auth", sync_to_async(_warm_auth, thread_sensitive=True)),
+            ("metadata", sync_to_async(_warm_metadata, thread_sensitive=False)),
+            ("tools", lambda: _warm_tools(mcp)),
+        ]
+        for name, step in steps:
+            step_started = time.perf_counter()
+            try:
+                await step()
+                self.warmup[name] = _ms(step_started)
+            except Exception as exc:
+                # readiness still follows the live probes; a broken database fails those too
+                self.warmup[name] = f"failed: {exc}"
+                self.warmup_failed = True
+                logger.exception("Warm-up step %s failed", name)
+        self.warmup["total"] = _ms(started)
+        self.warmed = True
+        logger.info("Warm-up done in %.1f ms", self.warmup["total"], extra={"warmup": dict(self.warmup)})
+
+    # ── probes ─────────────────────────────────────────────────
+    async def probe_database(self):
+        started = time.perf_counter()
+        if self._db_probe is not None and not self._db_probe.done():
+            return {"ok": False, "ms": 0.0, "error": "previous probe still running"}
+        if self._db_executor is None:
+            self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mcp-health-db")
+        self._db_probe = asyncio.ensure_future(
+            sync_to_async(_select_one, thread_sensitive=False, executor=self._db_executor)())
+        self._db_probe.add_done_callback(_consume)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._db_probe), timeout=self.probe_timeout)
+        except asyncio.TimeoutError:
+            return {"ok": False, "ms": _ms(started), "error": "timeout"}
+        except Exception as exc:
+            return {"ok": False, "ms": _ms(started), "error": str(exc)}
+        return {"ok": True, "ms": _ms(started)}
+
+    async def probe_sessions(self, sessions):
+        """
+        Whether the session manager's task group, where session servers run,
+        is up and not being cancelled. Read-only: nothing is started in it.
+        """
+        started = time.perf_counter()
+        manager = sessions.manager
+        task_group = getattr(manager, "_task_group", _MISSING) if manager is not None else None
+        if task_group is _MISSING:
+            # an SDK without the attribute is refused at startup (see sessions.check_sdk_internals)
+            return {"ok": False, "ms": 0.0, "error": "session manager internals unavailable"}
+        if task_group is None:
+            return {"ok": False, "ms": 0.0, "error": "session manager not running"}
+        if task_group.cancel_scope.cancel_called:
+            return {"ok": False, "ms": _ms(started), "error": "session manager shutting down"}
+        return {"ok": True, "ms": _ms(started), "sessions": len(sessions)}
+
+    async def readiness(self, sessions, drain):
+        if drain.draining:
+            return "draining", {}
+        if not self.warmed:
+            return "warming", {}
+        checks = dict(zip(("database", "sessions"), await asyncio.gather(
+            self.probe_database(), self.probe_sessions(sessions))))
+        return ("ready" if all(c["ok"] for c in checks.values()) else "failing"), checks
+
+
+def _consume(future):
+    """Retrieve the outcome of a probe nobody awaits any more (it timed out)."""
+    if not future.cancelled():
+        future.exception()
+
+
+def _select_one():
+    close_old_connections()
+    with connections["default"].cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def _warm_database():
+    close_old_connections()
+    for alias in ("default", READONLY_ALIAS):
+        if alias in connections:
+            connections[alias].ensure_connection()
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+
+
+def _warm_auth():
+    from django.contrib.sessions.backends.db import SessionStore
+    from oauth2_provider.models import AccessToken
+
+    from .auth_middleware import CombinedAuthMiddleware  # noqa: F401  (import cost only)
+    from .ratelimit import get_limiter
+
+    with use_readonly():
+        AccessToken.objects.select_related("user").filter(token_checksum="0" * 64).first()
+        SessionStore("warm-up").load()
+    limiter = get_limiter()
+    if limiter.enabled:
+        limiter.buckets._open()
+
+
+def _warm_metadata():
+    from . import metadata
+
+    base = getattr(settings, "MCP_PUBLIC_BASE_URL", None)
+    if base:
+        metadata._prebuilt("as", base.rstrip("/"))
+        metadata._prebuilt("pr", base.rstrip("/"))
+
+
+async def _warm_tools(mcp):
+    from .permissions import tool_policy
+
+    await sync_to_async(apps.get_app_config("mcp_app").load_tools, thread_sensitive=False)()
+    tool_policy.compile(await mcp.get_tools())
+    await sync_to_async(apps.get_app_config("mcp_app").searchable_keys, thread_sensitive=False)()
+
+
+health_state = HealthState.from_settings()
+
+
+# ── endpoints ──────────────────────────────────────────────────
+async def healthz(request):
+    return JSONResponse({"status": "ok"}, headers={"Cache-Control": "no-store"})
+
+
+async def readyz(request):
+    from .drain import drain_state
+    from .sessions import session_table
+
+    status, checks = await health_state.readiness(session_table, drain_state)
+    body = {"status": status, "checks": checks, "warmup": health_state.warmup}
+    return JSONResponse(body, status_code=200 if status == "ready" else 503,
+                        headers={"Cache-Control": "no-store"})
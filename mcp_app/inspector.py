@@ -0,0 +1,461 @@
+# mcp_app/inspector.py
+"""
+Supervisor for the MCP Inspector processes started from the launcher.
+
+``launch()`` spawns the Inspector CLI in its own process group and returns at
+once. One daemon thread multiplexes the stdout pipes of every instance with a
+selector and:
+
+- captures ``MCP_PROXY_AUTH_TOKEN`` from the startup banner, failing the
+  start if it hasn't appeared after MCP_INSPECTOR_START_TIMEOUT seconds
+- keeps draining output afterwards, so a chatty Inspector never blocks on a
+  full pipe
+- notices processes that exit, stops instances older than
+  MCP_INSPECTOR_MAX_AGE and forgets finished ones after a short linger
+
+Views poll ``lookup()``; nothing waits on the Inspector in a request.
+
+Warm pool: after ``warm(cmd)`` the same thread keeps MCP_INSPECTOR_POOL_SIZE
+instances started ahead of time and recycles idle ones after
+MCP_INSPECTOR_POOL_RECYCLE seconds. ``checkout()`` hands a ready one to a
+user; ``bind()`` (or ``launch(access_token=...)``) ties an instance to the
+user's access token. Every instance is started with its own
+``X-MCP-Proxy-Session-Token`` header, so a pre-started process needs no
+bearer token on its command line: /mcp resolves the session token through
+the registry to the bound access token. The server URL, transport and proxy
+address travel in the UI link (``inspector_ui_url()``); the OAuth redirect
+is the instance's own UI port (``InspectorInstance.redirect_uri``).
+
+Many users' instances run side by side: ports, owners and pids live in the
+cross-process InspectorRegistry (see inspector_registry.py), which also
+reclaims instances idle for MCP_INSPECTOR_TTL.
+"""
+import atexit
+import logging
+import os
+import re
+import secrets
+import selectors
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+
+from .inspector_registry import InspectorRegistry, kill_group
+
+logger = logging.getLogger("mcp.inspector")
+output_logger = logging.getLogger("mcp.inspector.output")   # chatty; sampled by MCP_LOG_SAMPLING
+
+TOKEN_RE = re.compile(r"MCP_PROXY_AUTH_TOKEN=([0-9a-f]+)")
+SESSION_HEADER = "X-MCP-Proxy-Session-Token"
+CALLBACK_PATH = "/auth/callback"
+KILL_GRACE = 5.0        # seconds between SIGTERM and SIGKILL
+LINGER = 300.0          # keep finished instances around so status pages can show why
+POOL_BACKOFF = 30.0     # pause refilling the pool after a pooled start fails
+REAP_INTERVAL = 30.0    # seconds between registry sweeps
+
+
+def inspector_command():
+    """
+    argv prefix that runs the Inspector CLI: MCP_INSPECTOR_COMMAND, else the
+    locally installed binary (``npm install`` from package.json), else npx -
+    which resolves the package on every start.
+    """
+    command = getattr(settings, "MCP_INSPECTOR_COMMAND", None)
+    if command:
+        return list(command)
+    local = Path(settings.BASE_DIR) / "node_modules" / ".bin" / "mcp-inspector"
+    if local.exists():
+        return [str(local)]
+    return ["npx", "@modelcontextprotocol/inspector"]
+
+
+def inspector_ui_url(status, host="127.0.0.1", **params):
+    """Inspector UI link for a ``lookup()`` result, carrying the proxy token/address plus ``params``."""
+    query = {"MCP_PROXY_AUTH_TOKEN": status["proxy_token"],
+             "MCP_PROXY_FULL_ADDRESS": f"http://{host}:{status['proxy_port']}"}
+    query.update(params)
+    return f"http://{host}:{status['ui_port']}/?{urlencode(query)}"
+
+
+class InspectorInstance:
+    STARTING, READY, FAILED, EXITED = "starting", "ready", "failed", "exited"
+
+    def __init__(self, cmd, owner=None, start_timeout=60, pooled=False):
+        self.id = secrets.token_urlsafe(8)
+        self.cmd = cmd
+        self.owner = owner
+        self.pooled = pooled
+        self.ui_port = None
+        self.proxy_port = None
+        self.handed_off_at = None
+        self.proc = None
+        self.state = self.STARTING
+        self.error = ""
+        self.proxy_token = None
+        self.session_token = secrets.token_urlsafe(32)
+        self.output = deque(maxlen=50)
+        self.started = time.monotonic()
+        self.deadline = self.started + start_timeout
+        self.ready_at = None
+        self.ended_at = None
+        self.kill_at = None
+        self._partial = b""
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.proc is not None else None
+
+    @property
+    def redirect_uri(self):
+        """OAuth callback on this instance's UI port; any port of a 127.0.0.1 URI passes DOT (RFC 8252)."""
+        return f"http://127.0.0.1:{self.ui_port}{CALLBACK_PATH}" if self.ui_port else None
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def as_dict(self):
+        now = time.monotonic()
+        return {
+            "id": self.id,
+            "owner": self.owner,
+            "state": self.state,
+            "pid": self.pid,
+            "ui_port": self.ui_port,
+            "proxy_port": self.proxy_port,
+            "pooled": self.pooled,
+            "error": self.error,
+            "proxy_token": self.proxy_token if self.state == self.READY else None,
+            "uptime_seconds": round((self.ended_at or now) - self.started, 1),
+            "startup_seconds": round(self.ready_at - self.started, 2) if self.ready_at else None,
+            "output": list(self.output)[-15:],
+        }
+
+
+class InspectorSupervisor:
+    def __init__(self, registry, start_timeout=60, max_age=8 * 3600, pool_size=0, pool_recycle=3600):
+        self.registry = registry
+        self.start_timeout = start_timeout
+        self.max_age = max_age
+        self.pool_size = pool_size
+        self.pool_recycle = pool_recycle
+        self._pool = []
+        self._pool_cmd = None
+        self._pool_backoff_until = 0.0
+        self._next_reap = 0.0
+        self._instances = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._selector = None
+        self._wakeup = None
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        start_timeout = getattr(settings, "MCP_INSPECTOR_START_TIMEOUT", 60)
+        port_max = getattr(settings, "MCP_INSPECTOR_PORT_MAX", 6400)
+        registry = InspectorRegistry(
+            getattr(settings, "MCP_INSPECTOR_REGISTRY", Path(settings.BASE_DIR) / "run" / "inspectors.json"),
+            ui_ports=range(getattr(settings, "MCP_INSPECTOR_UI_PORT", 6274), port_max),
+            proxy_ports=range(getattr(settings, "MCP_INSPECTOR_PROXY_PORT", 6277), port_max),
+            ttl=getattr(settings, "MCP_INSPECTOR_TTL", 4 * 3600),
+            max_per_user=getattr(settings, "MCP_INSPECTOR_MAX_PER_USER", 2),
+            start_timeout=start_timeout,
+        )
+        return cls(
+            registry,
+            start_timeout=start_timeout,
+            max_age=getattr(settings, "MCP_INSPECTOR_MAX_AGE", 8 * 3600),
+            pool_size=getattr(settings, "MCP_INSPECTOR_POOL_SIZE", 0),
+            pool_recycle=getattr(settings, "MCP_INSPECTOR_POOL_RECYCLE", 3600),
+        )
+
+    # ── public API ─────────────────────────────────────────────
+    def launch(self, cmd, owner=None, env=None, pooled=False, access_token=None):
+        """
+        Start ``cmd`` and return its InspectorInstance without waiting for it.
+        With ``access_token`` the instance's requests act with that token
+        right away; otherwise from ``bind()`` on.
+        """
+        if owner is not None:
+            self._enforce_user_cap(owner)
+        instance = InspectorInstance(cmd, owner, self.start_timeout, pooled)
+        instance.ui_port, instance.proxy_port = self.registry.allocate(
+            instance.id, owner, pooled, session_token=instance.session_token)
+        if access_token is not None and instance.ui_port is not None:
+            self.registry.bind(instance.id, owner, access_token)
+        cmd = [*cmd, "--header", f"{SESSION_HEADER}: {instance.session_token}"]
+        if "--redirect" not in cmd:
+            cmd += ["--redirect", instance.redirect_uri]
+        env = {"CLIENT_PORT": str(instance.ui_port), "SERVER_PORT": str(instance.proxy_port), **(env or {})}
+        try:
+            if instance.ui_port is None:
+                raise OSError("no free Inspector ports")
+            instance.proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,     # own process group, so stop() kills npx's children too
+                env={**os.environ, **env},
+            )
+        except OSError as exc:
+            instance.state = InspectorInstance.FAILED
+            instance.error = f"Could not start the Inspector: {exc.strerror or exc}"
+            instance.ended_at = time.monotonic()
+            self.registry.release(instance.id)
+            logger.error("Inspector launch failed: %s", instance.error)
+        else:
+            os.set_blocking(instance.proc.stdout.fileno(), False)
+            self.registry.update(instance.id, pid=instance.pid)
+            logger.info("Inspector %s starting (pid %s, ports %s/%s)",
+                        instance.id, instance.pid, instance.ui_port, instance.proxy_port)
+
+        with self._lock:
+            self._instances[instance.id] = instance
+            if instance.proc is not None:
+                self._pending.append(instance)
+            self._ensure_thread()
+        self._wake()
+        return instance
+
+    def warm(self, cmd):
+        """Keep ``pool_size`` instances of ``cmd`` pre-started from now on."""
+        if self.pool_size <= 0:
+            return
+        with self._lock:
+            self._pool_cmd = list(cmd)
+            self._ensure_thread()
+        self._wake()
+
+    def checkout(self, owner, access_token=None):
+        """
+        Hand a ready pooled instance to ``owner``; None when none is ready.
+        Its requests act with ``access_token`` once one is given here or to
+        ``bind()``.
+        """
+        with self._lock:
+            for instance in self._pool:
+                if instance.state == InspectorInstance.READY and instance.alive:
+                    self._pool.remove(instance)
+                    break
+            else:
+                return None
+        self._enforce_user_cap(owner)
+        instance.owner = owner
+        instance.pooled = False
+        instance.handed_off_at = time.monotonic()
+        self.registry.bind(instance.id, owner, access_token)
+        logger.info("Inspector %s handed off from the pool", instance.id)
+        self._wake()   # refill in the background
+        return instance
+
+    def bind(self, instance_id, owner, access_token):
+        """Let an instance (run by any worker) act with ``access_token`` from now on."""
+        self.registry.bind(instance_id, owner, access_token)
+
+    def get(self, instance_id):
+        return self._instances.get(instance_id)
+
+    def lookup(self, instance_id):
+        """Status dict of an instance run by this or any other worker, or None."""
+        instance = self.get(instance_id)
+        if instance is not None:
+            return instance.as_dict()
+        entry = self.registry.get(instance_id)
+        if entry is None:
+            return None
+        return {key: entry.get(key) for key in (
+            "id", "owner", "state", "pid", "ui_port", "proxy_port", "pooled", "error", "proxy_token")}
+
+    def touch(self, instance_id):
+        self.registry.touch(instance_id)
+
+    def instances(self):
+        return list(self._instances.values())
+
+    def stop(self, instance_id, reason="stopped"):
+        instance = self.get(instance_id)
+        if instance is not None:
+            self._terminate(instance, reason)
+            return
+        # started by another worker
+        entry = self.registry.get(instance_id)
+        if entry is not None and entry["pid"]:
+            logger.info("Stopping Inspector %s (pid %s): %s", instance_id, entry["pid"], reason)
+            kill_group(entry["pid"])
+            self.registry.release(instance_id)
+
+    def stop_all(self):
+        with self._lock:
+            self._pool_cmd = None
+            self._pool.clear()
+        for instance in self.instances():
+            self._terminate(instance, "server shutting down")
+            if instance.proc is not None:
+                try:
+                    instance.proc.wait(timeout=KILL_GRACE)
+                except subprocess.TimeoutExpired:
+                    self._killpg(instance, signal.SIGKILL)
+                self.registry.release(instance.id)
+
+    # ── process control ────────────────────────────────────────
+    def _enforce_user_cap(self, owner):
+        """Stop the owner's oldest instances so a new one fits MCP_INSPECTOR_MAX_PER_USER."""
+        owned = self.registry.owned_by(owner)
+        for entry in owned[:max(0, len(owned) - self.registry.max_per_user + 1)]:
+            self.stop(entry["id"], "replaced by a newer instance of the same user")
+
+    def _killpg(self, instance, sig):
+        kill_group(instance.pid, sig)
+
+    def _terminate(self, instance, reason):
+        if not instance.alive:
+            return
+        logger.info("Stopping Inspector %s (pid %s): %s", instance.id, instance.pid, reason)
+        if instance.state == InspectorInstance.STARTING:
+            instance.state = InspectorInstance.FAILED
+            instance.error = instance.error or reason
+        self._killpg(instance, signal.SIGTERM)
+        instance.kill_at = time.monotonic() + KILL_GRACE
+
+    # ── monitor thread ─────────────────────────────────────────
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._selector = selectors.DefaultSelector()
+        self._wakeup = os.pipe()
+        os.set_blocking(self._wakeup[0], False)
+        os.set_blocking(self._wakeup[1], False)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, name="inspector-supervisor", daemon=True)
+        self._thread.start()
+
+    def _wake(self):
+        if self._wakeup is not None:
+            try:
+                os.write(self._wakeup[1], b"\0")
+            except BlockingIOError:
+                pass
+
+    def _run(self):
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for instance in pending:
+                self._selector.register(instance.proc.stdout, selectors.EVENT_READ, instance)
+            for key, _ in self._selector.select(timeout=0.5):
+                if key.data is None:
+                    try:
+                        os.read(self._wakeup[0], 4096)
+                    except BlockingIOError:
+                        pass
+                else:
+                    self._read(key.data)
+            try:
+                self._check(time.monotonic())
+            except Exception:
+                logger.exception("Inspector supervisor check failed")
+
+    def _read(self, instance):
+        stream = instance.proc.stdout
+        try:
+            data = os.read(stream.fileno(), 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._selector.unregister(stream)
+            stream.close()
+            return
+        *lines, instance._partial = (instance._partial + data).split(b"\n")
+        for raw in lines:
+            line = raw.decode("utf-8", "replace").rstrip()
+            instance.output.append(line)
+            output_logger.debug("Inspector %s: %s", instance.id, line)
+            if instance.state == InspectorInstance.STARTING:
+                match = TOKEN_RE.search(line)
+                if match:
+                    instance.proxy_token = match.group(1)
+                    instance.state = InspectorInstance.READY
+                    instance.ready_at = time.monotonic()
+                    self.registry.update(instance.id, state=instance.state, proxy_token=instance.proxy_token)
+                    logger.info("Inspector %s ready after %.1fs", instance.id, instance.ready_at - instance.started)
+
+    def _check(self, now):
+        for instance in self.instances():
+            if instance.proc is not None and instance.proc.poll() is not None and instance.ended_at is None:
+                instance.ended_at = now
+                if instance.state == InspectorInstance.STARTING:
+                    instance.state = InspectorInstance.FAILED
+                    instance.error = f"Inspector exited with code {instance.proc.returncode} before it was ready"
+                elif instance.state == InspectorInstance.READY:
+                    instance.state = InspectorInstance.EXITED
+                self.registry.release(instance.id)
+                logger.info("Inspector %s (pid %s) exited with %s", instance.id, instance.pid, instance.proc.returncode)
+            elif instance.state == InspectorInstance.STARTING and now > instance.deadline:
+                instance.error = f"No proxy token from the Inspector within {self.start_timeout}s"
+                self._terminate(instance, instance.error)
+            elif instance.state == InspectorInstance.READY and now - instance.started > self.max_age:
+                self._terminate(instance, "max age reached")
+
+            if instance.kill_at is not None and now >= instance.kill_at and instance.alive:
+                self._killpg(instance, signal.SIGKILL)
+                instance.kill_at = None
+            if instance.ended_at is not None and now - instance.ended_at > LINGER:
+                with self._lock:
+                    self._instances.pop(instance.id, None)
+        if now >= self._next_reap:
+            self._next_reap = now + REAP_INTERVAL
+            self.registry.reap()
+        self._maintain_pool(now)
+
+    def _maintain_pool(self, now):
+        if self._pool_cmd is None:
+            return
+        with self._lock:
+            for instance in list(self._pool):
+                if instance.state in (InspectorInstance.FAILED, InspectorInstance.EXITED):
+                    self._pool.remove(instance)
+                    if instance.state == InspectorInstance.FAILED:
+                        logger.warning("Pooled Inspector failed: %s", instance.error)
+                        self._pool_backoff_until = now + POOL_BACKOFF
+                elif (instance.state == InspectorInstance.READY
+                      and now - instance.ready_at > self.pool_recycle):
+                    self._pool.remove(instance)
+                    self._terminate(instance, "recycling idle pooled instance")
+            missing = self.pool_size - len(self._pool)
+            cmd = self._pool_cmd
+        if missing <= 0 or now < self._pool_backoff_until:
+            return
+        for _ in range(missing):
+            instance = self.launch(cmd, pooled=True)
+            with self._lock:
+                wanted = self._pool_cmd is cmd
+                if wanted:
+                    self._pool.append(instance)
+            if not wanted:   # stop_all() ran meanwhile
+                self._terminate(instance, "pool no longer needed")
+                return
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_supervisor():
+    """Per-process supervisor, created on first use (after any pre-fork)."""
+    global _supervisor
+    if _supervisor is None:
+        with _supervisor_lock:
+            if _supervisor is None:
+                _supervisor = InspectorSupervisor.from_settings()
+                atexit.register(_supervisor.stop_all)
+    return _supervisor
@@ -0,0 +1,216 @@
+# mcp_app/inspector_registry.py
+"""
+Registry of running Inspector instances, shared by every worker process.
+
+A small JSON file (MCP_INSPECTOR_REGISTRY, guarded by ``flock``) records for
+each instance its owner, UI/proxy ports, process id and start time, state and
+last use. It replaces ``lsof`` scans and blind SIGTERMs on fixed ports:
+
+- ports are handed out from the configured ranges, skipping ports held by a
+  live entry and probing each candidate with ``bind()``
+- an instance belongs to the user who launched it; only their own older
+  instances are stopped when they exceed MCP_INSPECTOR_MAX_PER_USER
+- instances unused for MCP_INSPECTOR_TTL seconds are reclaimed by pid (the
+  recorded start time guards against pid reuse), whichever worker runs them
+- entries whose process is gone are dropped
+- each instance sends a per-instance session token with its requests to
+  /mcp; only the token's SHA-256 is recorded, next to the checksum of the
+  access token the instance was bound to at launch or hand-off
+"""
+import fcntl
+import hashlib
+import hmac
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("mcp.inspector")
+
+
+def port_is_free(port, host="127.0.0.1"):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+
+def process_start_time(pid):
+    """Kernel start time of ``pid`` (Linux), to tell a pid apart from a reused one."""
+    try:
+        with open(f"/proc/{pid}/stat") as fh:
+            # field 22; the command name (field 2) may contain spaces
+            return int(fh.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_alive(pid, start_time=None):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return start_time is None or process_start_time(pid) in (None, start_time)
+
+
+def checksum(token):
+    """SHA-256 hex digest, the form DOT's AccessToken.token_checksum uses."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class InspectorRegistry:
+    def __init__(self, path, ui_ports, proxy_ports, ttl=4 * 3600, max_per_user=2, start_timeout=60):
+        self.path = os.fspath(path)
+        self.ui_ports = ui_ports
+        self.proxy_ports = proxy_ports
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+        self.start_timeout = start_timeout
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "r+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                raw = fh.read()
+                try:
+                    entries = json.loads(raw) if raw.strip() else {}
+                except ValueError:
+                    logger.warning("Inspector registry %s was corrupt; starting empty", self.path)
+                    entries = {}
+                yield entries
+                fh.seek(0)
+                fh.truncate()
+                json.dump(entries, fh)
+                fh.flush()
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _live(self, entry, now):
+        if entry.get("pid"):
+            return process_alive(entry["pid"], entry.get("pid_start"))
+        # ports reserved for a process that is still being spawned
+        return now - entry["created"] < self.start_timeout
+
+    # ── allocation ─────────────────────────────────────────────
+    def allocate(self, instance_id, owner=None, pooled=False, session_token=None):
+        """Reserve a UI and a proxy port for a new instance; (None, None) if exhausted."""
+        now = time.time()
+        with self._locked() as entries:
+            for key in [k for k, e in entries.items() if not self._live(e, now)]:
+                del entries[key]
+            used = {port for e in entries.values() for port in (e["ui_port"], e["proxy_port"])}
+            ui = self._pick(self.ui_ports, used)
+            if ui is not None:
+                used.add(ui)
+            proxy = self._pick(self.proxy_ports, used)
+            if ui is None or proxy is None:
+                return None, None
+            entries[instance_id] = {
+                "owner": owner, "pooled": pooled, "ui_port": ui, "proxy_port": proxy,
+                "pid": None, "pid_start": None, "worker": os.getpid(),
+                "state": "starting", "proxy_token": None, "error": "",
+                "session": checksum(session_token) if session_token else None, "token_checksum": None,
+                "created": now, "touched": now,
+            }
+            return ui, proxy
+
+    @staticmethod
+    def _pick(ports, used):
+        for port in ports:
+            if port not in used and port_is_free(port):
+                return port
+        return None
+
+    # ── updates ────────────────────────────────────────────────
+    def update(self, instance_id, **fields):
+        with self._locked() as entries:
+            entry = entries.get(instance_id)
+            if entry is not None:
+                entry.update(fields)
+                if "pid" in fields:
+                    entry["pid_start"] = process_start_time(fields["pid"])
+
+    def touch(self, instance_id):
+        self.update(instance_id, touched=time.time())
+
+    def bind(self, instance_id, owner, access_token=None):
+        """Hand an instance to ``owner``; with ``access_token`` its requests now act with it."""
+        fields = {"owner": owner, "pooled": False, "touched": time.time()}
+        if access_token is not None:
+            fields["token_checksum"] = checksum(access_token)
+        self.update(instance_id, **fields)
+
+    def release(self, instance_id):
+        with self._locked() as entries:
+            entries.pop(instance_id, None)
+
+    # ── queries ────────────────────────────────────────────────
+    def get(self, instance_id):
+        with self._locked() as entries:
+            entry = entries.get(instance_id)
+            return dict(entry, id=instance_id) if entry is not None else None
+
+    def entries(self):
+        with self._locked() as entries:
+            return [dict(e, id=k) for k, e in entries.items()]
+
+    def by_session(self, session_token):
+        """The live, bound entry of the instance started with ``session_token``; None otherwise."""
+        digest = checksum(session_token)
+        try:
+            with open(self.path) as fh:
+                fcntl.flock(fh, fcntl.LOCK_SH)
+                raw = fh.read()
+        except FileNotFoundError:
+            return None
+        try:
+            entries = json.loads(raw) if raw.strip() else {}
+        except ValueError:
+            return None
+        for key, entry in entries.items():
+            if (entry.get("session") and hmac.compare_digest(entry["session"], digest)
+                    and entry.get("token_checksum") and self._live(entry, time.time())):
+                return dict(entry, id=key)
+        return None
+
+    def owned_by(self, owner):
+        return sorted((e for e in self.entries() if e["owner"] == owner and not e["pooled"]),
+                      key=lambda e: e["created"])
+
+    # ── reclamation ────────────────────────────────────────────
+    def reap(self):
+        """Drop dead entries and stop instances idle longer than the TTL; returns reclaimed ids."""
+        now = time.time()
+        reclaimed = []
+        with self._locked() as entries:
+            for key, entry in list(entries.items()):
+                if not self._live(entry, now):
+                    del entries[key]
+                elif not entry["pooled"] and entry["pid"] and now - entry["touched"] > self.ttl:
+                    logger.info("Reclaiming idle Inspector %s (owner %s, pid %s)", key, entry["owner"], entry["pid"])
+                    kill_group(entry["pid"])
+                    entry["state"] = "exited"
+                    entry["error"] = "reclaimed after being idle"
+                    reclaimed.append(key)
+        return reclaimed
+
+
+def kill_group(pid, sig=signal.SIGTERM):
+    """Signal the process group an instance was started in (pgid == pid)."""
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
@@ -0,0 +1,32 @@
+# mcp_app/lazy.py
+"""
+Deferred imports for the composed ASGI app.
+
+Starlette only builds route endpoints' callers and middleware stacks on the
+first request, so wiring them by dotted path keeps those modules (and the
+ORM models they import) out of process start-up.
+"""
+from django.utils.module_loading import import_string
+
+
+def lazy_endpoint(dotted_path):
+    """Async request endpoint imported on its first call."""
+    target = None
+
+    async def endpoint(request):
+        nonlocal target
+        if target is None:
+            target = import_string(dotted_path)
+        return await target(request)
+
+    endpoint.__name__ = dotted_path.rsplit(".", 1)[-1]
+    return endpoint
+
+
+def lazy_middleware(dotted_path):
+    """Middleware factory for ``Middleware(...)`` that imports the class when the stack is built."""
+    def factory(app, *args, **kwargs):
+        return import_string(dotted_path)(app, *args, **kwargs)
+
+    factory.__name__ = dotted_path.rsplit(".", 1)[-1]
+    return factory
@@ -0,0 +1,153 @@
+# mcp_app/log.py
+"""
+Logging pipeline for the ``mcp.*`` loggers (wired up by LOGGING in settings).
+
+Code on the request path (mcp.auth, mcp.tools, mcp.launcher, ...) only pays
+for building a LogRecord and a ``put_nowait`` onto a bounded queue:
+
+- ``QueueHandler`` leaves the record unformatted - message arguments are
+  merged later, in the listener thread - and drops records (counted in
+  ``dropped``) instead of blocking when the queue is full
+- records from loggers listed in MCP_LOG_SAMPLING below WARNING are sampled
+  before they are queued
+- a QueueListener thread redacts secrets (bearer tokens, ``token=``,
+  ``code_verifier=``, ``client_secret=`` ... in the message, and
+  MCP_LOG_REDACT_KEYS in ``extra`` fields), renders one JSON object per
+  line and writes it to the slow sink (stderr or MCP_LOG_FILE)
+
+So a slow or blocked sink fills the queue and loses log lines; it never
+delays a request. Message arguments should be values, not objects that
+change after the call, since they are formatted later.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+
+REDACTED = "[redacted]"
+
+SECRET_PATTERNS = [
+    (re.compile(r"(?i)\b(bearer|basic)\s+[A-Za-z0-9._~+/=-]{8,}"), r"\1 " + REDACTED),
+    # no \b: MCP_PROXY_AUTH_TOKEN=... must match too
+    (re.compile(r"(?i)(?<![a-z0-9])((?:access_|refresh_|proxy_|auth_|id_)?token|code_verifier|verifier|"
+                r"client_secret|secret|password|api_?key)(['\"]?\s*[=:]\s*['\"]?)[^\s&'\",;}]+"),
+     r"\1\2" + REDACTED),
+    # authorization codes in query strings / form bodies
+    (re.compile(r"\b(code=)[^\s&'\",;}]+"), r"\1" + REDACTED),
+]
+
+# LogRecord attributes that aren't ``extra`` fields
+_STANDARD = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def redact_text(text):
+    for pattern, replacement in SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RedactFilter(logging.Filter):
+    """Merges the message arguments, then removes secrets from the message and ``extra`` fields."""
+
+    def __init__(self, keys=()):
+        super().__init__()
+        self.keys = re.compile("|".join(keys), re.IGNORECASE) if keys else None
+
+    def filter(self, record):
+        record.msg = redact_text(record.getMessage())
+        record.args = None
+        for key, value in list(vars(record).items()):
+            if key in _STANDARD:
+                continue
+            if self.keys is not None and self.keys.search(key):
+                setattr(record, key, REDACTED)
+            elif isinstance(value, str):
+                setattr(record, key, redact_text(value))
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Keeps a fraction of the records below WARNING from the configured logger prefixes."""
+
+    def __init__(self, rates=None):
+        super().__init__()
+        # longest prefix first, so "mcp.inspector.output" beats "mcp.inspector"
+        self.rates = sorted((rates or {}).items(), key=lambda item: -len(item[0]))
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return random.random() < rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Non-blocking, non-formatting queue handler owning its QueueListener."""
+
+    def __init__(self, sink, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.sink = sink
+        self.dropped = 0
+        self._start()
+        # prefork workers inherit the handler but not the listener thread
+        os.register_at_fork(after_in_child=self._start)
+        atexit.register(self.close)
+
+    def _start(self):
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = logging.handlers.QueueListener(self.queue, self.sink, respect_handler_level=True)
+        self.listener.start()
+
+    def prepare(self, record):
+        # the stdlib formats here, on the caller's thread; leave that to the listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        listener, self.listener = self.listener, None
+        if listener is not None and listener._thread is not None:
+            listener.stop()   # drains what is queued
+        super().close()
+
+
+def queue_handler(path=None, maxsize=10000, sampling=None, redact_keys=(), level=logging.NOTSET):
+    """``()`` factory for LOGGING: JSON lines to ``path`` (or stderr) through a QueueHandler."""
+    sink = logging.handlers.WatchedFileHandler(path) if path else logging.StreamHandler(sys.stderr)
+    sink.setFormatter(JsonFormatter())
+    sink.addFilter(RedactFilter(redact_keys))
+    handler = QueueHandler(sink, maxsize)
+    handler.setLevel(level)
+    handler.addFilter(SampleFilter(sampling))
+    return handler
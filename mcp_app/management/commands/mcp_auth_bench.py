@@ -0,0 +1,404 @@
+# mcp_app/management/commands/mcp_auth_bench.py
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from base64 import b64encode
+from datetime import timedelta
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+"""
+Usage:
+  python manage.py mcp_auth_bench [--sizes 1000,100000,1000000] [--iterations 300]
+                                  [--baseline PATH] [--save | --ci] [--keepdb] [--json]
+
+Microbenchmarks of the /mcp authentication hot path, offline and in-process:
+the coroutines and middleware are driven with raw ASGI calls (no sockets, no
+server) against a scratch database - the project database is never touched.
+The access-token table is filled to each size in --sizes (tokens
+"bench-<n>", so --keepdb reuses and tops up the same file on the next run).
+
+Cases:
+  bearer.valid / bearer.unknown     get_user_from_bearer
+  session.valid                     get_user_from_session
+  basic.valid / basic.bad_password  BasicAuthMiddleware.dispatch
+  combined.<branch>                 CombinedAuthMiddleware: proxy (a bound Inspector
+                                    in a scratch registry), well_known,
+                                    stream_handshake, bearer, bearer_invalid,
+                                    session, anonymous, rate_limited
+
+Per call it records wall-clock p50/p95, CPU time spent on the event-loop
+thread and the number of SQL queries. With a baseline (--baseline, default
+MCP_AUTH_BENCH_BASELINE) the run fails when a case issues more queries than
+the baseline, or its loop CPU or p50 exceeds ``baseline * ratio + slack``
+(tolerances are stored in the baseline file) - so an added query, or a
+blocking call on the event loop, fails. --save writes the current results as
+the new baseline; keep one per reference machine. With --ci a missing
+baseline, or a size it has no results for, is an error instead of a note.
+"""
+
+DEFAULT_TOLERANCE = {
+    "queries": 0,              # extra queries allowed per call
+    "loop_cpu_us": [1.5, 200],  # ratio, absolute slack
+    "p50_us": [2.0, 500],
+}
+BENCH_APP_NAME = "MCP auth bench"
+BENCH_USERS = 100
+BENCH_PASSWORD = "bench-password"
+BENCH_PROXY_SESSION = "bench-proxy-session"
+FILL_BATCH = 5000
+
+
+class QueryCounter:
+    """execute_wrapper counting queries on every connection, in any thread."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def attach(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def _summary(walls, loop_cpu, queries, iterations):
+    walls = sorted(walls)
+    return {
+        "p50_us": round(statistics.median(walls) * 1e6, 1),
+        "p95_us": round(walls[min(len(walls) - 1, int(len(walls) * 0.95))] * 1e6, 1),
+        "loop_cpu_us": round(loop_cpu / iterations * 1e6, 1),
+        "queries": round(queries / iterations, 2),
+    }
+
+
+def _http_scope(method="POST", path="/mcp/", headers=(), query=b""):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": query,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        "server": ("bench", 80), "client": ("127.0.0.1", 40000),
+    }
+
+
+async def _asgi_call(app, scope, body=b""):
+    """Run one request through ``app``; returns the response status."""
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)   # only reached if the app waits for a disconnect
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+class Command(BaseCommand):
+    help = "Benchmark the /mcp auth paths in-process across token-table sizes and check against a baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,100000,1000000",
+                            help="Comma-separated access-token table sizes")
+        parser.add_argument("--iterations", type=int, default=300, help="Timed calls per case")
+        parser.add_argument("--basic-iterations", type=int, default=5,
+                            help="Timed calls for the Basic auth cases (each hashes a password)")
+        parser.add_argument("--baseline", default=None,
+                            help="Baseline JSON (default: MCP_AUTH_BENCH_BASELINE)")
+        parser.add_argument("--save", action="store_true", help="Write the results as the new baseline")
+        parser.add_argument("--ci", action="store_true",
+                            help="Fail when the baseline is missing or lacks a measured size")
+        parser.add_argument("--db", default=None,
+                            help="Scratch database file (default: a temporary file, or run/auth-bench.sqlite3 "
+                                 "with --keepdb)")
+        parser.add_argument("--keepdb", action="store_true", help="Keep and reuse the scratch database")
+        parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+
+    def handle(self, *args, **opts):
+        try:
+            sizes = sorted({int(s) for s in opts["sizes"].split(",") if s.strip()})
+        except ValueError:
+            raise CommandError("❌ --sizes must be comma-separated integers")
+        if not sizes or sizes[0] <= 0 or opts["iterations"] <= 0:
+            raise CommandError("❌ --sizes and --iterations must be positive")
+        if opts["ci"] and opts["save"]:
+            raise CommandError("❌ --ci and --save are mutually exclusive")
+        baseline_path = Path(opts["baseline"] or getattr(
+            settings, "MCP_AUTH_BENCH_BASELINE", settings.BASE_DIR / "benchmarks" / "auth-baseline.json"))
+        if opts["ci"]:
+            if not baseline_path.exists():
+                raise CommandError(f"❌ No baseline at {baseline_path}; create one with --save")
+            missing = [s for s in sizes if str(s) not in json.loads(baseline_path.read_text()).get("results", {})]
+            if missing:
+                raise CommandError(f"❌ {baseline_path} has no results for size(s) {', '.join(map(str, missing))}")
+
+        self.counter = QueryCounter()
+        connection_created.connect(self.counter.attach)
+        old_config = self._scratch_database(opts)
+        try:
+            self._fixtures()
+            results = {}
+            for size in sizes:
+                started = time.perf_counter()
+                self._fill(size)
+                if not opts["json"]:
+                    self.stdout.write(f"⏱️ {size} tokens (filled in {time.perf_counter() - started:.1f}s)")
+                results[str(size)] = asyncio.run(self._run_cases(size, opts))
+        finally:
+            connection_created.disconnect(self.counter.attach)
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0, keepdb=opts["keepdb"])
+
+        report = {
+            "version": 1,
+            "created": timezone.now().isoformat(timespec="seconds"),
+            "machine": {"host": platform.node(), "python": platform.python_version(),
+                        "django": django.get_version(), "cpus": os.cpu_count()},
+            "iterations": opts["iterations"],
+            "results": results,
+        }
+        regressions = self._compare(baseline_path, results) if baseline_path.exists() and not opts["save"] else None
+
+        if opts["json"]:
+            self.stdout.write(json.dumps({**report, "regressions": regressions}, indent=2))
+        else:
+            self._print(results, regressions)
+
+        if opts["save"]:
+            previous = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+            report["tolerance"] = previous.get("tolerance", DEFAULT_TOLERANCE)
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"💾 Baseline written to {baseline_path}"))
+        elif regressions:
+            raise CommandError(f"❌ {len(regressions)} auth benchmark regression(s) against {baseline_path}")
+        elif regressions is None and not opts["json"]:
+            self.stdout.write(f"ℹ️ No baseline at {baseline_path}; run with --save to create one")
+
+    # ── scratch database ───────────────────────────────────────
+    def _scratch_database(self, opts):
+        path = opts["db"]
+        if path is None:
+            if opts["keepdb"]:
+                path = settings.BASE_DIR / "run" / "auth-bench.sqlite3"
+            else:
+                path = os.path.join(tempfile.mkdtemp(prefix="mcp_auth_bench_"), "auth-bench.sqlite3")
+        os.makedirs(os.path.dirname(os.fspath(path)), exist_ok=True)
+        default = connections["default"]
+        if default.vendor != "sqlite":
+            raise CommandError("❌ mcp_auth_bench runs on a scratch SQLite database; DATABASES['default'] isn't SQLite")
+        default.settings_dict.setdefault("TEST", {})["NAME"] = os.fspath(path)
+        # the "readonly" alias mirrors default (TEST MIRROR), so the router still applies
+        return setup_databases(verbosity=0, interactive=False, keepdb=opts["keepdb"], serialized_aliases=set())
+
+    def _fixtures(self):
+        from oauth2_provider.models import get_application_model
+
+        User = get_user_model()
+        names = [f"bench-user-{i}" for i in range(BENCH_USERS)]
+        existing = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+        if len(existing) < len(names):
+            password = make_password(BENCH_PASSWORD)   # one hash shared by all bench users
+            User.objects.bulk_create([User(username=n, password=password) for n in names if n not in existing])
+        self.users = list(User.objects.filter(username__in=names).order_by("pk"))
+        Application = get_application_model()
+        self.app, _ = Application.objects.get_or_create(
+            name=BENCH_APP_NAME,
+            defaults={"client_type": Application.CLIENT_CONFIDENTIAL,
+                      "authorization_grant_type": Application.GRANT_CLIENT_CREDENTIALS},
+        )
+
+        from django.contrib.sessions.backends.db import SessionStore
+
+        store = SessionStore()
+        store["_auth_user_id"] = str(self.users[0].pk)
+        store.create()
+        self.session_key = store.session_key
+
+        # a running, bound Inspector for combined.proxy: this process stands in
+        # for it in a scratch registry, bound to the access token "bench-0"
+        from mcp_app.inspector import get_supervisor
+        from mcp_app.inspector_registry import InspectorRegistry
+
+        live = get_supervisor().registry
+        self.registry = InspectorRegistry(
+            os.path.join(tempfile.mkdtemp(prefix="mcp_auth_bench_inspectors_"), "inspectors.json"),
+            ui_ports=live.ui_ports, proxy_ports=live.proxy_ports)
+        if self.registry.allocate("bench", self.users[0].username, session_token=BENCH_PROXY_SESSION) == (None, None):
+            raise CommandError("❌ no free Inspector ports for the combined.proxy fixture")
+        self.registry.update("bench", pid=os.getpid(), state="ready")
+        self.registry.bind("bench", self.users[0].username, "bench-0")
+
+    def _fill(self, size):
+        from oauth2_provider.models import get_access_token_model, set_token_value
+
+        AccessToken = get_access_token_model()
+        have = AccessToken.objects.filter(application=self.app).count()
+        expires = timezone.now() + timedelta(days=365)
+        for start in range(have, size, FILL_BATCH):
+            batch = []
+            for i in range(start, min(size, start + FILL_BATCH)):
+                token = AccessToken(user=self.users[i % len(self.users)], application=self.app,
+                                    expires=expires, scope="read write")
+                set_token_value(token, f"bench-{i}")
+                batch.append(token)
+            with transaction.atomic():
+                AccessToken.objects.bulk_create(batch)
+
+    # ── cases ──────────────────────────────────────────────────
+    async def _run_cases(self, size, opts):
+        from mcp_app import ratelimit
+        from mcp_app.auth_basic import BasicAuthMiddleware
+        from mcp_app.auth_middleware import CombinedAuthMiddleware, get_user_from_bearer, get_user_from_session
+        from mcp_app.inspector import SESSION_HEADER, get_supervisor
+
+        rng = random.Random(size)
+        tokens = [f"bench-{rng.randrange(size)}" for _ in range(opts["iterations"])]
+        token_iter = iter(tokens * 2)
+        limits_dir = tempfile.mkdtemp(prefix="mcp_auth_bench_rl_")
+        open_limiter = ratelimit.RateLimiter(
+            ratelimit.SharedBuckets(os.path.join(limits_dir, "open.bin"), 4096),
+            token=(10 ** 9, 10 ** 9), user=(10 ** 9, 10 ** 9), tool=(10 ** 9, 10 ** 9))
+        tight_limiter = ratelimit.RateLimiter(
+            ratelimit.SharedBuckets(os.path.join(limits_dir, "tight.bin"), 4096), token=(1, 1))
+
+        combined = CombinedAuthMiddleware(_ok_app)
+        basic = BasicAuthMiddleware(_ok_app)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.session_key}"
+        call_body = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                                "params": {"name": "echo", "arguments": {"message": "hi"}}}).encode()
+        good_basic = "Basic " + b64encode(f"{self.users[0].username}:{BENCH_PASSWORD}".encode()).decode()
+        bad_basic = "Basic " + b64encode(f"{self.users[0].username}:wrong".encode()).decode()
+
+        def bearer(token):
+            return [("authorization", f"Bearer {token}"), ("content-type", "application/json")]
+
+        async def expect(status, coro):
+            got = await coro
+            if got != status:
+                raise CommandError(f"❌ expected HTTP {status}, got {got}")
+
+        async def expect_user(coro, authenticated=True):
+            user = await coro
+            if isinstance(user, tuple):
+                user = user[0]
+            if user.is_authenticated != authenticated:
+                raise CommandError("❌ unexpected authentication result")
+
+        cases = [
+            ("bearer.valid", lambda: expect_user(get_user_from_bearer(next(token_iter)))),
+            ("bearer.unknown", lambda: expect_user(get_user_from_bearer("bench-missing"), False)),
+            ("session.valid", lambda: expect_user(get_user_from_session(self.session_key))),
+            ("basic.valid", lambda: expect(200, _asgi_call(basic, _http_scope(headers=[("authorization", good_basic)])))),
+            ("basic.bad_password", lambda: expect(401, _asgi_call(basic, _http_scope(headers=[("authorization", bad_basic)])))),
+            ("combined.proxy", lambda: expect(200, _asgi_call(
+                combined, _http_scope(headers=[(SESSION_HEADER, BENCH_PROXY_SESSION)])))),
+            ("combined.well_known", lambda: expect(200, _asgi_call(
+                combined, _http_scope("GET", "/.well-known/oauth-protected-resource")))),
+            ("combined.stream_handshake", lambda: expect(200, _asgi_call(
+                combined, _http_scope("GET", headers=[("accept", "text/event-stream")])))),
+            ("combined.bearer", lambda: expect(200, _asgi_call(
+                combined, _http_scope(headers=bearer(next(token_iter))), call_body))),
+            ("combined.bearer_invalid", lambda: expect(401, _asgi_call(
+                combined, _http_scope(headers=bearer("bench-missing")), call_body))),
+            ("combined.session", lambda: expect(200, _asgi_call(
+                combined, _http_scope(headers=[("cookie", cookie)]), call_body))),
+            ("combined.anonymous", lambda: expect(401, _asgi_call(combined, _http_scope(), call_body))),
+            ("combined.rate_limited", lambda: expect(429, _asgi_call(
+                combined, _http_scope(headers=bearer(tokens[0])), call_body))),
+        ]
+
+        results = {}
+        saved_limiter = ratelimit._limiter
+        supervisor = get_supervisor()
+        saved_registry, supervisor.registry = supervisor.registry, self.registry
+        try:
+            for name, call in cases:
+                limiter = tight_limiter if name == "combined.rate_limited" else open_limiter
+                ratelimit._limiter = limiter   # what get_limiter() hands the middleware
+                if name == "combined.rate_limited":
+                    limiter.check(token=tokens[0])   # spend the single token first
+                iterations = opts["basic_iterations"] if name.startswith("basic.") else opts["iterations"]
+                token_iter = iter(tokens * 2)
+                await call()   # warm: connections, imports, statement caches
+                walls, loop_cpu, queries_before = [], 0.0, self.counter.count
+                for _ in range(iterations):
+                    cpu0, t0 = time.thread_time(), time.perf_counter()
+                    await call()
+                    walls.append(time.perf_counter() - t0)
+                    loop_cpu += time.thread_time() - cpu0
+                results[name] = _summary(walls, loop_cpu, self.counter.count - queries_before, iterations)
+        finally:
+            ratelimit._limiter = saved_limiter
+            supervisor.registry = saved_registry
+        return results
+
+    # ── baseline ───────────────────────────────────────────────
+    def _compare(self, path, results):
+        baseline = json.loads(path.read_text())
+        tolerance = {**DEFAULT_TOLERANCE, **baseline.get("tolerance", {})}
+        regressions = []
+        for size, cases in results.items():
+            base_cases = baseline.get("results", {}).get(size)
+            if base_cases is None:
+                continue
+            for name, now in cases.items():
+                base = base_cases.get(name)
+                if base is None:
+                    continue
+                if now["queries"] > base["queries"] + tolerance["queries"]:
+                    regressions.append({"size": size, "case": name, "metric": "queries",
+                                        "baseline": base["queries"], "now": now["queries"]})
+                for metric in ("loop_cpu_us", "p50_us"):
+                    ratio, slack = tolerance[metric]
+                    limit = base[metric] * ratio + slack
+                    if now[metric] > limit:
+                        regressions.append({"size": size, "case": name, "metric": metric,
+                                            "baseline": base[metric], "now": now[metric], "limit": round(limit, 1)})
+        return regressions
+
+    def _print(self, results, regressions):
+        flagged = {(r["size"], r["case"]) for r in regressions or ()}
+        for size, cases in results.items():
+            self.stdout.write(self.style.SUCCESS(f"\n🔐 {int(size):,} access tokens"))
+            self.stdout.write(f"  {'case':<28} {'p50':>10} {'p95':>10} {'loop cpu':>10} {'queries':>8}")
+            for name, r in cases.items():
+                mark = "  ❌" if (size, name) in flagged else ""
+                self.stdout.write(f"  {name:<28} {r['p50_us']:>8.0f}µs {r['p95_us']:>8.0f}µs "
+                                  f"{r['loop_cpu_us']:>8.0f}µs {r['queries']:>8g}{mark}")
+        for r in regressions or ():
+            self.stdout.write(self.style.ERROR(
+                f"❌ {r['case']} @ {r['size']}: {r['metric']} {r['now']} (baseline {r['baseline']}"
+                + (f", limit {r['limit']})" if "limit" in r else ")")))
+        if regressions == []:
+            self.stdout.write(self.style.SUCCESS("\n✅ Within baseline tolerances"))
@@ -0,0 +1,173 @@
+# mcp_app/management/commands/mcp_db_bench.py
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+"""
+Usage:
+  python manage.py mcp_db_bench [--readers 4] [--duration 5] [--rows 20000] [--json]
+
+Measures SQLite under the /mcp access pattern on a scratch database (the
+project database is never touched): N reader processes doing token lookups
+by key while one writer inserts and refreshes tokens like /o/token/. Runs
+once with Django's stock SQLite settings (rollback journal) and once with
+MCP_SQLITE_PRAGMAS (WAL), and reports throughput, latency and lock errors.
+"""
+
+STOCK_PRAGMAS = ["PRAGMA journal_mode=DELETE", "PRAGMA synchronous=FULL"]
+
+SCHEMA = """
+CREATE TABLE bench_token (
+    id INTEGER PRIMARY KEY,
+    token TEXT NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    scope TEXT NOT NULL
+)
+"""
+
+
+def _connect(path, pragmas):
+    # timeout mirrors Django's default busy wait of 5 s
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def _reader(path, pragmas, rows, start_at, duration, seed):
+    rng = random.Random(seed)
+    conn = _connect(path, pragmas)
+    latencies, errors = [], 0
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        key = f"tok-{rng.randrange(rows)}"
+        t0 = time.perf_counter()
+        try:
+            conn.execute("SELECT user_id, expires, scope FROM bench_token WHERE token = ?", (key,)).fetchone()
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+    return latencies, errors
+
+
+def _writer(path, pragmas, rows, start_at, duration, seed):
+    rng = random.Random(seed)
+    conn = _connect(path, pragmas)
+    latencies, errors, n = [], 0, 0
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO bench_token (token, user_id, expires, scope) VALUES (?, ?, ?, ?)",
+                         (f"new-{seed}-{n}", rng.randrange(1000), time.time() + 3600, "read write"))
+            conn.execute("UPDATE bench_token SET expires = ? WHERE token = ?",
+                         (time.time() + 3600, f"tok-{rng.randrange(rows)}"))
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            continue
+        n += 1
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = "Benchmark stock SQLite settings against the production WAL profile under concurrent readers + a writer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4, help="Concurrent reader processes")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds per profile")
+        parser.add_argument("--rows", type=int, default=20000, help="Tokens in the scratch table")
+        parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+
+    def handle(self, *args, **opts):
+        profiles = [
+            ("stock (rollback journal)", STOCK_PRAGMAS),
+            ("production (WAL)", getattr(settings, "MCP_SQLITE_PRAGMAS", [])),
+        ]
+        workdir = tempfile.mkdtemp(prefix="mcp_db_bench_")
+        try:
+            results = [self._run(name, pragmas, workdir, opts) for name, pragmas in profiles]
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🗄️ {opts['readers']} readers + 1 writer, {opts['duration']:.0f}s each, {opts['rows']} tokens"))
+        self.stdout.write(f"  {'profile':<26} {'reads/s':>10} {'read p50':>10} {'read p99':>10} {'read max':>10} "
+                          f"{'writes/s':>9} {'write p99':>10} {'lock errors':>12}")
+        for r in results:
+            self.stdout.write(
+                f"  {r['profile']:<26} {r['reads_per_s']:>10.0f} {r['read_p50_ms']:>8.3f}ms {r['read_p99_ms']:>8.3f}ms {r['read_max_ms']:>8.1f}ms "
+                f"{r['writes_per_s']:>9.0f} {r['write_p99_ms']:>8.3f}ms {r['lock_errors']:>12}")
+        stock, prod = results
+        if stock["reads_per_s"] and stock["writes_per_s"]:
+            self.stdout.write(
+                f"\n📈 WAL: {prod['reads_per_s'] / stock['reads_per_s']:.1f}x reads/s, "
+                f"{prod['writes_per_s'] / stock['writes_per_s']:.1f}x writes/s, worst read "
+                f"{stock['read_max_ms']:.1f} → {prod['read_max_ms']:.1f} ms")
+
+    def _run(self, name, pragmas, workdir, opts):
+        path = os.path.join(workdir, f"bench-{len(os.listdir(workdir))}.sqlite3")
+        rows, duration = opts["rows"], opts["duration"]
+        conn = _connect(path, pragmas)
+        conn.execute(SCHEMA)
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO bench_token (token, user_id, expires, scope) VALUES (?, ?, ?, ?)",
+            ((f"tok-{i}", i % 1000, time.time() + 3600, "read write") for i in range(rows)),
+        )
+        conn.execute("COMMIT")
+        conn.close()
+
+        start_at = time.time() + 0.5   # let every process connect first
+        with ProcessPoolExecutor(max_workers=opts["readers"] + 1) as pool:
+            writer = pool.submit(_writer, path, pragmas, rows, start_at, duration, 0)
+            readers = [pool.submit(_reader, path, pragmas, rows, start_at, duration, i + 1)
+                       for i in range(opts["readers"])]
+            write_lat, write_err = writer.result()
+            read_lat, read_err = [], 0
+            for future in readers:
+                lat, err = future.result()
+                read_lat.extend(lat)
+                read_err += err
+
+        return {
+            "profile": name,
+            "pragmas": pragmas,
+            "reads_per_s": len(read_lat) / duration,
+            "read_p50_ms": (statistics.median(read_lat) if read_lat else 0.0) * 1000,
+            "read_p99_ms": _percentile(read_lat, 99) * 1000,
+            "read_max_ms": max(read_lat, default=0.0) * 1000,
+            "writes_per_s": len(write_lat) / duration,
+            "write_p99_ms": _percentile(write_lat, 99) * 1000,
+            "lock_errors": read_err + write_err,
+        }
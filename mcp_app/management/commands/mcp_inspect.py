@@ -1,16 +1,18 @@
 # mcp_inspect.py
-import subprocess
+import time
 import webbrowser
 import hashlib
 import secrets
 import base64
-import requests
 from urllib.parse import urlencode
 
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
 from oauth2_provider.models import get_application_model
 
+from mcp_app.inspector import InspectorInstance, get_supervisor, inspector_command, inspector_ui_url
+from mcp_app.oauth_exchange import TokenExchangeError, exchange_code, is_local_token_url
+
 """
 Usage:
   python manage.py mcp_inspect [--client-id <ID> --client-secret <SECRET>] [--no-browser]
@@ -18,6 +20,11 @@ Usage:
 - If --client-id is passed, the script uses the existing Application.
 - For Confidential apps, you must pass --client-secret.
 - For Public apps, omit --client-secret (PKCE-only).
+- The Inspector is started through the same supervisor as the web launcher
+  (inspector_command(), allocated ports, the shared registry) before you
+  authorize, so it is ready once you have; it sends your access token with
+  its requests. Its UI port is the redirect URI unless --redirect-uri is
+  given.
 """
 
 def generate_pkce_pair():
@@ -37,7 +44,7 @@ class Command(BaseCommand):
         parser.add_argument("--password",      type=str, default="mcp_service123!", help="Admin password for new app")
         parser.add_argument("--email",         type=str, default="mcp_service@localhost", help="Admin email for new app")
         parser.add_argument("--client-name",   type=str, default="MCP Inspector App", help="OAuth app name when creating")
-        parser.add_argument("--redirect-uri",  type=str, default="http://127.0.0.1:6274/auth/callback", help="OAuth2 redirect URI")
+        parser.add_argument("--redirect-uri",  type=str, default=None, help="OAuth2 redirect URI (default: the Inspector's UI port)")
         parser.add_argument("--auth-url",      type=str, default="http://127.0.0.1:8000/o/authorize/", help="Authorization endpoint")
         parser.add_argument("--token-url",     type=str, default="http://127.0.0.1:8000/o/token/", help="Token endpoint")
         parser.add_argument("--introspect-url",type=str, default="http://127.0.0.1:8000/o/introspect/", help="Introspection endpoint")
@@ -76,7 +83,7 @@ class Command(BaseCommand):
                 name=opts["client_name"], user=user,
                 client_type=Application.CLIENT_PUBLIC,
                 authorization_grant_type=Application.GRANT_AUTHORIZATION_CODE,
-                defaults={"redirect_uris": opts["redirect_uri"]},
+                defaults={"redirect_uris": opts["redirect_uri"] or "http://127.0.0.1:6274/auth/callback"},
             )
             if created:
                 self.stdout.write(self.style.SUCCESS(f"✅ Created OAuth2 app: {app.name}"))
@@ -92,6 +99,32 @@ class Command(BaseCommand):
         if is_confidential and not client_secret:
             raise CommandError("OAuth2 client secret is required for a confidential application.")
 
+        # Start the Inspector now, so it comes up while the user authorizes
+        inspector_url = opts["inspector_url"].rstrip("/") + "/"
+        cmd = [
+            *inspector_command(), inspector_url,
+            "--transport", opts["transport"],
+            "--header", "Accept:application/json, text/event-stream",
+            "--auth-url", opts["auth_url"],
+            "--token-url", opts["token_url"],
+            "--introspect", opts["introspect_url"],
+            "--revocation", opts["revoke_url"],
+            "--client-id", client_id,
+        ]
+        if opts["redirect_uri"]:
+            cmd += ["--redirect", opts["redirect_uri"]]
+        supervisor = get_supervisor()
+        owner = f"user:{app.user_id}" if app.user_id else "cli"
+        self.stdout.write(self.style.NOTICE(f"\n🕵️ Starting Inspector:\n    {' '.join(cmd)}"))
+        instance = supervisor.launch(cmd, owner=owner)
+        if instance.state == InspectorInstance.FAILED:
+            raise CommandError(f"❌ {instance.error}")
+        redirect_uri = opts["redirect_uri"] or instance.redirect_uri
+        if not app.redirect_uri_allowed(redirect_uri):
+            supervisor.stop(instance.id, "redirect URI not registered")
+            raise CommandError(f"❌ {redirect_uri} is not a redirect URI of {app.name} "
+                               "(any port of a http://127.0.0.1 URI is accepted)")
+
         # Generate PKCE verifier & challenge
         code_verifier, code_challenge = generate_pkce_pair()
         self.stdout.write(f"🔐 Generated PKCE verifier (len={len(code_verifier)})")
@@ -100,7 +133,7 @@ class Command(BaseCommand):
         params = {
             "response_type":         "code",
             "client_id":             client_id,
-            "redirect_uri":          opts["redirect_uri"],
+            "redirect_uri":          redirect_uri,
             "scope":                 opts["scope"],
             "code_challenge":        code_challenge,
             "code_challenge_method": "S256",
@@ -120,10 +153,9 @@ class Command(BaseCommand):
         token_data = {
             "grant_type":    "authorization_code",
             "code":          code,
-            "redirect_uri":  opts["redirect_uri"],
+            "redirect_uri":  redirect_uri,
             "code_verifier": code_verifier,
         }
-        headers = {"Accept": "application/json"}
 
         if is_confidential:
             # Confidential: use Basic auth
@@ -133,11 +165,12 @@ class Command(BaseCommand):
             auth = None
             token_data["client_id"] = client_id
 
-        self.stdout.write(f"\n📡 Exchanging code at {opts['token_url']}…")
-        resp = requests.post(opts["token_url"], data=token_data, auth=auth, headers=headers)
-        if not resp.ok:
-            raise CommandError(f"❌ Token request failed: {resp.status_code} {resp.text}")
-        tok = resp.json()
+        where = "in-process" if is_local_token_url(opts["token_url"]) else f"at {opts['token_url']}"
+        self.stdout.write(f"\n📡 Exchanging code {where}…")
+        try:
+            tok = exchange_code(opts["token_url"], token_data, auth=auth)
+        except TokenExchangeError as exc:
+            raise CommandError(f"❌ Token request failed: {exc.status} {exc.payload}")
         access_token = tok.get("access_token")
         if not access_token:
             raise CommandError(f"❌ No access_token in response: {tok}")
@@ -145,28 +178,27 @@ class Command(BaseCommand):
         # Log the bearer token for Inspector use
         self.stdout.write(f"🔑 Bearer token: {access_token}")
 
-        # Launch MCP Inspector
-        inspector_url = opts["inspector_url"].rstrip("/") + "/"
-        cmd = [
-            "npx", "@modelcontextprotocol/inspector", inspector_url,
-            "--transport", opts["transport"],
-            "--header", "Accept:application/json, text/event-stream",
-            "--header", f"Authorization: Bearer {access_token}",
-            "--auth-url", opts["auth_url"],
-            "--token-url", opts["token_url"],
-            "--introspect", opts["introspect_url"],
-            "--revocation", opts["revoke_url"],
-            "--client-id", client_id,
-            "--redirect", opts["redirect_uri"],
-        ]
-        self.stdout.write(self.style.NOTICE(f"\n🕵️ Running Inspector:\n    {' '.join(cmd)}"))
+        # The Inspector's requests act with the token from now on
+        supervisor.bind(instance.id, owner, access_token)
+        while instance.state == InspectorInstance.STARTING:
+            time.sleep(0.2)
+        if instance.state != InspectorInstance.READY:
+            for line in instance.output:
+                self.stdout.write(line)
+            raise CommandError(f"❌ {instance.error or 'Inspector stopped before it was ready'}")
+        link = inspector_ui_url(instance.as_dict(), serverUrl=inspector_url, transport=opts["transport"])
+        self.stdout.write(self.style.SUCCESS(f"✅ Inspector ready: {link}"))
+        if not opts["no_browser"]:
+            webbrowser.open(link)
+
         try:
-            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            for line in proc.stdout:
-                self.stdout.write(line.rstrip())
-            exit_code = proc.wait()
-            if exit_code != 0:
-                raise CommandError(f"❌ Inspector exit code {exit_code}")
-            self.stdout.write(self.style.SUCCESS("✅ Inspector finished successfully"))
-        except FileNotFoundError:
-            raise CommandError("`npx` not found: please install Node.js & npm/npx.")
+            while instance.alive:
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            supervisor.stop(instance.id, "interrupted")
+            self.stdout.write(self.style.WARNING("\nℹ️ Inspector stopped"))
+            return
+        exit_code = instance.proc.returncode
+        if exit_code != 0:
+            raise CommandError(f"❌ Inspector exit code {exit_code}")
+        self.stdout.write(self.style.SUCCESS("✅ Inspector finished successfully"))
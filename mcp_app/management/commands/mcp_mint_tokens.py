@@ -0,0 +1,149 @@
+# mcp_app/management/commands/mcp_mint_tokens.py
+import csv
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model, get_application_model, set_token_value
+from oauthlib.common import generate_token
+
+"""
+Usage:
+  python manage.py mcp_mint_tokens --count 10000 [--users alice,bob | --synthetic-users 200]
+                                   [--scope "read write"] [--expires-in 3600] [--output tokens.txt]
+  python manage.py mcp_mint_tokens --cleanup
+
+Mints bearer tokens for /mcp load tests without the interactive PKCE flow:
+AccessTokens are written directly with bulk_create, spread round-robin over
+the given users, and the plaintext tokens go to --output (.txt one per line,
+.jsonl or .csv with user and expiry) with mode 0600.
+
+Minted tokens belong to the "MCP load test tokens" application, so --cleanup
+removes exactly them (plus the synthetic mcp-load-* users) and nothing else.
+"""
+
+LOAD_APP_NAME = "MCP load test tokens"
+SYNTHETIC_PREFIX = "mcp-load-"
+DELETE_CHUNK = 5000
+
+
+class Command(BaseCommand):
+    help = "Mint (or --cleanup) many AccessTokens directly for /mcp load tests and fixtures."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1000, help="Tokens to mint")
+        parser.add_argument("--users", help="Comma-separated existing usernames to mint for (round-robin)")
+        parser.add_argument("--synthetic-users", type=int, default=0,
+                            help=f"Create/reuse N users named {SYNTHETIC_PREFIX}<i> instead of --users")
+        parser.add_argument("--scope", default="read write", help="Space-separated scopes")
+        parser.add_argument("--expires-in", type=int, default=3600, help="Token lifetime in seconds (negative = already expired)")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows per INSERT")
+        parser.add_argument("--output", default="mcp-tokens.txt", help="Where to write the tokens (.txt, .jsonl or .csv)")
+        parser.add_argument("--cleanup", action="store_true", help="Delete every minted token and synthetic user")
+
+    def handle(self, *args, **opts):
+        if opts["cleanup"]:
+            return self._cleanup()
+        if opts["count"] <= 0:
+            raise CommandError("❌ --count must be positive")
+
+        users = self._users(opts)
+        app = self._application()
+        AccessToken = get_access_token_model()
+        expires = timezone.now() + timedelta(seconds=opts["expires_in"])
+        started = time.perf_counter()
+
+        minted = []
+        with transaction.atomic():
+            batch = []
+            for i in range(opts["count"]):
+                user = users[i % len(users)]
+                raw = generate_token()
+                token = AccessToken(user=user, application=app, expires=expires, scope=opts["scope"])
+                set_token_value(token, raw)   # honours DOT's hashed-at-rest storage setting
+                batch.append(token)
+                minted.append((raw, user.username))
+                if len(batch) >= opts["batch_size"]:
+                    AccessToken.objects.bulk_create(batch)
+                    batch = []
+            AccessToken.objects.bulk_create(batch)
+
+        took = time.perf_counter() - started
+        self._write(opts["output"], minted, expires, opts["scope"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Minted {len(minted)} tokens for {len(users)} users in {took:.1f}s "
+            f"({len(minted) / took:.0f}/s), expiring {expires:%Y-%m-%d %H:%M:%S}"))
+        self.stdout.write(f"🔑 Tokens written to {opts['output']}; "
+                          f"{AccessToken.objects.count()} access tokens in the table")
+
+    def _users(self, opts):
+        User = get_user_model()
+        if opts["synthetic_users"]:
+            names = [f"{SYNTHETIC_PREFIX}{i}" for i in range(opts["synthetic_users"])]
+            existing = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+            unusable = make_password(None)
+            User.objects.bulk_create(
+                [User(username=n, email=f"{n}@localhost", password=unusable) for n in names if n not in existing],
+                batch_size=500)
+        elif opts["users"]:
+            names = [n.strip() for n in opts["users"].split(",") if n.strip()]
+        else:
+            raise CommandError("❌ Pass --users or --synthetic-users")
+        found = User.objects.in_bulk(names, field_name="username")
+        missing = [n for n in names if n not in found]
+        if missing:
+            raise CommandError(f"❌ Unknown users: {', '.join(missing[:10])}")
+        return [found[n] for n in names]
+
+    def _application(self):
+        Application = get_application_model()
+        app, created = Application.objects.get_or_create(
+            name=LOAD_APP_NAME,
+            defaults={
+                "client_type": Application.CLIENT_CONFIDENTIAL,
+                "authorization_grant_type": Application.GRANT_CLIENT_CREDENTIALS,
+            },
+        )
+        if created:
+            self.stdout.write(self.style.SUCCESS(f"✅ Created OAuth2 app: {app.name}"))
+        return app
+
+    def _write(self, output, minted, expires, scope):
+        fd = os.open(output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        suffix = Path(output).suffix.lower()
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as fh:
+            if suffix == ".csv":
+                writer = csv.writer(fh)
+                writer.writerow(["token", "username", "expires", "scope"])
+                writer.writerows((raw, username, expires.isoformat(), scope) for raw, username in minted)
+            elif suffix in (".jsonl", ".ndjson"):
+                for raw, username in minted:
+                    fh.write(json.dumps({"token": raw, "username": username,
+                                         "expires": expires.isoformat(), "scope": scope}) + "\n")
+            else:
+                fh.writelines(raw + "\n" for raw, _ in minted)
+
+    def _cleanup(self):
+        AccessToken = get_access_token_model()
+        Application = get_application_model()
+        app = Application.objects.filter(name=LOAD_APP_NAME).first()
+        deleted = 0
+        if app is not None:
+            # Chunked so a million-row cleanup doesn't collect every token in memory at once
+            while True:
+                ids = list(AccessToken.objects.filter(application=app).values_list("pk", flat=True)[:DELETE_CHUNK])
+                if not ids:
+                    break
+                with transaction.atomic():
+                    deleted += AccessToken.objects.filter(pk__in=ids).delete()[1].get(AccessToken._meta.label, 0)
+            app.delete()
+        User = get_user_model()
+        users = User.objects.filter(username__startswith=SYNTHETIC_PREFIX).delete()[1].get(User._meta.label, 0)
+        self.stdout.write(self.style.SUCCESS(f"🧹 Deleted {deleted} minted tokens and {users} synthetic users"))
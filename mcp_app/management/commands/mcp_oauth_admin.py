@@ -1,6 +1,63 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from oauth2_provider.generators import generate_client_id, generate_client_secret
 from oauth2_provider.models import get_application_model
+from oauth2_provider.settings import oauth2_settings
+
+"""
+Usage:
+  python manage.py mcp_oauth_admin [--username mcp_service] [--client-secret <SECRET>] ...
+  python manage.py mcp_oauth_admin --from-file clients.csv [--output creds.jsonl] [--rotate-secrets] [--workers 8]
+
+--from-file provisions service users and their OAuth2 applications in bulk
+from CSV (header row) or JSONL, one client per row:
+
+  username        required; created if missing, email/password updated if present
+  email           optional
+  password        optional; users without one get an unusable password
+  client_name     optional, default "<username> client"; (username, client_name) identifies the app
+  client_type     "confidential" (default) or "public"
+  grant_type      default "authorization-code"
+  redirect_uris   optional, space separated; default --redirect-uri
+
+Everything is written in one transaction with bulk_create/bulk_update;
+passwords and client secrets are hashed in a process pool. Client ids and
+the plaintext secrets generated by this run (new confidential apps, or all
+of them with --rotate-secrets) are written to --output with mode 0600 -
+they are not recoverable afterwards.
+"""
+
+CLIENT_TYPES = {"confidential", "public"}
+POOL_THRESHOLD = 8   # below this many hashes a process pool costs more than it saves
+
+
+def _hash(item):
+    value, hasher = item
+    return make_password(value, hasher=hasher)
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as fh:
+        if Path(path).suffix.lower() in (".jsonl", ".ndjson"):
+            rows = []
+            for lineno, line in enumerate(fh, 1):
+                if line.strip():
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError as exc:
+                        raise CommandError(f"❌ {path}:{lineno}: invalid JSON ({exc})")
+            return rows
+        return list(csv.DictReader(fh))
 
 class Command(BaseCommand):
     help = "Setup admin user and OAuth2 application for MCP Inspector (public or confidential)"
@@ -13,8 +70,15 @@ class Command(BaseCommand):
         parser.add_argument('--redirect-uri', type=str, default='http://127.0.0.1:6274/auth/callback', help='OAuth redirect URI')
         parser.add_argument('--client-id', type=str, help='Use existing OAuth2 client ID')
         parser.add_argument('--client-secret', type=str, default='', help='OAuth2 client secret (for confidential apps)')
+        parser.add_argument('--from-file', type=str, help='CSV or JSONL of clients to provision in bulk')
+        parser.add_argument('--output', type=str, help='Where --from-file writes the credentials (default <file>.credentials.jsonl)')
+        parser.add_argument('--rotate-secrets', action='store_true', help='Issue new secrets for existing confidential apps too')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Hashing processes for --from-file')
 
     def handle(self, *args, **options):
+        if options['from_file']:
+            return self._provision_bulk(options)
+
         User = get_user_model()
         Application = get_application_model()
 
@@ -82,3 +146,149 @@ class Command(BaseCommand):
         self.stdout.write(f"Token URL:     http://127.0.0.1:8000/o/token/")
         self.stdout.write(f"Introspect:    http://127.0.0.1:8000/o/introspect/")
         self.stdout.write(f"Revocation:    http://127.0.0.1:8000/o/revoke/")
+
+    # ── bulk mode ──────────────────────────────────────────────
+    def _provision_bulk(self, options):
+        User = get_user_model()
+        Application = get_application_model()
+        started = time.perf_counter()
+
+        path = options['from_file']
+        try:
+            rows = [self._normalize(row, i, options) for i, row in enumerate(read_rows(path), 1)]
+        except FileNotFoundError:
+            raise CommandError(f"❌ {path} not found")
+        if not rows:
+            raise CommandError(f"❌ {path} has no rows")
+        keys = [(r['username'], r['client_name']) for r in rows]
+        if len(set(keys)) != len(keys):
+            raise CommandError("❌ Duplicate (username, client_name) pairs in the input")
+
+        usernames = {r['username'] for r in rows}
+        users = User.objects.in_bulk(usernames, field_name='username')
+        apps = {(app.user.username, app.name): app for app in
+                Application.objects.filter(user__username__in=usernames).select_related('user')}
+
+        # Plaintext secrets this run hands out, then everything to hash in one pool
+        for row in rows:
+            app = apps.get((row['username'], row['client_name']))
+            if row['client_type'] == Application.CLIENT_CONFIDENTIAL and (app is None or options['rotate_secrets']
+                                                                           or app.client_type != row['client_type']):
+                row['client_secret'] = generate_client_secret()
+            else:
+                row['client_secret'] = None
+        passwords = {r['username']: r['password'] for r in rows if r['password']}
+        work = ([(p, "default") for p in passwords.values()] +
+                [(r['client_secret'], oauth2_settings.CLIENT_SECRET_HASHER) for r in rows if r['client_secret']])
+        hashed = self._hash_all(work, options['workers'])
+        hashed_passwords = dict(zip(passwords, hashed))
+        hashed_secrets = iter(hashed[len(passwords):])
+
+        output = options['output'] or f"{path}.credentials.jsonl"
+        with transaction.atomic():
+            new_users, changed_users, seen = [], [], set()
+            for row in rows:
+                username = row['username']
+                user = users.get(username)
+                if user is None:
+                    user = User(username=username, email=row['email'],
+                                password=hashed_passwords.get(username) or make_password(None))
+                    users[username] = user
+                    new_users.append(user)
+                elif username not in seen and (row['email'] or username in hashed_passwords):
+                    user.email = row['email'] or user.email
+                    user.password = hashed_passwords.get(username, user.password)
+                    changed_users.append(user)
+                seen.add(username)
+            User.objects.bulk_create(new_users, batch_size=500)
+            User.objects.bulk_update(changed_users, ['email', 'password'], batch_size=500)
+            # Re-read so users created above carry their primary keys on every backend
+            users = User.objects.in_bulk(usernames, field_name='username')
+
+            new_apps, changed_apps, credentials = [], [], []
+            for row in rows:
+                app = apps.get((row['username'], row['client_name']))
+                if app is None:
+                    app = Application(client_id=generate_client_id(), name=row['client_name'],
+                                      user=users[row['username']], client_secret='')
+                    new_apps.append(app)
+                else:
+                    changed_apps.append(app)
+                app.client_type = row['client_type']
+                app.authorization_grant_type = row['grant_type']
+                app.redirect_uris = row['redirect_uris']
+                if row['client_secret']:
+                    app.client_secret = next(hashed_secrets)   # already hashed; pre_save leaves it alone
+                elif row['client_type'] == Application.CLIENT_PUBLIC:
+                    app.client_secret = ''   # a public client has no secret, not a stale one
+                credentials.append({
+                    'username': row['username'],
+                    'client_name': row['client_name'],
+                    'client_id': app.client_id,
+                    'client_secret': row['client_secret'],
+                    'client_type': row['client_type'],
+                    'redirect_uris': row['redirect_uris'],
+                })
+            Application.objects.bulk_create(new_apps, batch_size=500)
+            Application.objects.bulk_update(
+                changed_apps, ['client_type', 'authorization_grant_type', 'redirect_uris', 'client_secret'],
+                batch_size=500)
+
+            # Still inside the transaction: secrets that can't be written never reach the database
+            try:
+                self._write_credentials(output, credentials)
+            except OSError as exc:
+                raise CommandError(f"❌ Could not write credentials to {output}: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(rows)} clients in {time.perf_counter() - started:.1f}s: "
+            f"{len(new_users)} users created, {len(changed_users)} updated; "
+            f"{len(new_apps)} apps created, {len(changed_apps)} updated; {len(work)} hashes"))
+        self.stdout.write(f"🔑 Credentials written to {output} "
+                          f"({sum(1 for c in credentials if c['client_secret'])} new secrets)")
+
+    def _normalize(self, row, lineno, options):
+        Application = get_application_model()
+        row = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+        username = row.get('username')
+        if not username:
+            raise CommandError(f"❌ Row {lineno}: username is required")
+        client_type = (row.get('client_type') or Application.CLIENT_CONFIDENTIAL).lower()
+        if client_type not in CLIENT_TYPES:
+            raise CommandError(f"❌ Row {lineno}: client_type must be confidential or public")
+        grant_type = row.get('grant_type') or Application.GRANT_AUTHORIZATION_CODE
+        if grant_type not in dict(Application.GRANT_TYPES):
+            raise CommandError(f"❌ Row {lineno}: unknown grant_type {grant_type!r}")
+        return {
+            'username': username,
+            'email': row.get('email') or '',
+            'password': row.get('password') or None,
+            'client_name': row.get('client_name') or f"{username} client",
+            'client_type': client_type,
+            'grant_type': grant_type,
+            'redirect_uris': row.get('redirect_uris') or options['redirect_uri'],
+        }
+
+    def _hash_all(self, work, workers):
+        if len(work) < POOL_THRESHOLD or workers <= 1:
+            return [_hash(item) for item in work]
+        # initializer covers spawn-based platforms; under fork settings are inherited
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            return list(pool.map(_hash, work, chunksize=max(1, len(work) // (workers * 4))))
+
+    def _write_credentials(self, output, credentials):
+        fd = os.open(output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8') as fh:
+                if Path(output).suffix.lower() == '.csv':
+                    writer = csv.DictWriter(fh, fieldnames=list(credentials[0]))
+                    writer.writeheader()
+                    writer.writerows(credentials)
+                else:
+                    for cred in credentials:
+                        fh.write(json.dumps(cred) + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+        except OSError:
+            os.unlink(output)   # a partial file would list secrets the rollback discards
+            raise
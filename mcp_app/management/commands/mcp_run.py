@@ -1,11 +1,30 @@
 # apps/mcp/management/commands/mcp_run.py
-# this is only for running the MCP server over stdio for Claude Desktop
+# Run the MCP server standalone: stdio for Claude Desktop, or streamable-http/sse
+# in one process or pre-forked across cores with --workers.
 import os
 import django
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
+
+def http_app(transport):
+    """
+    The ASGI app HTTP transports serve: djproject.asgi's, so the auth
+    middleware and the lifespan services (audit writer, session reaper,
+    drain, warm-up) run here too. Imported inside each pre-fork worker.
+    """
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+
+    from djproject import asgi
+
+    if transport == "streamable-http":
+        return asgi.application
+    sse_app = asgi.mcp_instance.http_app(transport="sse", middleware=asgi.middleware)
+    return Starlette(routes=[Mount("/", sse_app)], lifespan=asgi.make_lifespan(sse_app))
+
 
 class Command(BaseCommand):
-    help = "Run FastMCP server (stdio only, for Claude Desktop)"
+    help = "Run FastMCP server (stdio for Claude Desktop, or HTTP with optional pre-fork workers)"
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -14,6 +33,20 @@ class Command(BaseCommand):
             default="stdio",
             help="Transport protocol for FastMCP"
         )
+        parser.add_argument("--host", type=str, default="127.0.0.1", help="Bind address for HTTP transports")
+        parser.add_argument("--port", type=int, default=8000, help="Port for HTTP transports")
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Worker processes for HTTP transports (0 = one per CPU core)"
+        )
+        parser.add_argument(
+            "--reuse-port", action="store_true",
+            help="Each worker binds its own SO_REUSEPORT socket instead of sharing an inherited one"
+        )
+        parser.add_argument(
+            "--graceful-timeout", type=int, default=30,
+            help="Seconds a worker may take to finish in-flight requests on restart/shutdown"
+        )
 
     def handle(self, *args, **options):
         # 1) Ensure we point at the correct settings module
@@ -24,9 +57,39 @@ class Command(BaseCommand):
         from mcp_app.mcp_server import djmcp as mcp_instance
 
         transport = options["transport"]
+        workers = options["workers"] or os.cpu_count() or 1
+
+        if transport == "stdio" or workers == 1:
+            self.stdout.write(self.style.SUCCESS(
+                f"🚀 Running FastMCP server over {transport}"
+            ))
+            # 3) Start it—stdout/stderr will go to your console by default
+            if transport == "stdio":
+                mcp_instance.run(transport=transport)
+            else:
+                import uvicorn
+
+                # log_config=None: Django's LOGGING is already set up; a second
+                # dictConfig would close the mcp.* queue handler
+                uvicorn.run(http_app(transport), host=options["host"], port=options["port"],
+                            lifespan="on", log_config=None,
+                            timeout_graceful_shutdown=options["graceful_timeout"])
+            return
+
+        # 3b) Pre-fork: the app is built inside each worker, after fork()
+        if not hasattr(os, "fork"):
+            raise CommandError("--workers requires a platform with fork()")
+        from mcp_app.prefork import PreforkSupervisor
+
         self.stdout.write(self.style.SUCCESS(
-            f"🚀 Running FastMCP server over {transport}"
+            f"🚀 Running FastMCP server over {transport} on {options['host']}:{options['port']} "
+            f"with {workers} workers (SIGHUP = rolling restart)"
         ))
-
-        # 3) Start it—stdout/stderr will go to your console by default
-        mcp_instance.run(transport=transport)
\ No newline at end of file
+        PreforkSupervisor(
+            app_factory=lambda: http_app(transport),
+            host=options["host"],
+            port=options["port"],
+            workers=workers,
+            reuse_port=options["reuse_port"],
+            graceful_timeout=options["graceful_timeout"],
+        ).run()
@@ -0,0 +1,122 @@
+# mcp_app/management/commands/mcp_startup_profile.py
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+"""
+Usage:
+  python manage.py mcp_startup_profile [--top 25] [--json]
+
+Starts a fresh interpreter with `-X importtime`, imports djproject.asgi and
+times each start-up phase up to the first served request, then prints the
+phase breakdown, import time per top-level package and the slowest modules.
+"""
+
+# Runs in the child interpreter; prints one JSON line of phase timings.
+PHASE_SCRIPT = r"""
+import asyncio, json, os, time
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djproject.settings")
+phases = []
+def timed(name, start):
+    now = time.perf_counter()
+    phases.append((name, (now - start) * 1000))
+    return now
+
+t = time.perf_counter()
+import django
+django.setup()
+t = timed("django.setup()", t)
+import mcp_app.mcp_server
+t = timed("import mcp_app.mcp_server (fastmcp)", t)
+import djproject.asgi as asgi
+t = timed("import rest of djproject.asgi", t)
+
+async def main():
+    import httpx
+    t = time.perf_counter()
+    app = asgi.application
+    async with app.router.lifespan_context(app):
+        t = timed("lifespan startup", t)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://127.0.0.1:8000") as client:
+            await client.get("/.well-known/oauth-authorization-server")
+            t = timed("first request (metadata)", t)
+            await client.post("/mcp/", json={"jsonrpc": "2.0", "id": 1, "method": "ping"})
+            t = timed("first /mcp request (auth stack)", t)
+        await asgi.mcp_instance.get_tools()
+        t = timed("first tools/list (tool modules)", t)
+
+asyncio.run(main())
+print("PHASES " + json.dumps(phases))
+"""
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (module, self_us, cumulative_us) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            _, self_us, cumulative_us, name = (part.strip() for part in
+                                               line.replace("import time:", "|", 1).split("|"))
+            rows.append((name, int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Report import-time and start-up phase breakdown of the ASGI application."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=25, help="Number of slowest modules to show")
+        parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+
+    def handle(self, *args, **opts):
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", "djproject.settings")
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PHASE_SCRIPT],
+            capture_output=True, text=True, env=env,
+        )
+        phase_line = next((l for l in proc.stdout.splitlines() if l.startswith("PHASES ")), None)
+        if proc.returncode != 0 or phase_line is None:
+            tail = "\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:"))
+            raise CommandError(f"❌ Profiling run failed (exit {proc.returncode}):\n{tail[-2000:]}")
+
+        phases = json.loads(phase_line[len("PHASES "):])
+        modules = parse_importtime(proc.stderr)
+        by_package = defaultdict(int)
+        for name, self_us, _ in modules:
+            by_package[name.split(".")[0]] += self_us
+        packages = sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)
+        slowest = sorted(modules, key=lambda row: row[2], reverse=True)[:opts["top"]]
+
+        if opts["json"]:
+            self.stdout.write(json.dumps({
+                "phases_ms": dict(phases),
+                "total_ms": sum(ms for _, ms in phases),
+                "import_ms_by_package": {k: v / 1000 for k, v in packages},
+                "slowest_modules": [
+                    {"module": n, "self_ms": s / 1000, "cumulative_ms": c / 1000} for n, s, c in slowest
+                ],
+            }, indent=2))
+            return
+
+        total = sum(ms for _, ms in phases)
+        self.stdout.write(self.style.SUCCESS(f"⏱️ Time to first request: {total:.1f} ms"))
+        for name, ms in phases:
+            self.stdout.write(f"  {name:<36} {ms:9.1f} ms")
+
+        self.stdout.write("\n📦 Import time by top-level package (self time):")
+        for name, us in packages[:15]:
+            self.stdout.write(f"  {name:<36} {us / 1000:9.1f} ms")
+
+        self.stdout.write(f"\n🐢 Slowest {len(slowest)} modules (cumulative):")
+        for name, self_us, cumulative_us in slowest:
+            self.stdout.write(f"  {name:<52} {cumulative_us / 1000:9.1f} ms  (self {self_us / 1000:.1f})")
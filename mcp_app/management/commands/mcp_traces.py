@@ -0,0 +1,123 @@
+# mcp_app/management/commands/mcp_traces.py
+import json
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mcp_app.tracing import attribute_dict, otlp_spans, rank, summarize
+
+"""
+Usage:
+  python manage.py mcp_traces [--file traces.jsonl] [--top 20] [--name search_any] [--json]
+  python manage.py mcp_traces --trace <trace_id>
+
+Reads OTLP/JSON traces written by the "file" trace exporter (including its
+rotated backups), or a dump saved from /mcp-demo/traces/?trace=<id>, and
+ranks the slowest; --trace prints one trace as a span tree. The default
+"memory" exporter keeps traces inside each worker, where only
+/mcp-demo/traces/ can see them.
+"""
+
+
+def read_traces(paths):
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+class Command(BaseCommand):
+    help = "Rank the slowest /mcp request traces or show one as a span tree."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", action="append", help="Trace file (repeatable); default MCP_TRACE_FILE and its backups")
+        parser.add_argument("--top", type=int, default=20, help="Number of traces to list")
+        parser.add_argument("--name", help="Only traces whose root or tool name contains this")
+        parser.add_argument("--trace", help="Print the span tree of this trace id")
+        parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+
+    def handle(self, *args, **opts):
+        paths = opts["file"]
+        if not paths:
+            exporter = getattr(settings, "MCP_TRACE_EXPORTER", "memory")
+            if exporter != "file":
+                raise CommandError(
+                    f"❌ MCP_TRACE_EXPORTER is {exporter!r}: traces are "
+                    + ("kept in each worker's memory (see /mcp-demo/traces/ as staff)" if exporter == "memory"
+                       else "not recorded")
+                    + "; set it to \"file\" to rank them here, or pass --file")
+            base = os.fspath(getattr(settings, "MCP_TRACE_FILE", os.path.join(settings.BASE_DIR, "traces", "mcp-traces.jsonl")))
+            backups = getattr(settings, "MCP_TRACE_FILE_BACKUPS", 3)
+            paths = [base] + [f"{base}.{i}" for i in range(1, backups + 1)]
+        if not any(os.path.exists(p) for p in paths):
+            raise CommandError(f"❌ No trace files found ({paths[0]}); set MCP_TRACE_EXPORTER = \"file\"")
+
+        if opts["trace"]:
+            for doc in read_traces(paths):
+                row = summarize(doc)
+                if row and row["trace_id"].startswith(opts["trace"]):
+                    self._print_tree(doc, opts["json"])
+                    return
+            raise CommandError(f"❌ Trace {opts['trace']} not found")
+
+        rows = rank(read_traces(paths), top=opts["top"], name=opts["name"])
+        if opts["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        if not rows:
+            self.stdout.write(self.style.WARNING("ℹ️ No traces recorded yet"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"🐢 Slowest {len(rows)} traces"))
+        self.stdout.write(f"  {'duration':>10}  {'db':>14}  {'when':<19}  {'trace':<16}  request")
+        for row in rows:
+            when = datetime.fromtimestamp(row["start"]).strftime("%Y-%m-%d %H:%M:%S")
+            db = f"{row['db_queries']}q/{row['db_ms']:.1f}ms"
+            label = row["name"] + (f" → {', '.join(row['tools'])}" if row["tools"] else "")
+            flag = self.style.ERROR(" ✖") if row["error"] else ""
+            self.stdout.write(f"  {row['duration_ms']:8.1f}ms  {db:>14}  {when:<19}  {row['trace_id'][:16]}  {label}{flag}")
+
+    def _print_tree(self, doc, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(doc, indent=2))
+            return
+        spans = otlp_spans(doc)
+        children = {}
+        for span in spans:
+            children.setdefault(span.get("parentSpanId"), []).append(span)
+        for siblings in children.values():
+            siblings.sort(key=lambda s: int(s["startTimeUnixNano"]))
+        roots = children.get(None, [])
+        if not roots:
+            return
+        t0 = int(roots[0]["startTimeUnixNano"])
+
+        def walk(span, depth):
+            start = (int(span["startTimeUnixNano"]) - t0) / 1e6
+            took = (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+            attrs = attribute_dict(span)
+            detail = attrs.get("db.statement") or ", ".join(
+                f"{k}={v}" for k, v in attrs.items() if k.startswith(("mcp.", "http.response", "rpc.method")))
+            line = f"  +{start:8.1f}ms {took:8.1f}ms  {'  ' * depth}{span['name']}"
+            if detail:
+                line += f"  [{detail[:120]}]"
+            if span.get("status", {}).get("code") == 2:
+                line = self.style.ERROR(line + f"  ✖ {span['status'].get('message', '')}")
+            self.stdout.write(line)
+            for child in children.get(span["spanId"], []):
+                walk(child, depth + 1)
+
+        self.stdout.write(self.style.SUCCESS(f"🔎 Trace {roots[0]['traceId']}"))
+        for root in roots:
+            walk(root, 0)
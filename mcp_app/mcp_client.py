@@ -0,0 +1,326 @@
+# mcp_app/mcp_client.py
+"""
+Pooled client for services that call djmcp tools.
+
+    auth = TokenAuth(token, token_url="https://psm.example/o/token/",
+                     client_id="...", client_secret="...", refresh_token="...")
+    async with McpPool("https://psm.example/mcp/", auth=auth, size=4) as pool:
+        tools = await pool.list_tools()
+        hits = await pool.call_many([("search_any", {"model": "project", "query": q}) for q in queries])
+
+- ``size`` MCP sessions are opened once (initialize handshake included) and
+  reused for every call; one session carries any number of concurrent
+  requests, and each call goes to the session with the fewest in flight.
+  Every session has its own httpx connection pool kept alive for
+  ``keepalive`` seconds (httpx drops idle connections after 5 by default).
+- at most ``max_concurrency`` calls are in flight across the pool;
+  ``call_many`` fans out a list of calls under that bound.
+- a call gets ``timeout`` seconds (or its own ``timeout=``) and raises
+  TimeoutError when the server hasn't answered by then.
+- when the server no longer knows a session (idle reaper, restart, another
+  worker) the session is re-initialized and the call sent again. That only
+  happens when the server rejected the request before running it; a call
+  lost to a broken connection is not repeated (tools aren't idempotent), but
+  its session is replaced for the next one.
+- TokenAuth sends the bearer token, refreshes it through /o/token/ shortly
+  before ``expires_in`` runs out and once more on a 401, with the
+  refresh_token grant (or client_credentials when there is no refresh
+  token). Concurrent requests share a single refresh.
+
+Only httpx and fastmcp are needed; Django is imported by ``from_settings()``
+alone, so the module works in services that aren't Django projects (or
+don't have Django installed).
+"""
+import asyncio
+import logging
+import time
+
+import anyio
+import httpx
+from fastmcp import Client
+from fastmcp.client.transports import StreamableHttpTransport
+from mcp.shared.exceptions import McpError
+
+logger = logging.getLogger("mcp.client")
+
+SESSION_TERMINATED = 32600                   # what mcp's client reports when the server answers 404
+REQUEST_TIMEOUT = httpx.codes.REQUEST_TIMEOUT
+CONNECTION_LOST = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+
+
+class McpClientError(Exception):
+    pass
+
+
+class TokenRefreshError(McpClientError):
+    def __init__(self, status, payload):
+        self.status = status
+        self.payload = payload
+        super().__init__(f"token endpoint returned {status}: {payload}")
+
+
+class TokenAuth(httpx.Auth):
+    """Bearer token for /mcp, refreshed through the token endpoint."""
+
+    def __init__(self, token=None, *, token_url=None, client_id=None, client_secret=None,
+                 refresh_token=None, scope=None, expires_in=None, refresh_margin=30, timeout=10):
+        self.token = token
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_token = refresh_token
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + expires_in if expires_in else None
+        self.refreshed_total = 0
+        self._lock = None
+        self._http = None
+
+    @property
+    def can_refresh(self):
+        return bool(self.token_url and (self.refresh_token or self.client_secret))
+
+    def _due(self):
+        if self.token is None:
+            return True
+        return self.expires_at is not None and time.monotonic() >= self.expires_at - self.refresh_margin
+
+    async def ensure_token(self):
+        if self._due() and self.can_refresh:
+            await self.refresh()
+        if self.token is None:
+            raise McpClientError("no bearer token and nothing to obtain one with")
+
+    async def async_auth_flow(self, request):
+        await self.ensure_token()
+        sent = self.token
+        request.headers["Authorization"] = f"Bearer {sent}"
+        response = yield request
+        if response.status_code == 401 and self.can_refresh:
+            await self.refresh(stale=sent)
+            request.headers["Authorization"] = f"Bearer {self.token}"
+            yield request
+
+    async def refresh(self, stale=None):
+        """
+        Fetch a new access token. With ``stale`` set, nothing happens if the
+        token was already replaced since ``stale`` was sent.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if stale is not None and self.token != stale:
+                return
+            if self.refresh_token:
+                data = {"grant_type": "refresh_token", "refresh_token": self.refresh_token}
+            else:
+                data = {"grant_type": "client_credentials"}
+            if self.scope:
+                data["scope"] = self.scope
+            auth = None
+            if self.client_secret:
+                auth = (self.client_id, self.client_secret)
+            elif self.client_id:
+                data["client_id"] = self.client_id   # public client
+
+            if self._http is None:
+                self._http = httpx.AsyncClient(timeout=self.timeout,
+                                               limits=httpx.Limits(keepalive_expiry=60))
+            try:
+                resp = await self._http.post(self.token_url, data=data, auth=auth,
+                                             headers={"Accept": "application/json"})
+                payload = resp.json()
+            except httpx.HTTPError as exc:
+                raise TokenRefreshError(502, {"error": "token_endpoint_unreachable", "detail": str(exc)})
+            except ValueError:
+                raise TokenRefreshError(resp.status_code, {"error": "invalid_response", "detail": resp.text[:200]})
+            if resp.status_code != 200 or "access_token" not in payload:
+                raise TokenRefreshError(resp.status_code, payload)
+
+            self.token = payload["access_token"]
+            self.refresh_token = payload.get("refresh_token", self.refresh_token)   # rotated by DOT
+            expires_in = payload.get("expires_in")
+            self.expires_at = time.monotonic() + float(expires_in) if expires_in else None
+            self.refreshed_total += 1
+            logger.info("Refreshed MCP bearer token", extra={"expires_in": expires_in})
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class _Slot:
+    def __init__(self, index):
+        self.index = index
+        self.client = None
+        self.in_flight = 0
+        self.lock = asyncio.Lock()
+        self.sessions_opened = 0
+
+
+class McpPool:
+    def __init__(self, url, auth=None, *, size=4, max_concurrency=16, timeout=30.0,
+                 connect_timeout=10.0, keepalive=60.0, headers=None):
+        if isinstance(auth, str):
+            auth = TokenAuth(auth)
+        self.url = url
+        self.auth = auth
+        self.size = max(1, size)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive = keepalive
+        self.headers = {"Accept": "application/json, text/event-stream", **(headers or {})}
+        self.reinitialized_total = 0
+        self._slots = [_Slot(i) for i in range(self.size)]
+        self._semaphore = None
+        self._closed = False
+
+    @classmethod
+    def from_settings(cls, url, auth=None, **kwargs):
+        """Pool sized by the MCP_CLIENT_* Django settings; the only part that needs Django."""
+        from django.conf import settings
+
+        options = {
+            "size": getattr(settings, "MCP_CLIENT_POOL_SIZE", 4),
+            "max_concurrency": getattr(settings, "MCP_CLIENT_MAX_CONCURRENCY", 16),
+            "timeout": getattr(settings, "MCP_CLIENT_TIMEOUT", 30.0),
+            "keepalive": getattr(settings, "MCP_CLIENT_KEEPALIVE", 60.0),
+        }
+        options.update(kwargs)
+        return cls(url, auth, **options)
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    # ── sessions ───────────────────────────────────────────────
+    async def open(self):
+        """Open every session now instead of on first use."""
+        await asyncio.gather(*(self._client(slot) for slot in self._slots))
+
+    async def close(self):
+        self._closed = True
+        await asyncio.gather(*(self._reset(slot) for slot in self._slots), return_exceptions=True)
+        if isinstance(self.auth, TokenAuth):
+            await self.auth.aclose()
+
+    def _http_client(self, headers=None, timeout=None, auth=None):
+        return httpx.AsyncClient(
+            headers=headers, timeout=timeout, auth=auth, follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.max_concurrency + 2,
+                                max_keepalive_connections=self.max_concurrency,
+                                keepalive_expiry=self.keepalive),
+        )
+
+    async def _client(self, slot):
+        client = slot.client
+        if client is not None:
+            return client
+        async with slot.lock:
+            if slot.client is not None:
+                return slot.client
+            if self._closed:
+                raise McpClientError("pool is closed")
+            if isinstance(self.auth, TokenAuth):
+                await self.auth.ensure_token()   # refresh failures surface here, not in the transport
+            transport = StreamableHttpTransport(self.url, headers=self.headers, auth=self.auth,
+                                                httpx_client_factory=self._http_client)
+            client = Client(transport, timeout=self.timeout, init_timeout=self.connect_timeout)
+            await client._connect()
+            if not client.is_connected():
+                task = client._session_task
+                error = task.exception() if task is not None and task.done() else None
+                await client.close()
+                raise McpClientError(f"could not open an MCP session at {self.url}: {error}") from error
+            slot.client = client
+            slot.sessions_opened += 1
+            logger.debug("Opened MCP session %d", slot.index)
+            return client
+
+    async def _reset(self, slot, client=None):
+        """Close ``slot``'s session (only if it is still ``client``) so the next call opens a new one."""
+        async with slot.lock:
+            if slot.client is None or (client is not None and slot.client is not client):
+                return
+            client, slot.client = slot.client, None
+        try:
+            with anyio.move_on_after(self.connect_timeout):
+                await client.close()
+        except Exception:
+            logger.debug("Closing MCP session %d failed", slot.index, exc_info=True)
+
+    def _pick(self):
+        return min(self._slots, key=lambda slot: (slot.client is None, slot.in_flight))
+
+    async def _run(self, method, *args, idempotent, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            slot = self._pick()
+            for attempt in (0, 1):   # a retry goes to the same slot, over its fresh session
+                slot.in_flight += 1
+                client = None
+                try:
+                    if isinstance(self.auth, TokenAuth) and self.auth._due():
+                        await self.auth.ensure_token()
+                    client = await self._client(slot)
+                    return await getattr(client, method)(*args, **kwargs)
+                except McpError as exc:
+                    if exc.error.code == REQUEST_TIMEOUT:
+                        raise TimeoutError(exc.error.message) from exc
+                    if exc.error.code != SESSION_TERMINATED:
+                        raise
+                    await self._reset(slot, client)
+                    if attempt:
+                        raise McpClientError("server dropped the MCP session twice") from exc
+                    self.reinitialized_total += 1
+                    logger.info("MCP session %d expired; re-initializing", slot.index)
+                except (*CONNECTION_LOST, httpx.HTTPError, RuntimeError) as exc:
+                    if client is None:
+                        raise McpClientError(f"could not open an MCP session at {self.url}: {exc!r}") from exc
+                    # the session's streams are gone; the request may or may not have reached the server
+                    await self._reset(slot, client)
+                    if attempt or not idempotent:
+                        raise McpClientError(f"MCP session lost during {method}: {exc!r}") from exc
+                    self.reinitialized_total += 1
+                finally:
+                    slot.in_flight -= 1
+
+    # ── calls ──────────────────────────────────────────────────
+    async def call_tool(self, name, arguments=None, timeout=None):
+        """Content list of the tool's result; ToolError when the tool failed."""
+        return await self._run("call_tool", name, arguments or {}, idempotent=False,
+                               timeout=timeout if timeout is not None else self.timeout)
+
+    async def call_many(self, calls, return_exceptions=False, timeout=None):
+        """
+        Run ``calls`` — (name, arguments) pairs — concurrently, at most
+        ``max_concurrency`` at a time, and return their results in order.
+        """
+        return await asyncio.gather(*(self.call_tool(name, arguments, timeout=timeout)
+                                      for name, arguments in calls),
+                                    return_exceptions=return_exceptions)
+
+    async def list_tools(self):
+        return await self._run("list_tools", idempotent=True)
+
+    async def read_resource(self, uri):
+        return await self._run("read_resource", uri, idempotent=True)
+
+    async def ping(self):
+        return await self._run("ping", idempotent=True)
+
+    def stats(self):
+        return {
+            "sessions": sum(slot.client is not None for slot in self._slots),
+            "in_flight": sum(slot.in_flight for slot in self._slots),
+            "sessions_opened": sum(slot.sessions_opened for slot in self._slots),
+            "reinitialized_total": self.reinitialized_total,
+            "token_refreshes": getattr(self.auth, "refreshed_total", 0),
+        }
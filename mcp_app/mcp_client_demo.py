@@ -1,4 +1,7 @@
 # apps/mcp/mcp_client_demo.py
+#
+#   python mcp_app/mcp_client_demo.py --username U --password P
+#   python -m mcp_app.mcp_client_demo --token T      (from the project root; imports mcp_app)
 
 import asyncio
 import base64
@@ -35,11 +38,30 @@ async def example(url: str, username: str, password: str):
         resp = await client.call_tool("search_any", {"model": "project", "query": "Station"})
         print("📦 Search Any:", resp)
 
+async def pooled_example(url: str, token: str, fan_out: int):
+    from mcp_app.mcp_client import McpPool
+
+    # Services should keep one pool around instead of a session per batch of calls
+    async with McpPool(url, auth=token, size=4, max_concurrency=16, timeout=30) as pool:
+        tools = await pool.list_tools()
+        print("🛠️ Available tools:", [tool.name for tool in tools])
+
+        calls = [("echo", {"message": f"Hello #{i}"}) for i in range(fan_out)]
+        results = await pool.call_many(calls)
+        print(f"🔁 {len(results)} echoes over {pool.stats()['sessions']} sessions:", results[-1])
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--url", default="http://127.0.0.1:8000/mcp/", help="MCP base URL")
-    parser.add_argument("--username", required=True, help="Django username")
-    parser.add_argument("--password", required=True, help="Django password")
+    parser.add_argument("--username", help="Django username")
+    parser.add_argument("--password", help="Django password")
+    parser.add_argument("--token", help="Bearer token; runs the pooled example instead")
+    parser.add_argument("--fan-out", type=int, default=50, help="Concurrent calls in the pooled example")
     args = parser.parse_args()
 
-    asyncio.run(example(args.url, args.username, args.password))
\ No newline at end of file
+    if args.token:
+        asyncio.run(pooled_example(args.url, args.token, args.fan_out))
+    elif args.username and args.password:
+        asyncio.run(example(args.url, args.username, args.password))
+    else:
+        parser.error("pass --token, or --username and --password")
\ No newline at end of file
@@ -1,25 +1,49 @@
-from django.urls import reverse
-from django.contrib.auth import get_user_model
-from apps.psm.models import Project
-# from tickets.models import Ticket
+from django.urls import NoReverseMatch, reverse
+
+# Models are referenced by "app_label.ModelName" and only resolved (via
+# McpAppConfig.get_searchable) the first time a search needs them, so this
+# module is cheap to import and entries for uninstalled apps are skipped.
+# "permissions" (optional) are the Django permissions a caller needs before
+# search_any will search, or list_searchable_models show, an entry.
+
+
+def _absolute_url(obj):
+    return obj.get_absolute_url() if hasattr(obj, "get_absolute_url") else "#"
+
+
+def _project_display(obj):
+    return obj.title
+
+
+def _user_url(obj):
+    try:
+        return reverse("user:profile", args=[obj.pk])
+    except NoReverseMatch:
+        return "#"
+
+
+def _user_display(obj):
+    return f"{obj.get_full_name()} ({obj.username})"
+
 
 SEARCHABLE_MODELS = {
     "projects": {
-        "model": Project,
+        "model": "psm.Project",
         "fields": ["title", "code", "description"],
-        "get_url": lambda obj: obj.get_absolute_url() if hasattr(obj, "get_absolute_url") else "#",
-        "display": lambda obj: obj.title,
+        "get_url": _absolute_url,
+        "display": _project_display,
     },
     # "tickets": {
-    #     "model": Ticket,
+    #     "model": "tickets.Ticket",
     #     "fields": ["title", "summary"],
     #     "get_url": lambda obj: reverse("tickets:ticket-detail", args=[obj.pk]),
     #     "display": lambda obj: f"{obj.title}",
     # },
     "users": {
-        "model": get_user_model(),
+        "model": "users.User",
         "fields": ["username", "first_name", "last_name", "email"],
-        "get_url": lambda obj: reverse("user:profile", args=[obj.pk]),
-        "display": lambda obj: f"{obj.get_full_name()} ({obj.username})",
+        "get_url": _user_url,
+        "display": _user_display,
+        "permissions": ["users.view_user"],   # matches on email addresses
     },
-}
\ No newline at end of file
+}
@@ -1,9 +1,106 @@
 # apps/mcp/server/mcp_server.py
+import logging
+import time
+
 from fastmcp import FastMCP
-from asgiref.sync import sync_to_async
-from django.contrib.auth.decorators import login_required
+from fastmcp.exceptions import ToolError
+from django.apps import apps
+
+from .audit import audit_log
+from .drain import drain_state
+from .encoding import dumps
+from .permissions import request_auth, tool_policy
+from .spill import spill_store
+from .tracing import traced_handler, tracer
+
+logger = logging.getLogger("mcp.tools")
+
+
+class DjangoFastMCP(FastMCP):
+    """
+    FastMCP that imports the project's tool modules on first use
+    (see McpAppConfig.load_tools) instead of at server import time, counts
+    running tool calls so a shutdown can wait for them (see drain.py),
+    traces JSON-RPC dispatch and tool bodies (see tracing.py), queues an
+    audit record per tool call (see audit.py), returns oversized results
+    as spill:// resource links (see spill.py), only lists and runs the
+    tools the caller's token scopes and permissions allow (see
+    permissions.py) and encodes results as compact JSON (see encoding.py).
+    """
+
+    def _setup_handlers(self):
+        super()._setup_handlers()
+        handlers = self._mcp_server.request_handlers
+        for request_type, handler in list(handlers.items()):
+            handlers[request_type] = traced_handler(handler)
+
+    def _ensure_tools(self):
+        apps.get_app_config("mcp_app").load_tools()
+
+    async def get_tools(self):
+        self._ensure_tools()
+        return await super().get_tools()
+
+    def tool(self, name_or_fn=None, *, scopes=None, permissions=None, **kwargs):
+        """FastMCP.tool, plus the OAuth ``scopes`` and Django ``permissions`` the tool requires."""
+        if isinstance(name_or_fn, str) and kwargs.get("name") is None:
+            kwargs["name"], name_or_fn = name_or_fn, None
+        if name_or_fn is None:
+            return lambda fn: self.tool(fn, scopes=scopes, permissions=permissions, **kwargs)
+        tool = super().tool(name_or_fn, **kwargs)
+        tool_policy.declare(tool.name, scopes, permissions)
+        return tool
+
+    def add_tool(self, tool):
+        super().add_tool(tool)
+        tool_policy.compiled = False
+
+    async def allowed_tools(self):
+        """Tool names the current caller may use, or None when the call isn't restricted (stdio)."""
+        user, scopes = request_auth()
+        if user is None:
+            return None
+        if not user.is_authenticated:
+            return frozenset()
+        if not tool_policy.compiled:
+            tool_policy.compile(await self.get_tools())
+        return await tool_policy.allowed(user, scopes)
+
+    async def _mcp_list_tools(self):
+        tools = await super()._mcp_list_tools()
+        allowed = await self.allowed_tools()
+        return tools if allowed is None else [t for t in tools if t.name in allowed]
+
+    async def _call_tool(self, key, arguments):
+        self._ensure_tools()
+        async with drain_state.track_tool():
+            with tracer.span(f"tool {key}", {"mcp.tool.name": key}):
+                started, error = time.perf_counter(), None
+                try:
+                    allowed = await self.allowed_tools()
+                    if allowed is not None and key not in allowed:
+                        scopes, perms = tool_policy.requirements(key)
+                        raise ToolError(f"Not allowed to call {key!r}: it needs scopes "
+                                        f"{sorted(scopes)} and permissions {sorted(perms)}")
+                    content = await super()._call_tool(key, arguments)
+                    return await spill_store.shrink(key, content)
+                except Exception as exc:
+                    error = exc
+                    raise
+                finally:
+                    duration = time.perf_counter() - started
+                    audit_log.record(key, arguments, duration, error)
+                    logger.info("tool %s %s in %.1f ms", key, "failed" if error else "ok", duration * 1000,
+                                extra={"tool": key, "duration_ms": round(duration * 1000, 3),
+                                       "outcome": "error" if error else "ok"})
+
+    async def _read_resource(self, uri):
+        if spill_store.handles(uri):
+            return await spill_store.read(uri)
+        return await super()._read_resource(uri)
+
 
-djmcp = FastMCP(name="django_mcp")
+djmcp = DjangoFastMCP(name="django_mcp", tool_serializer=dumps)
 
 # Most minimal tool: echoes input
 @djmcp.tool
@@ -0,0 +1,72 @@
+# mcp_app/mcp_tools.py
+# Discovered lazily by McpAppConfig.load_tools() on the first tools/list or
+# tools/call, so neither the ORM nor the search registry is touched at startup.
+from typing import Literal
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from mcp.types import EmbeddedResource
+
+from .db import use_readonly
+from .encoding import check_format, formats, table
+from .mcp_server import djmcp
+from .permissions import request_auth, tool_policy
+
+SEARCH_LIMIT = 5
+RESULT_FIELDS = ("name", "url")
+
+Format = Literal[formats()]   # "msgpack" only when the msgpack package is installed
+
+
+async def _searchable(key):
+    """Registry entry for ``key``, or None when it's unknown or the caller lacks its permissions."""
+    conf = apps.get_app_config("mcp_app").get_searchable(key)
+    if conf is None or not await tool_policy.has_perms(request_auth()[0], conf.get("permissions")):
+        return None
+    return conf
+
+
+def _search(conf, key, query, limit, fmt):
+    if conf is None:
+        return {"error": "Unknown model"}
+    check_format(fmt)
+    limit = max(1, min(limit, getattr(settings, "MCP_SEARCH_MAX_LIMIT", 5000)))
+    q = Q()
+    for f in conf["fields"]:
+        q |= Q(**{f"{f}__icontains": query})
+    with use_readonly():
+        rows = [(conf["display"](obj), conf["get_url"](obj))
+                for obj in conf["model"].objects.filter(q)[:limit]]
+    # encoded here, in the worker thread, rather than by fastmcp on the event loop
+    return table(RESULT_FIELDS, rows, fmt, uri=f"search://{key}", prefixed=("url",))
+
+
+@djmcp.tool(scopes=["read"])
+async def search_any(model: str, query: str, limit: int = SEARCH_LIMIT,
+                     format: Format = "rows") -> dict | str | EmbeddedResource:
+    """
+    Search one of the registered models (see list_searchable_models) for `query`.
+    `format`: "rows" (a list of {name, url} objects), "columns" (field names
+    once, then one value array per field, with the URLs' common prefix under
+    "prefixes"; much smaller for long result lists) or, where offered,
+    "msgpack" (the columns document as a MessagePack blob).
+    """
+    return await sync_to_async(_search, thread_sensitive=True)(
+        await _searchable(model), model, query, limit, format)
+
+
+@djmcp.tool(scopes=["read"])
+async def search_project(query: str, limit: int = SEARCH_LIMIT,
+                         format: Format = "rows") -> dict | str | EmbeddedResource:
+    """Search projects by title, code or description. `format` as for search_any."""
+    return await sync_to_async(_search, thread_sensitive=True)(
+        await _searchable("projects"), "projects", query, limit, format)
+
+
+@djmcp.tool(scopes=["read"])
+async def list_searchable_models() -> list[str]:
+    """Model keys accepted by search_any."""
+    keys = await sync_to_async(apps.get_app_config("mcp_app").searchable_keys, thread_sensitive=False)()
+    return [key for key in keys if await _searchable(key) is not None]
@@ -1,19 +1,130 @@
 # apps/mcp/metadata.py
-from starlette.responses import JSONResponse
+"""
+OAuth discovery documents for MCP clients.
+
+- /.well-known/oauth-authorization-server  (RFC 8414)
+- /.well-known/oauth-protected-resource    (RFC 9728)
+
+Both are built once per base URL, serialized to bytes with a strong ETag and
+served from cache with Cache-Control and If-None-Match/304 support.
+
+The base URL is ``MCP_PUBLIC_BASE_URL``. When it is unset the request's Host
+and X-Forwarded-Proto (else its own scheme) are used instead; those
+responses are ``private`` and ``Vary: Host, X-Forwarded-Proto`` so no shared
+cache hands one host's document to another, and only hosts listed
+explicitly in ALLOWED_HOSTS are kept in the cache.
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.http.request import split_domain_port, validate_host
+from oauth2_provider.settings import oauth2_settings
+from starlette.responses import Response
+
+
+def _base_url(request):
+    """Scheme + host this server is reachable at, e.g. ``http://127.0.0.1:8000``."""
+    base = getattr(settings, "MCP_PUBLIC_BASE_URL", None)
+    if base:
+        return base.rstrip("/")
+    proto = request.headers.get("x-forwarded-proto", "").split(",")[0].strip().lower()
+    scheme = proto if proto in ("http", "https") else request.url.scheme
+    return f"{scheme}://{request.headers.get('host') or request.url.netloc}"
+
+
+def _listed_host(request):
+    """True when the request's Host is in ALLOWED_HOSTS by name, not just through "*"."""
+    domain, _ = split_domain_port(request.headers.get("host", ""))
+    return bool(domain) and validate_host(domain, [h for h in settings.ALLOWED_HOSTS if h != "*"])
+
+
+def _issuer(base):
+    return getattr(settings, "MCP_OAUTH_ISSUER", None) or f"{base}/o"
+
+
+def authorization_server_document(base):
+    issuer = _issuer(base).rstrip("/")
+    auth_methods = ["client_secret_basic", "client_secret_post", "none"]
+    return {
+        "issuer":                                       issuer,
+        "authorization_endpoint":                       f"{issuer}/authorize/",
+        "token_endpoint":                               f"{issuer}/token/",
+        "introspection_endpoint":                       f"{issuer}/introspect/",
+        "revocation_endpoint":                          f"{issuer}/revoke/",
+        "scopes_supported":                             sorted(oauth2_settings.SCOPES),
+        "response_types_supported":                     ["code"],
+        "response_modes_supported":                     ["query"],
+        "grant_types_supported":                        ["authorization_code", "refresh_token",
+                                                         "client_credentials"],
+        "code_challenge_methods_supported":             ["S256"],
+        "token_endpoint_auth_methods_supported":        auth_methods,
+        "introspection_endpoint_auth_methods_supported": ["client_secret_basic", "bearer"],
+        "revocation_endpoint_auth_methods_supported":   auth_methods,
+    }
+
+
+def protected_resource_document(base):
+    issuer = _issuer(base).rstrip("/")
+    return {
+        "resource":                 getattr(settings, "MCP_RESOURCE_URL", None) or f"{base}/mcp/",
+        "authorization_servers":    [issuer],
+        "scopes_supported":         sorted(oauth2_settings.SCOPES),
+        "bearer_methods_supported": ["header"],
+        "resource_name":            "django_mcp",
+        # kept for clients that predate RFC 9728 discovery
+        "introspection_endpoint":   f"{issuer}/introspect/",
+    }
+
+
+class _Prebuilt:
+    """A serialized JSON document with its ETag and response headers."""
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, document, shared=True):
+        self.body = json.dumps(document, separators=(",", ":"), sort_keys=True).encode()
+        self.etag = '"%s"' % hashlib.sha256(self.body).hexdigest()[:32]
+        max_age = getattr(settings, "MCP_OAUTH_METADATA_MAX_AGE", 3600)
+        self.headers = {
+            "ETag": self.etag,
+            "Cache-Control": f"{'public' if shared else 'private'}, max-age={max_age}",
+            "Access-Control-Allow-Origin": "*",
+        }
+        if not shared:
+            self.headers["Vary"] = "Host, X-Forwarded-Proto"
+
+
+def _build(kind, base, shared):
+    builder = authorization_server_document if kind == "as" else protected_resource_document
+    return _Prebuilt(builder(base), shared)
+
+
+@lru_cache(maxsize=32)
+def _prebuilt(kind, base, shared=True):
+    return _build(kind, base, shared)
+
+
+def _document(kind, request):
+    base = _base_url(request)
+    if getattr(settings, "MCP_PUBLIC_BASE_URL", None):
+        return _prebuilt(kind, base)
+    if _listed_host(request):
+        return _prebuilt(kind, base, shared=False)
+    return _build(kind, base, shared=False)
+
+
+def _respond(request, doc):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or doc.etag in
+                          [t.strip().removeprefix("W/") for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=doc.headers)
+    return Response(doc.body, media_type="application/json", headers=doc.headers)
+
 
 async def oauth_authorization_server(request):
-    host = request.headers["host"]
-    base = f"https://{host}/o"  # or http:// if you’re not on SSL
-    return JSONResponse({
-        "issuer":                 base,
-        "authorization_endpoint": f"{base}/authorize/",
-        "token_endpoint":         f"{base}/token/",
-        "introspection_endpoint": f"{base}/introspect/",
-        "revocation_endpoint":    f"{base}/revoke/",
-    })
+    return _respond(request, _document("as", request))
+
 
 async def oauth_protected_resource(request):
-    host = request.headers["host"]
-    return JSONResponse({
-        "introspection_endpoint": f"https://{host}/o/introspect/"
-    })
\ No newline at end of file
+    return _respond(request, _document("pr", request))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ToolCallAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(db_index=True)),
+                ('tool', models.CharField(db_index=True, max_length=200)),
+                ('session_id', models.CharField(blank=True, max_length=64)),
+                ('arguments', models.JSONField(blank=True, default=dict)),
+                ('outcome', models.CharField(choices=[('ok', 'ok'), ('error', 'error')], max_length=8)),
+                ('error', models.TextField(blank=True)),
+                ('duration_ms', models.FloatField()),
+                ('trace_id', models.CharField(blank=True, max_length=32)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+                'indexes': [models.Index(fields=['user', 'created'], name='mcp_app_too_user_id_d3e79b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import models
+
+
+class ToolCallAudit(models.Model):
+    """One djmcp tool call, written in batches by mcp_app.audit."""
+
+    OK, ERROR = "ok", "error"
+    OUTCOMES = [(OK, "ok"), (ERROR, "error")]
+
+    created = models.DateTimeField(db_index=True)
+    tool = models.CharField(max_length=200, db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True,
+                             on_delete=models.SET_NULL, related_name="+")
+    session_id = models.CharField(max_length=64, blank=True)
+    arguments = models.JSONField(default=dict, blank=True)   # redacted, see MCP_AUDIT_REDACT_KEYS
+    outcome = models.CharField(max_length=8, choices=OUTCOMES)
+    error = models.TextField(blank=True)
+    duration_ms = models.FloatField()
+    trace_id = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        ordering = ["-created"]
+        indexes = [models.Index(fields=["user", "created"])]
+
+    def __str__(self):
+        return f"{self.tool} ({self.outcome}, {self.duration_ms:.0f} ms)"
@@ -0,0 +1,140 @@
+# mcp_app/oauth_exchange.py
+"""
+Authorization-code exchange for the launcher and ``mcp_inspect``.
+
+When the token endpoint is this project's own /o/token/ the code is
+exchanged in-process: the request goes straight to django-oauth-toolkit's
+oauthlib server with the same validator (client auth, PKCE, redirect URI,
+code expiry) and app_authorized is sent as TokenView would. No loopback HTTP
+request, so a single worker can no longer wait on itself.
+
+Any other token endpoint is called with a shared keep-alive pool and a
+MCP_OAUTH_TOKEN_TIMEOUT deadline: one httpx.Client for synchronous callers,
+one httpx.AsyncClient per event loop for ``aexchange_code``.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import weakref
+from urllib.parse import quote_plus, urlencode, urlparse
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import NoReverseMatch, reverse
+from oauth2_provider.models import get_access_token_model
+from oauth2_provider.oauth2_backends import get_oauthlib_core
+from oauth2_provider.signals import app_authorized
+from oauth2_provider.views import TokenView
+from oauthlib.oauth2 import OAuth2Error
+
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+_clients = weakref.WeakKeyDictionary()   # event loop -> httpx.AsyncClient
+_sync_client = None
+_sync_client_lock = threading.Lock()
+
+
+class TokenExchangeError(Exception):
+    def __init__(self, status, payload):
+        self.status = status
+        self.payload = payload
+        super().__init__(f"token endpoint returned {status}: {payload}")
+
+
+def is_local_token_url(token_url):
+    """True when ``token_url`` is this project's token endpoint on a loopback address."""
+    parsed = urlparse(token_url)
+    try:
+        path = reverse("oauth2_provider:token")
+    except NoReverseMatch:
+        return False
+    return parsed.hostname in LOOPBACK_HOSTS and parsed.path.rstrip("/") == path.rstrip("/")
+
+
+def exchange_code(token_url, data, auth=None):
+    """
+    POST ``data`` (a grant, e.g. authorization_code + code_verifier) to the
+    token endpoint and return the decoded token response. ``auth`` is an
+    optional ``(client_id, client_secret)`` pair sent as HTTP Basic.
+    Raises TokenExchangeError on a non-200 answer.
+    """
+    if is_local_token_url(token_url):
+        return _exchange_local(token_url, data, auth)
+    try:
+        resp = _client_sync().post(token_url, data=data, auth=auth, headers={"Accept": "application/json"})
+    except httpx.HTTPError as exc:
+        raise TokenExchangeError(502, {"error": "token_endpoint_unreachable", "detail": str(exc)})
+    return _decode(resp.status_code, resp.text)
+
+
+async def aexchange_code(token_url, data, auth=None):
+    if is_local_token_url(token_url):
+        return await sync_to_async(_exchange_local)(token_url, data, auth)
+    try:
+        resp = await _client().post(token_url, data=data, auth=auth, headers={"Accept": "application/json"})
+    except httpx.HTTPError as exc:
+        raise TokenExchangeError(502, {"error": "token_endpoint_unreachable", "detail": str(exc)})
+    return _decode(resp.status_code, resp.text)
+
+
+def _exchange_local(token_url, data, auth):
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    if auth:
+        # DOT unquotes both halves of the Basic credentials
+        raw = f"{quote_plus(auth[0])}:{quote_plus(auth[1])}".encode()
+        # under both names, as OAuthLibCore.extract_headers passes request.META;
+        # the validator reads HTTP_AUTHORIZATION
+        headers["Authorization"] = headers["HTTP_AUTHORIZATION"] = "Basic " + base64.b64encode(raw).decode("ascii")
+    if urlparse(token_url).scheme == "https":
+        headers["X_DJANGO_OAUTH_TOOLKIT_SECURE"] = "1"
+
+    server = get_oauthlib_core().server
+    try:
+        _, body, status = server.create_token_response(token_url, "POST", urlencode(data), headers)
+    except OAuth2Error as exc:
+        body, status = exc.json, exc.status_code
+    payload = _decode(status, body)
+
+    access_token = payload.get("access_token")
+    if access_token:
+        checksum = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+        token = get_access_token_model().objects.get(token_checksum=checksum)
+        app_authorized.send(sender=TokenView, request=None, token=token)
+    return payload
+
+
+def _decode(status, body):
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        payload = {"error": "invalid_response", "detail": body[:200]}
+    if status != 200:
+        raise TokenExchangeError(status, payload)
+    return payload
+
+
+def _client_sync():
+    global _sync_client
+    if _sync_client is None:
+        with _sync_client_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(**_client_options())
+    return _sync_client
+
+
+def _client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = httpx.AsyncClient(**_client_options())
+    return client
+
+
+def _client_options():
+    return {
+        "timeout": getattr(settings, "MCP_OAUTH_TOKEN_TIMEOUT", 10),
+        "limits": httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60),
+    }
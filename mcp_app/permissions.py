@@ -0,0 +1,179 @@
+# mcp_app/permissions.py
+"""
+Per-tool authorization for djmcp.
+
+Tools declare what they need when they are registered::
+
+    @djmcp.tool(scopes=["write"], permissions=["psm.change_project"])
+    def close_project(code: str) -> dict: ...
+
+- ``scopes``       OAuth scopes the bearer token must carry
+                   (MCP_TOOL_DEFAULT_SCOPES when a tool declares none)
+- ``permissions``  Django permissions ("app_label.codename") the user needs
+
+``compile()`` (run by the /readyz warm-up, and again whenever tools change)
+turns the declarations into lookup tables: every subset of the known scopes
+maps to the frozenset of tools it unlocks, and every distinct permission
+set seen is memoized the same way. A user's permissions are loaded once per
+MCP_TOOL_PERMISSION_CACHE_TTL seconds, so a tools/call or tools/list costs
+two dict lookups and a set intersection, not a permission query.
+
+The cache is per worker and nothing invalidates it: after a user's groups or
+permissions (or a group's permissions, or is_active/is_superuser) change,
+each worker keeps applying the old set for up to
+MCP_TOOL_PERMISSION_CACHE_TTL seconds. Lower it where revocations must take
+effect sooner.
+
+Requests authenticated with a session cookie aren't scope-restricted; only
+permissions apply. Calls off HTTP (stdio, in-memory clients) are not
+restricted; an HTTP request without an authenticated user gets no tools.
+"""
+import logging
+import time
+from collections import OrderedDict
+from itertools import combinations
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+
+logger = logging.getLogger("mcp.permissions")
+
+MAX_PRECOMPILED_SCOPES = 12   # 2**12 scope sets; beyond that sets are memoized as they are seen
+
+
+class ToolPolicy:
+    def __init__(self, default_scopes=(), cache_ttl=60, cache_size=10000):
+        self.default_scopes = frozenset(default_scopes)
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._required = {}        # tool -> (scopes, permissions)
+        self._tools = frozenset()
+        self._known_scopes = frozenset()
+        self._by_scopes = {}       # frozenset of scopes -> frozenset of tools
+        self._by_perms = {}        # frozenset of permissions -> frozenset of tools
+        self._needs_perms = frozenset()
+        self._user_perms = OrderedDict()   # user pk -> (expires, frozenset of permissions | None)
+        self.compiled = False
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            default_scopes=getattr(settings, "MCP_TOOL_DEFAULT_SCOPES", ()),
+            cache_ttl=getattr(settings, "MCP_TOOL_PERMISSION_CACHE_TTL", 60),
+        )
+
+    def declare(self, tool, scopes=None, permissions=None):
+        self._required[tool] = (
+            frozenset(scopes) if scopes is not None else None,
+            frozenset(permissions or ()),
+        )
+        self.compiled = False
+
+    def requirements(self, tool):
+        scopes, perms = self._required.get(tool, (None, frozenset()))
+        return (self.default_scopes if scopes is None else scopes), perms
+
+    # ── compile ────────────────────────────────────────────────
+    def compile(self, tools):
+        """Build the scope-set table for ``tools`` (names as listed by djmcp)."""
+        from oauth2_provider.settings import oauth2_settings
+
+        self._tools = frozenset(tools)
+        needed = set()
+        for tool in self._tools:
+            needed |= self.requirements(tool)[0]
+        self._known_scopes = frozenset(oauth2_settings._SCOPES) | needed
+        self._by_scopes = {}
+        self._by_perms = {}
+        self._needs_perms = frozenset(t for t in self._tools if self.requirements(t)[1])
+        if len(self._known_scopes) <= MAX_PRECOMPILED_SCOPES:
+            ordered = sorted(self._known_scopes)
+            for size in range(len(ordered) + 1):
+                for subset in combinations(ordered, size):
+                    self._scope_tools(frozenset(subset))
+        self.compiled = True
+        logger.info("Compiled tool policy: %d tools, %d scope sets", len(self._tools), len(self._by_scopes))
+
+    def _scope_tools(self, scopes):
+        allowed = self._by_scopes.get(scopes)
+        if allowed is None:
+            allowed = self._by_scopes[scopes] = frozenset(
+                t for t in self._tools if self.requirements(t)[0] <= scopes)
+        return allowed
+
+    def _perm_tools(self, perms):
+        """Tools a user holding ``perms`` may call (None = superuser, everything)."""
+        if perms is None:
+            return self._tools
+        allowed = self._by_perms.get(perms)
+        if allowed is None:
+            allowed = self._by_perms[perms] = frozenset(
+                t for t in self._tools if self.requirements(t)[1] <= perms)
+        return allowed
+
+    # ── checks ─────────────────────────────────────────────────
+    async def allowed(self, user, scopes=None):
+        """
+        Frozenset of tool names ``user`` may list and call with a token
+        carrying ``scopes`` (None = not scope-restricted).
+        """
+        allowed = self._tools if scopes is None else self._scope_tools(frozenset(scopes) & self._known_scopes)
+        if allowed & self._needs_perms:
+            allowed = allowed & self._perm_tools(await self._permissions(user))
+        return allowed
+
+    async def _permissions(self, user):
+        now = time.monotonic()
+        cached = self._user_perms.get(user.pk)
+        if cached is not None and cached[0] > now:
+            self._user_perms.move_to_end(user.pk)
+            return cached[1]
+        perms = await sync_to_async(_load_permissions, thread_sensitive=True)(user)
+        self._user_perms[user.pk] = (now + self.cache_ttl, perms)
+        self._user_perms.move_to_end(user.pk)
+        while len(self._user_perms) > self.cache_size:
+            self._user_perms.popitem(last=False)
+        return perms
+
+    async def has_perms(self, user, perms):
+        """True when ``user`` holds every permission in ``perms`` (user None = not restricted)."""
+        if not perms or user is None:
+            return True
+        held = await self._permissions(user)
+        return held is None or frozenset(perms) <= held
+
+
+def _load_permissions(user):
+    from .db import use_readonly
+
+    if not user.is_active:
+        return frozenset()
+    if user.is_superuser:
+        return None
+    with use_readonly():
+        return frozenset(user.get_all_permissions())
+
+
+def request_auth():
+    """
+    (user, token scopes) of the /mcp request behind the current call:
+    (None, None) off HTTP (stdio, in-memory), and AnonymousUser with no
+    scopes for an HTTP request nobody authenticated.
+    """
+    from mcp.server.lowlevel.server import request_ctx
+
+    try:
+        scope = getattr(request_ctx.get().request, "scope", None) or {}
+    except LookupError:
+        return None, None
+    if "headers" not in scope:
+        return None, None
+    user = scope.get("user")
+    if not getattr(user, "is_authenticated", False):
+        return AnonymousUser(), frozenset()
+    credentials = scope.get("auth")
+    return user, (credentials.scopes if credentials is not None else None)
+
+
+tool_policy = ToolPolicy.from_settings()
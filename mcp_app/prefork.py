@@ -0,0 +1,200 @@
+# mcp_app/prefork.py
+"""
+Pre-fork supervisor for running djmcp over HTTP on every core.
+
+The parent binds the listening socket once and forks N uvicorn workers that
+inherit it (or, with ``reuse_port``, each worker binds its own SO_REUSEPORT
+socket and the kernel balances connections). The ASGI app is built and
+Django connects to the database only inside each worker, after the fork.
+
+Signals to the supervisor:
+  SIGHUP           rolling restart (one worker at a time, new before old)
+  SIGTERM/SIGINT   graceful shutdown of all workers
+Crashed workers are restarted, with a back-off if they die right away.
+Retiring workers get ``graceful_timeout`` seconds before SIGKILL; the
+supervisor loop keeps reaping and handling signals while they finish.
+"""
+import logging
+import os
+import signal
+import socket
+import time
+
+logger = logging.getLogger("mcp.prefork")
+
+CRASH_WINDOW = 2.0      # a worker dying faster than this counts as a crash loop
+CRASH_BACKOFF = 1.0
+
+
+def bind_socket(host, port, reuse_port=False, backlog=2048):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkSupervisor:
+    def __init__(self, app_factory, host, port, workers, reuse_port=False,
+                 log_level="info", graceful_timeout=30):
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.log_level = log_level
+        self.graceful_timeout = graceful_timeout
+        self.sock = None
+        self._children = {}        # pid -> start time
+        self._retiring = set()     # pids we stopped on purpose
+        self._deadlines = {}       # retiring pid -> monotonic time it gets SIGKILL
+        self._restart_queue = []   # old pids still to replace in a rolling restart
+        self._stopping = False
+        self._reload = False
+
+    # ── supervisor ─────────────────────────────────────────────
+    def run(self):
+        from django.db import connections
+
+        # With SO_REUSEPORT the parent only binds once so a busy port fails
+        # fast here; it must not keep a listener in the kernel's balancing group.
+        self.sock = bind_socket(self.host, self.port, reuse_port=self.reuse_port)
+        if self.reuse_port:
+            self.sock.close()
+            self.sock = None
+        # Never hand an open DB connection across fork()
+        connections.close_all()
+
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        logger.info("Supervisor %s starting %d workers on %s:%s",
+                    os.getpid(), self.workers, self.host, self.port)
+        for _ in range(self.workers):
+            self._spawn()
+
+        try:
+            while not self._stopping:
+                if self._reload:
+                    self._reload = False
+                    self._rolling_restart()
+                if self._restart_queue and not self._retiring:
+                    self._replace(self._restart_queue.pop(0))
+                self._reap()
+                self._enforce_deadlines()
+                time.sleep(0.2)
+        finally:
+            self._shutdown()
+
+    def _on_hup(self, signum, frame):
+        self._reload = True
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._worker()
+            except BaseException:
+                logger.exception("Worker %s crashed", os.getpid())
+                code = 1
+            finally:
+                logging.shutdown()   # os._exit skips atexit, which drains the log queue
+                os._exit(code)
+        self._children[pid] = time.monotonic()
+        logger.info("Started worker %s", pid)
+        return pid
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._children.clear()
+                return
+            if pid == 0:
+                return
+            started = self._children.pop(pid, None)
+            self._deadlines.pop(pid, None)
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+                continue
+            if started is None or self._stopping:
+                continue
+            logger.warning("Worker %s exited (status %s); restarting", pid, status)
+            if time.monotonic() - started < CRASH_WINDOW:
+                time.sleep(CRASH_BACKOFF)
+            self._spawn()
+
+    def _rolling_restart(self):
+        self._restart_queue = [pid for pid in self._children if pid not in self._retiring]
+        logger.info("SIGHUP: rolling restart of %d workers", len(self._restart_queue))
+
+    def _replace(self, old_pid):
+        if old_pid in self._children:
+            self._spawn()
+            self._retire(old_pid)
+
+    def _retire(self, pid):
+        """SIGTERM ``pid``; _enforce_deadlines kills it if it outlives graceful_timeout."""
+        self._retiring.add(pid)
+        self._deadlines[pid] = time.monotonic() + self.graceful_timeout
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _enforce_deadlines(self):
+        now = time.monotonic()
+        for pid, deadline in list(self._deadlines.items()):
+            if now >= deadline:
+                logger.warning("Worker %s did not stop in %ss; killing", pid, self.graceful_timeout)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                del self._deadlines[pid]   # _reap collects it
+
+    def _shutdown(self):
+        logger.info("Supervisor shutting down %d workers", len(self._children))
+        self._restart_queue = []
+        for pid in list(self._children):
+            if pid not in self._retiring:
+                self._retire(pid)
+        while self._children:
+            self._reap()
+            self._enforce_deadlines()
+            time.sleep(0.1)
+        if self.sock is not None:
+            self.sock.close()
+
+    # ── worker ─────────────────────────────────────────────────
+    def _worker(self):
+        import uvicorn
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+
+        if self.reuse_port:
+            sock = bind_socket(self.host, self.port, reuse_port=True)
+        else:
+            sock = self.sock
+
+        # Build the app (and so touch Django/the DB) only in the child
+        app = self.app_factory()
+        config = uvicorn.Config(
+            app,
+            lifespan="on",
+            log_config=None,   # dictConfig would close Django's mcp.* queue handler
+            log_level=self.log_level,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        uvicorn.Server(config).run(sockets=[sock])
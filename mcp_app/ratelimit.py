@@ -0,0 +1,231 @@
+# mcp_app/ratelimit.py
+"""
+Token-bucket rate limits on /mcp shared by every worker on the node.
+
+Buckets live in a memory-mapped file (MCP_RATELIMIT_FILE; by default one on
+/dev/shm named after the project directory and settings module, so separate
+deployments on a host never share buckets) laid out as a set-associative table: a key hashes to one set of
+WAYS slots, and only that set's byte range is locked (``fcntl.lockf``) while
+its bucket is refilled and charged. A check is a hash, a lock syscall pair and
+a few struct reads - microseconds, no server process, no database.
+
+CombinedAuthMiddleware charges three kinds of buckets after authenticating:
+
+- per bearer token      MCP_RATELIMIT_TOKEN
+- per user              MCP_RATELIMIT_USER (all their tokens and sessions)
+- per user and tool     MCP_RATELIMIT_TOOL, MCP_RATELIMIT_TOOL_OVERRIDES
+                        (``tools/call`` requests only)
+
+Limits are ``(burst, requests per minute)``. A denied request gets 429 with
+Retry-After; every limited response carries RateLimit-Limit,
+RateLimit-Remaining, RateLimit-Reset and RateLimit-Policy for the tightest
+bucket. When the table is full the least recently used slot of the set is
+reused, which at worst hands that key a fresh bucket. The file only ever
+grows: a worker configured with fewer slots than it already has uses its
+full size, so no peer's mapping is cut short.
+
+fcntl locks don't exclude threads of the same process; checks run on the
+event loop thread without awaiting, so they never interleave within a worker.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+SLOT = struct.Struct("<Qdd")   # key hash (0 = empty), tokens, last refill (CLOCK_MONOTONIC)
+WAYS = 8
+
+
+class SharedBuckets:
+    def __init__(self, path, slots=65536):
+        self.path = os.fspath(path)
+        self.sets = max(1, slots // WAYS)
+        self.size = self.sets * WAYS * SLOT.size
+        self._fd = None
+        self._mm = None
+        self._pid = None
+
+    def _open(self):
+        if self._pid == os.getpid():
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        # the whole file, so no peer is inside a set while it is resized
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            set_size = WAYS * SLOT.size
+            current = os.fstat(fd).st_size
+            if current // set_size * set_size > self.size:
+                # peers may map all of it: never shrink, use the larger table
+                self.sets = current // set_size
+                self.size = self.sets * set_size
+            elif current < self.size:
+                # new file or more MCP_RATELIMIT_SLOTS: grow it, keeping
+                # every bucket (peers keep using their shorter mapping)
+                os.ftruncate(fd, self.size)
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+        self._fd, self._mm, self._pid = fd, mmap.mmap(fd, self.size), os.getpid()
+
+    @staticmethod
+    def _hash(key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") | 1
+
+    def take(self, key, capacity, rate, cost=1.0):
+        """
+        Charge ``cost`` to the bucket of ``key`` (refilled at ``rate``/s up to
+        ``capacity``). Returns ``(allowed, tokens_left)``.
+        """
+        self._open()
+        h = self._hash(key)
+        base = (h % self.sets) * WAYS * SLOT.size
+        now = time.monotonic()
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, WAYS * SLOT.size, base)
+        try:
+            target = empty = lru = None
+            lru_time = None
+            for way in range(WAYS):
+                offset = base + way * SLOT.size
+                slot_key, tokens, updated = SLOT.unpack_from(self._mm, offset)
+                if slot_key == h:
+                    target = offset
+                    break
+                if slot_key == 0:
+                    if empty is None:
+                        empty = offset
+                elif lru_time is None or updated < lru_time:
+                    lru, lru_time = offset, updated
+            if target is None:
+                target = empty if empty is not None else lru
+                tokens, updated = capacity, now
+            # a file left over from before a reboot has timestamps from the future
+            tokens = capacity if updated > now else min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            SLOT.pack_into(self._mm, target, h, tokens, now)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, WAYS * SLOT.size, base)
+        return allowed, tokens
+
+    def refund(self, key, capacity, cost=1.0):
+        """Give back ``cost`` taken by ``take()`` when another bucket refused the request."""
+        self._open()
+        h = self._hash(key)
+        base = (h % self.sets) * WAYS * SLOT.size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, WAYS * SLOT.size, base)
+        try:
+            for way in range(WAYS):
+                offset = base + way * SLOT.size
+                slot_key, tokens, updated = SLOT.unpack_from(self._mm, offset)
+                if slot_key == h:
+                    SLOT.pack_into(self._mm, offset, h, min(capacity, tokens + cost), updated)
+                    break
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, WAYS * SLOT.size, base)
+
+
+class Decision:
+    __slots__ = ("allowed", "scope", "burst", "per_minute", "remaining", "reset", "retry_after")
+
+    def __init__(self, allowed, scope, burst, per_minute, tokens):
+        rate = per_minute / 60
+        self.allowed = allowed
+        self.scope = scope
+        self.burst = burst
+        self.per_minute = per_minute
+        self.remaining = max(0, int(tokens))
+        self.reset = max(0, int(-(-(burst - tokens) // rate))) if rate else 0
+        self.retry_after = 0 if allowed else max(1, int(-(-(1 - tokens) // rate)) if rate else 60)
+
+    def headers(self):
+        headers = {
+            "RateLimit-Limit": str(self.burst),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+            "RateLimit-Policy": f"{self.per_minute};w=60;burst={self.burst}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+class RateLimiter:
+    def __init__(self, buckets, token=None, user=None, tool=None, tool_overrides=None, enabled=True):
+        self.buckets = buckets
+        self.limits = {"token": token, "user": user, "tool": tool}
+        self.tool_overrides = dict(tool_overrides or {})
+        self.enabled = enabled
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            SharedBuckets(getattr(settings, "MCP_RATELIMIT_FILE", None) or default_bucket_file(),
+                          getattr(settings, "MCP_RATELIMIT_SLOTS", 65536)),
+            token=getattr(settings, "MCP_RATELIMIT_TOKEN", None),
+            user=getattr(settings, "MCP_RATELIMIT_USER", None),
+            tool=getattr(settings, "MCP_RATELIMIT_TOOL", None),
+            tool_overrides=getattr(settings, "MCP_RATELIMIT_TOOL_OVERRIDES", None),
+            enabled=getattr(settings, "MCP_RATELIMIT_ENABLED", True),
+        )
+
+    def check(self, token=None, user_id=None, tools=(), token_checksum=None):
+        """
+        Charge every bucket that applies; the first refusal wins and the
+        buckets already charged are refunded. Returns the Decision to report
+        (the refusal, or the bucket with the least headroom), or None when
+        no limit applies. ``token_checksum`` (its SHA-256 hex digest) may
+        stand in for ``token``.
+        """
+        if not self.enabled:
+            return None
+        wanted = []
+        if token:
+            token_checksum = hashlib.sha256(token.encode()).hexdigest()
+        if token_checksum and self.limits["token"]:
+            wanted.append(("token", "t:" + token_checksum, self.limits["token"]))
+        if user_id is not None and self.limits["user"]:
+            wanted.append(("user", f"u:{user_id}", self.limits["user"]))
+        if user_id is not None:
+            for tool in tools:
+                limit = self.tool_overrides.get(tool, self.limits["tool"])
+                if limit:
+                    wanted.append((f"tool:{tool}", f"c:{user_id}:{tool}", limit))
+
+        taken, tightest = [], None
+        for scope, key, (burst, per_minute) in wanted:
+            allowed, tokens = self.buckets.take(key, burst, per_minute / 60)
+            decision = Decision(allowed, scope, burst, per_minute, tokens)
+            if not allowed:
+                for _, key_, (burst_, _) in taken:
+                    self.buckets.refund(key_, burst_)
+                return decision
+            taken.append((scope, key, (burst, per_minute)))
+            if tightest is None or decision.remaining / burst < tightest.remaining / tightest.burst:
+                tightest = decision
+        return tightest
+
+
+def default_bucket_file():
+    """/dev/shm file unique to this project directory and settings module; run/ratelimit.bin without /dev/shm."""
+    if not os.path.isdir("/dev/shm"):
+        return Path(settings.BASE_DIR) / "run" / "ratelimit.bin"
+    deployment = f"{Path(settings.BASE_DIR).resolve()}:{settings.SETTINGS_MODULE}"
+    return Path("/dev/shm") / f"mcp-ratelimit-{hashlib.sha256(deployment.encode()).hexdigest()[:16]}"
+
+
+_limiter = None
+
+
+def get_limiter():
+    """Per-process limiter, created on first use (after any pre-fork)."""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter.from_settings()
+    return _limiter
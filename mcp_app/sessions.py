@@ -0,0 +1,384 @@
+# mcp_app/sessions.py
+"""
+Bounded table of streamable-http sessions on /mcp (per worker process).
+
+- caps concurrent sessions globally (MCP_SESSION_MAX) and per user
+  (MCP_SESSION_MAX_PER_USER); when full, the least recently used session
+  that has been idle for MCP_SESSION_EVICT_MIN_IDLE seconds is evicted,
+  otherwise the new session is refused with 503/429 + Retry-After
+- a reaper terminates sessions with no client request for
+  MCP_SESSION_IDLE_TIMEOUT seconds and drops transports the client closed
+  with DELETE (the MCP session manager never forgets those on its own)
+- a session id only works for the user whose request created the session;
+  anyone else gets the same 404 as for an unknown session
+- MCP SSE streams send ``: ping`` keep-alive comments every
+  MCP_SSE_KEEPALIVE seconds; pings do not count as activity
+- ``session_table.stats()`` reports counts and process RSS
+
+The MCP SDK exposes neither its transports nor a way to end a session, so
+the table uses private attributes of the versions pinned in
+requirements.txt; ``check_sdk_internals()`` refuses to start when they are
+missing rather than letting the limits silently stop working.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from mcp.server import streamable_http
+from mcp.server.streamable_http import StreamableHTTPServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from sse_starlette import EventSourceResponse
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+logger = logging.getLogger("mcp.sessions")
+
+MCP_SESSION_ID_HEADER = "mcp-session-id"
+
+
+def find_session_manager(mcp_asgi_app):
+    """
+    The StreamableHTTPSessionManager behind ``djmcp.http_app()``.
+
+    fastmcp 2.8 doesn't expose it, so look in the closure of the mounted
+    request handler.
+    """
+    for route in getattr(mcp_asgi_app, "routes", []):
+        handler = getattr(route, "app", None)
+        for cell in getattr(handler, "__closure__", None) or ():
+            if isinstance(cell.cell_contents, StreamableHTTPSessionManager):
+                return cell.cell_contents
+    return None
+
+
+# ── MCP SDK internals ──────────────────────────────────────────
+def _versions():
+    found = []
+    for package in ("mcp", "fastmcp", "sse-starlette"):
+        try:
+            found.append(f"{package} {version(package)}")
+        except PackageNotFoundError:
+            found.append(f"{package} (not installed)")
+    return ", ".join(found)
+
+
+def check_sdk_internals(manager):
+    """Raise ImproperlyConfigured unless ``manager`` and its transports look like the pinned SDK's."""
+    missing = []
+    if manager is None:
+        missing.append("the StreamableHTTPSessionManager in djmcp.http_app()")
+    else:
+        if not isinstance(getattr(manager, "_server_instances", None), dict):
+            missing.append("StreamableHTTPSessionManager._server_instances")
+        if not hasattr(manager, "_task_group"):   # health.probe_sessions
+            missing.append("StreamableHTTPSessionManager._task_group")
+    if "_terminated" not in vars(StreamableHTTPServerTransport(mcp_session_id=None)):
+        missing.append("StreamableHTTPServerTransport._terminated")
+    if not callable(getattr(StreamableHTTPServerTransport, "_terminate_session", None)):
+        missing.append("StreamableHTTPServerTransport._terminate_session()")
+    if getattr(streamable_http, "EventSourceResponse", None) not in (EventSourceResponse, KeepAliveEventSourceResponse):
+        missing.append("mcp.server.streamable_http.EventSourceResponse")
+    if missing:
+        raise ImproperlyConfigured(
+            f"MCP session limits need {', '.join(missing)}, which {_versions()} doesn't have; "
+            "install the mcp/fastmcp/sse-starlette versions pinned in requirements.txt")
+
+
+class KeepAliveEventSourceResponse(EventSourceResponse):
+    """EventSourceResponse pinging every MCP_SSE_KEEPALIVE seconds unless given ``ping``."""
+
+    def __init__(self, *args, ping=None, **kwargs):
+        if ping is None:
+            ping = getattr(settings, "MCP_SSE_KEEPALIVE", 15)
+        super().__init__(*args, ping=ping, **kwargs)
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _Session:
+    __slots__ = ("user_key", "created", "last_seen")
+
+    def __init__(self, user_key, now):
+        self.user_key = user_key
+        self.created = now
+        self.last_seen = now
+
+
+class SessionTable:
+    def __init__(self, max_sessions, max_per_user, idle_timeout, evict_min_idle):
+        self.max_sessions = max_sessions
+        self.max_per_user = max_per_user
+        self.idle_timeout = idle_timeout
+        self.evict_min_idle = evict_min_idle
+        self.manager = None
+        # sid -> _Session, least recently used first
+        self._sessions = OrderedDict()
+        self._per_user = Counter()
+        self._pending = Counter()
+        self._reaper = None
+        self.evicted_total = 0
+        self.rejected_total = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_sessions=getattr(settings, "MCP_SESSION_MAX", 1000),
+            max_per_user=getattr(settings, "MCP_SESSION_MAX_PER_USER", 20),
+            idle_timeout=getattr(settings, "MCP_SESSION_IDLE_TIMEOUT", 1800),
+            evict_min_idle=getattr(settings, "MCP_SESSION_EVICT_MIN_IDLE", 60),
+        )
+
+    def attach(self, mcp_asgi_app):
+        manager = find_session_manager(mcp_asgi_app)
+        check_sdk_internals(manager)
+        self.manager = manager
+        # the MCP transport's own SSE responses only; other EventSourceResponses keep their interval
+        streamable_http.EventSourceResponse = KeepAliveEventSourceResponse
+
+    # ── bookkeeping ────────────────────────────────────────────
+    def __len__(self):
+        return len(self._sessions)
+
+    def is_live(self, sid):
+        if self.manager is None:
+            return True
+        transport = self.manager._server_instances.get(sid)
+        return transport is not None and not transport._terminated
+
+    def touch(self, sid, user_key=None):
+        """Record a request on ``sid`` by ``user_key``; False when the session is someone else's."""
+        session = self._sessions.get(sid)
+        if session is None:
+            self.register(sid, user_key)
+            return True
+        if session.user_key != user_key:
+            return False
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(sid)
+        return True
+
+    def register(self, sid, user_key):
+        session = self._sessions.get(sid)
+        if session is not None:
+            # the reaper may have adopted the transport before the response
+            # creating it named its user
+            if session.user_key is None and user_key is not None:
+                self._uncount(None)
+                session.user_key = user_key
+                self._per_user[user_key] += 1
+            return
+        self._sessions[sid] = _Session(user_key, time.monotonic())
+        self._per_user[user_key] += 1
+
+    def _uncount(self, user_key):
+        self._per_user[user_key] -= 1
+        if self._per_user[user_key] <= 0:
+            del self._per_user[user_key]
+
+    def forget(self, sid):
+        session = self._sessions.pop(sid, None)
+        if session is not None:
+            self._uncount(session.user_key)
+        if self.manager is not None:
+            return self.manager._server_instances.pop(sid, None)
+        return None
+
+    async def close(self, sid, reason):
+        transport = self.forget(sid)
+        if transport is not None and not transport._terminated:
+            logger.info("Closing MCP session %s (%s)", sid, reason)
+            try:
+                await transport._terminate_session()
+            except Exception as exc:
+                logger.debug("Error terminating session %s: %s", sid, exc)
+
+    async def close_all(self, reason):
+        sids = set(self._sessions)
+        if self.manager is not None:
+            sids.update(self.manager._server_instances)
+        for sid in sids:
+            await self.close(sid, reason)
+
+    # ── admission ──────────────────────────────────────────────
+    async def admit(self, user_key):
+        """Reserve a slot for a new session; returns a refusal Response or None."""
+        # Unauthenticated (proxy-forwarded) sessions only count against the global cap
+        if (user_key is not None
+                and self._per_user[user_key] + self._pending[user_key] >= self.max_per_user):
+            if not await self._evict_lru(user_key):
+                self.rejected_total += 1
+                return self._refusal(429, "Too many MCP sessions for this user")
+        if len(self._sessions) + sum(self._pending.values()) >= self.max_sessions:
+            if not await self._evict_lru(None):
+                self.rejected_total += 1
+                return self._refusal(503, "MCP session limit reached")
+        self._pending[user_key] += 1
+        return None
+
+    def release(self, user_key):
+        self._pending[user_key] -= 1
+        if self._pending[user_key] <= 0:
+            del self._pending[user_key]
+
+    async def _evict_lru(self, user_key):
+        now = time.monotonic()
+        for sid, session in self._sessions.items():
+            if user_key is not None and session.user_key != user_key:
+                continue
+            if now - session.last_seen < self.evict_min_idle:
+                # LRU order: everything after this was used more recently
+                return False
+            self.evicted_total += 1
+            await self.close(sid, "evicted, table full")
+            return True
+        return False
+
+    def _refusal(self, status, message):
+        retry_after = max(1, int(self.evict_min_idle))
+        body = {"jsonrpc": "2.0", "id": "server-error",
+                "error": {"code": -32000, "message": message}}
+        return Response(json.dumps(body), status_code=status, media_type="application/json",
+                        headers={"Retry-After": str(retry_after)})
+
+    # ── reaping ────────────────────────────────────────────────
+    async def reap(self):
+        now = time.monotonic()
+        for sid, session in list(self._sessions.items()):
+            if not self.is_live(sid):
+                self.forget(sid)
+            elif now - session.last_seen >= self.idle_timeout:
+                self.evicted_total += 1
+                await self.close(sid, "idle timeout")
+        if self.manager is not None:
+            # Transports created outside this table (or closed by DELETE)
+            for sid, transport in list(self.manager._server_instances.items()):
+                if transport._terminated:
+                    self.manager._server_instances.pop(sid, None)
+                elif sid not in self._sessions:
+                    self.register(sid, None)
+
+    async def _reap_forever(self):
+        interval = max(1.0, min(self.idle_timeout / 4, 60))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("Session reaper failed")
+
+    def start(self):
+        if self._reaper is None:
+            self._reaper = asyncio.get_running_loop().create_task(self._reap_forever())
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        self._sessions.clear()
+        self._per_user.clear()
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "max_per_user": self.max_per_user,
+            "idle_timeout": self.idle_timeout,
+            "per_user": {str(k): v for k, v in self._per_user.items()},
+            "oldest_idle_seconds": round(
+                max((now - s.last_seen for s in self._sessions.values()), default=0), 1),
+            "manager_transports": (len(self.manager._server_instances)
+                                   if self.manager is not None else None),
+            "evicted_total": self.evicted_total,
+            "rejected_total": self.rejected_total,
+            "rss_bytes": _rss_bytes(),
+            "pid": os.getpid(),
+        }
+
+
+session_table = SessionTable.from_settings()
+
+
+def _user_key(scope):
+    user = scope.get("user")
+    if user is not None and getattr(user, "is_authenticated", False):
+        return user.pk
+    return None
+
+
+async def _session_not_found(scope, receive, send):
+    # 404 tells MCP clients to start a new session (spec 2025-03-26)
+    body = {"jsonrpc": "2.0", "id": "server-error",
+            "error": {"code": -32001, "message": "Session not found"}}
+    response = Response(json.dumps(body), status_code=404, media_type="application/json")
+    await response(scope, receive, send)
+
+
+class SessionLimitMiddleware:
+    """
+    Pure ASGI middleware (so SSE streams pass straight through) enforcing
+    ``session_table`` limits. Must sit inside CombinedAuthMiddleware so
+    ``scope["user"]`` is set.
+    """
+
+    def __init__(self, app, table=None):
+        self.app = app
+        self.table = table or session_table
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        table = self.table
+        sid = Headers(scope=scope).get(MCP_SESSION_ID_HEADER)
+        if sid:
+            if not table.is_live(sid):
+                table.forget(sid)
+                await _session_not_found(scope, receive, send)
+                return
+            # the GET stream handshake isn't authenticated (no scope["user"]):
+            # it can't show whose session this is, so it doesn't touch it
+            if "user" in scope and not table.touch(sid, _user_key(scope)):
+                # indistinguishable from an unknown session
+                await _session_not_found(scope, receive, send)
+                return
+            await self.app(scope, receive, send)
+            if scope["method"] == "DELETE":
+                table.forget(sid)
+            return
+
+        if scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        user_key = _user_key(scope)
+        refusal = await table.admit(user_key)
+        if refusal is not None:
+            await refusal(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                for key, value in message.get("headers", []):
+                    if key.lower() == MCP_SESSION_ID_HEADER.encode():
+                        table.register(value.decode(), user_key)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            table.release(user_key)
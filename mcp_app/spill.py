@@ -0,0 +1,297 @@
+# mcp_app/spill.py
+"""
+Result-size policy for djmcp tools.
+
+DjangoFastMCP._call_tool hands every tool result to ``spill_store.shrink()``.
+Text content up to MCP_SPILL_THRESHOLD characters is returned inline as
+before; anything larger is moved into the spill store and replaced by a small
+JSON link::
+
+    {"spilled": {"uri": "spill://<id>", "mimeType": "application/json",
+                 "size": 1048576, "pages": 16, "pageSize": 65536,
+                 "pageUri": "spill://<id>/{page}", "expires": "..."}}
+
+The client fetches the payload with ``resources/read``:
+
+- ``spill://<id>/<page>``                     page ``page`` (0-based)
+- ``spill://<id>?offset=<o>&length=<n>``      a byte range, at most one page
+
+Pages and ranges are cut on UTF-8 character boundaries, so each one decodes
+on its own and the pages concatenate to the original text. Only the user
+whose call produced a result can read it; results of calls without a user
+(stdio) are returned inline, since nothing could tell their readers apart.
+
+The store holds at most MCP_SPILL_MAX_BYTES; entries expire after
+MCP_SPILL_TTL seconds and the oldest are evicted first when it is full. It
+lives in memory per worker, or in MCP_SPILL_DIR so every prefork worker can
+serve every link; there eviction and the save it makes room for hold an
+``flock`` on the directory, so the size cap holds across workers.
+
+UTF-8 encoding, eviction and file I/O run in a worker thread. Turning the
+tool's return value into text happens before ``shrink()`` sees it: tools
+that return encoded text (see encoding.py) do it in their own worker
+thread, while other return values are serialized by fastmcp on the event
+loop.
+"""
+import fcntl
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from fastmcp.exceptions import NotFoundError, ResourceError, ToolError
+from mcp.server.lowlevel.helper_types import ReadResourceContents
+from mcp.types import TextContent
+
+from .audit import request_identity
+
+logger = logging.getLogger("mcp.spill")
+
+SCHEME = "spill"
+
+
+def _boundary(data, pos):
+    """``pos`` moved back to the start of the UTF-8 character it falls in."""
+    pos = min(max(pos, 0), len(data))
+    while 0 < pos < len(data) and data[pos] & 0xC0 == 0x80:
+        pos -= 1
+    return pos
+
+
+class MemoryBackend:
+    """Spilled results of this worker, oldest first."""
+
+    def __init__(self):
+        self._entries = OrderedDict()   # id -> (meta, bytes)
+        self._lock = threading.Lock()
+
+    def locked(self):
+        return nullcontext()   # one process: SpillStore._lock is enough
+
+    def save(self, key, meta, data):
+        with self._lock:
+            self._entries[key] = (meta, data)
+
+    def load(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def entries(self):
+        """(id, meta, size) of every entry, oldest first."""
+        with self._lock:
+            return [(key, meta, len(data)) for key, (meta, data) in self._entries.items()]
+
+
+class DiskBackend:
+    """
+    One file per result in ``directory``: a JSON header line, then the data.
+    Files are written under a temporary name and renamed, so other workers
+    never see a partial result.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    @contextmanager
+    def locked(self):
+        """Exclusive across every process sharing the directory."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        fd = os.open(self._path(".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)   # releases the lock
+
+    def save(self, key, meta, data):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        tmp = self._path(f".{key}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(json.dumps(meta).encode() + b"\n")
+            fh.write(data)
+        os.replace(tmp, self._path(key))
+
+    def load(self, key):
+        try:
+            with open(self._path(key), "rb") as fh:
+                meta = json.loads(fh.readline())
+                return meta, fh.read()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        found = []
+        try:
+            scan = os.scandir(self.directory)
+        except FileNotFoundError:
+            return found
+        with scan:
+            for entry in scan:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    with open(entry.path, "rb") as fh:
+                        header = fh.readline()
+                        size = os.fstat(fh.fileno()).st_size - len(header)
+                    found.append((entry.name, json.loads(header), size))
+                except (OSError, ValueError):
+                    continue
+        found.sort(key=lambda item: item[1].get("created", 0))
+        return found
+
+
+class SpillStore:
+    def __init__(self, threshold=256 * 1024, page_size=64 * 1024, max_bytes=64 * 1024 * 1024,
+                 ttl=600, directory=None):
+        self.threshold = threshold
+        self.page_size = page_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = DiskBackend(directory) if directory else MemoryBackend()
+        self.spilled_total = 0
+        self.evicted_total = 0
+        self._lock = threading.Lock()   # eviction and the save it makes room for, in this process
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            threshold=getattr(settings, "MCP_SPILL_THRESHOLD", 256 * 1024),
+            page_size=getattr(settings, "MCP_SPILL_PAGE_SIZE", 64 * 1024),
+            max_bytes=getattr(settings, "MCP_SPILL_MAX_BYTES", 64 * 1024 * 1024),
+            ttl=getattr(settings, "MCP_SPILL_TTL", 600),
+            directory=getattr(settings, "MCP_SPILL_DIR", None),
+        )
+
+    # ── tool results ───────────────────────────────────────────
+    async def shrink(self, tool, content):
+        """``content`` with every oversized TextContent replaced by a spill link."""
+        if not self.threshold or not any(self._oversized(item) for item in content):
+            return content
+        user_id, _ = request_identity()
+        if user_id is None:
+            return content
+        shrunk = []
+        for item in content:
+            if self._oversized(item):
+                item = await sync_to_async(self._spill, thread_sensitive=False)(tool, item.text, user_id)
+            shrunk.append(item)
+        return shrunk
+
+    def _oversized(self, item):
+        return isinstance(item, TextContent) and len(item.text) > self.threshold
+
+    def _spill(self, tool, text, user_id):
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            raise ToolError(f"Result of {tool} is {len(data)} bytes, more than the "
+                            f"{self.max_bytes} bytes that can be returned")
+        key = secrets.token_hex(16)   # lowercase: URI hosts are case-folded
+        created = time.time()
+        meta = {
+            "owner": user_id,
+            "tool": tool,
+            "mime": "application/json" if text.lstrip()[:1] in ("{", "[") else "text/plain",
+            "created": created,
+        }
+        with self._lock, self.backend.locked():
+            self._evict(incoming=len(data))
+            self.backend.save(key, meta, data)
+            self.spilled_total += 1
+
+        pages = -(-len(data) // self.page_size)
+        logger.info("spilled %d bytes of %s as %s", len(data), tool, key,
+                    extra={"tool": tool, "bytes": len(data), "pages": pages})
+        link = {"spilled": {
+            "uri": f"{SCHEME}://{key}",
+            "mimeType": meta["mime"],
+            "size": len(data),
+            "pages": pages,
+            "pageSize": self.page_size,
+            "pageUri": f"{SCHEME}://{key}/{{page}}",
+            "expires": (datetime.fromtimestamp(created, timezone.utc) + timedelta(seconds=self.ttl)).isoformat(),
+        }}
+        return TextContent(type="text", text=json.dumps(link))
+
+    def _evict(self, incoming=0):
+        """
+        Drop expired entries, then the oldest ones until ``incoming`` bytes
+        fit. Callers hold ``_lock`` and ``backend.locked()``.
+        """
+        entries = self.backend.entries()
+        deadline = time.time() - self.ttl
+        total = sum(size for _, _, size in entries)
+        for key, meta, size in entries:
+            if meta.get("created", 0) >= deadline and total + incoming <= self.max_bytes:
+                continue
+            self.backend.delete(key)
+            self.evicted_total += 1
+            total -= size
+
+    # ── resources/read ─────────────────────────────────────────
+    def handles(self, uri):
+        return str(uri).startswith(f"{SCHEME}://")
+
+    async def read(self, uri):
+        return await sync_to_async(self._read, thread_sensitive=False)(str(uri), request_identity()[0])
+
+    def _read(self, uri, user_id):
+        parsed = urlparse(uri)
+        key = parsed.hostname or ""
+        entry = self.backend.load(key) if key.isalnum() and user_id is not None else None
+        if entry is None or entry[0].get("owner") != user_id:
+            raise NotFoundError(f"Unknown resource: {uri}")
+        meta, data = entry
+        if meta.get("created", 0) < time.time() - self.ttl:
+            self.backend.delete(key)
+            raise NotFoundError(f"Unknown resource: {uri}")
+
+        query = parse_qs(parsed.query)
+        try:
+            if "offset" in query:
+                start = int(query["offset"][0])
+                length = min(int(query.get("length", [self.page_size])[0]), self.page_size)
+                end = start + length
+            else:
+                page = int(parsed.path.strip("/") or 0)
+                start, end = page * self.page_size, (page + 1) * self.page_size
+        except ValueError:
+            raise ResourceError(f"Bad page or range in {uri}")
+        if start < 0 or end <= start or (start >= len(data) and data):
+            raise ResourceError(f"{uri} is past the end of the {len(data)} byte result")
+        chunk = data[_boundary(data, start):_boundary(data, end)]
+        return [ReadResourceContents(content=chunk.decode("utf-8"), mime_type=meta["mime"])]
+
+    def stats(self):
+        entries = self.backend.entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, _, size in entries),
+            "max_bytes": self.max_bytes,
+            "spilled_total": self.spilled_total,
+            "evicted_total": self.evicted_total,
+        }
+
+
+spill_store = SpillStore.from_settings()
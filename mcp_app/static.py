@@ -0,0 +1,250 @@
+# mcp_app/static.py
+"""
+Static asset serving for the composed ASGI app.
+
+collectstatic writes hashed copies (``styles.3f2a9c1b7d4e.css``) plus
+``.gz``/``.br`` siblings via ``CompressedManifestStaticFilesStorage``;
+``CachedStaticFiles`` then serves them with long-lived cache headers,
+strong ETags and a bounded in-memory cache so hot files never touch disk
+after the first hit.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import threading
+from collections import OrderedDict
+
+import anyio
+import anyio.to_thread
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip siblings are always produced
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".mjs", ".map", ".json", ".svg", ".html", ".txt", ".xml", ".ico",
+}
+# Name produced by ManifestStaticFilesStorage: "<stem>.<12 hex chars>.<ext>"
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Preferred order when the client accepts several encodings
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes ``.gz`` (and ``.br`` when the
+    ``brotli`` package is installed) siblings for every text asset, so the
+    ASGI static mount never compresses at request time.
+    """
+    min_compress_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.add(name)
+                if hashed_name:
+                    names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        for name in sorted(names):
+            for compressed_name in self._compress(name):
+                yield name, compressed_name, True
+
+    def _compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        if not self.exists(name):
+            return
+        with self.open(name) as fh:
+            data = fh.read()
+        if len(data) < self.min_compress_size:
+            return
+
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data, quality=11)))
+
+        for suffix, compressed in variants:
+            # Only keep variants that actually save bytes
+            if len(compressed) >= len(data):
+                continue
+            compressed_name = name + suffix
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            yield compressed_name
+
+
+class _CachedFile:
+    __slots__ = ("body", "headers")
+
+    def __init__(self, body, headers):
+        self.body = body
+        self.headers = headers
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles with precompressed variants, immutable caching for hashed
+    names, strong ETags/If-None-Match and a bounded LRU of small files.
+
+    Entries are keyed by (path, encoding) and never re-stat'ed; restart the
+    process after re-running collectstatic.
+    """
+
+    def __init__(self, *args, max_file_size=None, max_cache_bytes=None, max_age=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_file_size = (max_file_size if max_file_size is not None
+                              else getattr(settings, "MCP_STATIC_CACHE_MAX_FILE_SIZE", 256 * 1024))
+        self.max_cache_bytes = (max_cache_bytes if max_cache_bytes is not None
+                                else getattr(settings, "MCP_STATIC_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+        self.max_age = (max_age if max_age is not None
+                        else getattr(settings, "MCP_STATIC_MAX_AGE", 3600))
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        # path -> tuple of encodings that have a precompressed sibling on disk
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    async def get_response(self, path, scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405, headers={"Allow": "GET, HEAD"})
+
+        request_headers = Headers(scope=scope)
+        variants = self._variants.get(path)
+        if variants is None:
+            variants = await anyio.to_thread.run_sync(self._probe_variants, path)
+        encoding = self._negotiate(request_headers.get("accept-encoding", ""), variants)
+
+        entry = self._cache_get((path, encoding))
+        if entry is None:
+            entry = await anyio.to_thread.run_sync(self._load, path, encoding, bool(variants))
+
+        if self._etag_matches(request_headers, entry.headers["etag"]):
+            return Response(status_code=304, headers={
+                k: v for k, v in entry.headers.items() if k in ("etag", "cache-control", "vary")
+            })
+        if isinstance(entry, Response):
+            # Too large to cache: stream it from disk
+            return entry
+        if scope["method"] == "HEAD":
+            return Response(status_code=200, headers=entry.headers)
+        return Response(entry.body, status_code=200, headers=entry.headers)
+
+    def _probe_variants(self, path):
+        full_path, stat_result = self.lookup_path(path)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+        variants = tuple(
+            encoding for encoding, suffix in ENCODINGS
+            if os.path.isfile(full_path + suffix)
+        )
+        self._variants[path] = variants
+        return variants
+
+    @staticmethod
+    def _negotiate(accept_encoding, variants):
+        if not variants or not accept_encoding:
+            return None
+        qvalues = {}
+        for item in accept_encoding.split(","):
+            token, *params = item.split(";")
+            q = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            qvalues[token.strip().lower()] = q
+        for encoding in variants:
+            # an explicit q for the coding wins over "*"
+            if qvalues.get(encoding, qvalues.get("*", 0.0)) > 0:
+                return encoding
+        return None
+
+    def _headers_for(self, path, body_etag, size, media_type, encoding, has_variants):
+        headers = {
+            "content-type": media_type,
+            "content-length": str(size),
+            "etag": f'"{body_etag}"',
+            "cache-control": (IMMUTABLE_CACHE_CONTROL if HASHED_NAME_RE.search(path)
+                              else f"public, max-age={self.max_age}"),
+        }
+        if encoding:
+            headers["content-encoding"] = encoding
+        if has_variants:
+            headers["vary"] = "Accept-Encoding"
+        return headers
+
+    def _load(self, path, encoding, has_variants):
+        full_path, stat_result = self.lookup_path(path)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        if media_type.startswith("text/") or media_type.endswith("javascript"):
+            media_type += "; charset=utf-8"
+        if encoding:
+            full_path += dict(ENCODINGS)[encoding]
+            stat_result = os.stat(full_path)
+
+        if stat_result.st_size > self.max_file_size:
+            etag = hashlib.md5(
+                f"{stat_result.st_mtime}-{stat_result.st_size}-{encoding}".encode(),
+                usedforsecurity=False,
+            ).hexdigest()
+            headers = self._headers_for(path, etag, stat_result.st_size, media_type, encoding, has_variants)
+            headers.pop("content-length")
+            return FileResponse(full_path, stat_result=stat_result, headers=headers)
+
+        with open(full_path, "rb") as fh:
+            body = fh.read()
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        entry = _CachedFile(
+            body, self._headers_for(path, etag, len(body), media_type, encoding, has_variants)
+        )
+        self._cache_put((path, encoding), entry)
+        return entry
+
+    def _cache_get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, key, entry):
+        with self._lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._cache_bytes -= len(old.body)
+            self._cache[key] = entry
+            self._cache_bytes += len(entry.body)
+            while self._cache_bytes > self.max_cache_bytes and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted.body)
+
+    @staticmethod
+    def _etag_matches(request_headers, etag):
+        if_none_match = request_headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
@@ -0,0 +1,371 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from fastmcp.exceptions import NotFoundError, ToolError
+from mcp.server.lowlevel.server import request_ctx
+from mcp.types import TextContent
+from oauth2_provider.models import get_application_model, get_grant_model
+from sse_starlette.sse import AppStatus
+
+from .drain import DrainMiddleware, DrainState
+from .mcp_server import djmcp
+from .oauth_exchange import TokenExchangeError, exchange_code
+from .permissions import ToolPolicy, request_auth
+from .ratelimit import RateLimiter, SharedBuckets
+from .spill import SpillStore
+
+TOKEN_URL = "http://127.0.0.1:8000/o/token/"
+REDIRECT_URI = "http://127.0.0.1:6274/auth/callback"
+VERIFIER = "v" * 64
+
+
+class InProcessExchangeTests(TestCase):
+    """exchange_code() against this project's /o/token/, without a loopback request."""
+
+    def setUp(self):
+        Application = get_application_model()
+        self.user = get_user_model().objects.create_user("exchange", password="x")
+        self.secret = "s3cret+with/odd:chars"
+        self.app = Application.objects.create(
+            name="exchange test", user=self.user, client_secret=self.secret,
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_AUTHORIZATION_CODE,
+            redirect_uris=REDIRECT_URI,
+        )
+        challenge = base64.urlsafe_b64encode(hashlib.sha256(VERIFIER.encode()).digest()).rstrip(b"=").decode()
+        get_grant_model().objects.create(
+            application=self.app, user=self.user, code="the-code", redirect_uri=REDIRECT_URI,
+            expires=timezone.now() + timedelta(minutes=5), scope="read write",
+            code_challenge=challenge, code_challenge_method="S256",
+        )
+        self.data = {"grant_type": "authorization_code", "code": "the-code",
+                     "redirect_uri": REDIRECT_URI, "code_verifier": VERIFIER}
+
+    def test_basic_credentials(self):
+        payload = exchange_code(TOKEN_URL, self.data, auth=(self.app.client_id, self.secret))
+        self.assertIn("access_token", payload)
+        self.assertEqual(payload["scope"], "read write")
+
+    def test_body_credentials(self):
+        data = dict(self.data, client_id=self.app.client_id, client_secret=self.secret)
+        self.assertIn("access_token", exchange_code(TOKEN_URL, data))
+
+    def test_wrong_secret_is_rejected(self):
+        with self.assertRaises(TokenExchangeError) as ctx:
+            exchange_code(TOKEN_URL, self.data, auth=(self.app.client_id, "wrong"))
+        self.assertEqual(ctx.exception.status, 401)
+        self.assertEqual(ctx.exception.payload["error"], "invalid_client")
+
+
+async def _call(app, method="POST", headers=()):
+    """(status, headers) of one request through ``app``."""
+    started = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            started.update(status=message["status"], headers=dict(message["headers"]))
+
+    scope = {"type": "http", "method": method, "path": "/mcp/",
+             "headers": [(k.encode(), v.encode()) for k, v in headers]}
+    await app(scope, receive, send)
+    return started["status"], started["headers"]
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+class _Sessions:
+    def __init__(self):
+        self.closed_at = None
+
+    def __len__(self):
+        return 1
+
+    async def close_all(self, reason):
+        self.closed_at = asyncio.get_running_loop().time()
+
+
+@override_settings(MCP_DRAIN_RETRY_MS=3000)
+class DrainTests(SimpleTestCase):
+    """DrainMiddleware admission and DrainState waiting for running tool calls."""
+
+    def setUp(self):
+        self.state = DrainState()
+        self.app = DrainMiddleware(_ok_app, state=self.state)
+        self.addCleanup(setattr, AppStatus, "should_exit", AppStatus.should_exit)
+
+    def test_new_sessions_are_refused_while_draining(self):
+        self.assertEqual(asyncio.run(_call(self.app))[0], 200)
+        self.state.draining = True
+        status, headers = asyncio.run(_call(self.app))
+        self.assertEqual(status, 503)
+        self.assertEqual(headers[b"retry-after"], b"3")
+
+    def test_existing_sessions_still_work_while_draining(self):
+        self.state.draining = True
+        self.assertEqual(asyncio.run(_call(self.app, headers=[("mcp-session-id", "abc")]))[0], 200)
+        self.assertEqual(asyncio.run(_call(self.app, "GET"))[0], 200)
+
+    @override_settings(MCP_DRAIN_TIMEOUT=5)
+    def test_waits_for_running_tool_calls(self):
+        sessions = _Sessions()
+        hints = []
+
+        async def stream(message):
+            hints.append(message["body"])
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            self.state._streams[stream] = "GET"
+            async with self.state.track_tool():
+                task = self.state.start(sessions)
+                await asyncio.sleep(0.2)
+                self.assertFalse(task.done())
+                self.assertIsNone(sessions.closed_at)
+                finished = loop.time()
+            await task
+            return finished
+
+        finished = asyncio.run(scenario())
+        self.assertGreaterEqual(sessions.closed_at, finished)
+        self.assertEqual(hints, [b"retry: 3000\n\n"])
+        self.assertTrue(AppStatus.should_exit)
+
+    @override_settings(MCP_DRAIN_TIMEOUT=0.1)
+    def test_gives_up_after_the_timeout(self):
+        sessions = _Sessions()
+
+        async def scenario():
+            async with self.state.track_tool():
+                await asyncio.wait_for(self.state.start(sessions), timeout=2)
+
+        asyncio.run(scenario())
+        self.assertIsNotNone(sessions.closed_at)
+
+
+class RateLimitTests(SimpleTestCase):
+    """Token buckets shared through one file, refunds and RateLimit-* headers."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "buckets.bin")
+
+    def test_buckets_are_shared_through_the_file(self):
+        one, two = SharedBuckets(self.path, 64), SharedBuckets(self.path, 64)
+        self.assertEqual(one.take("k", 2, 0), (True, 1.0))
+        self.assertEqual(two.take("k", 2, 0), (True, 0.0))
+        self.assertEqual(one.take("k", 2, 0), (False, 0.0))
+        self.assertEqual(two.take("other", 2, 0), (True, 1.0))
+
+    def test_refill_stops_at_capacity(self):
+        buckets = SharedBuckets(self.path, 64)
+        self.assertEqual(buckets.take("k", 1, 0), (True, 0.0))
+        self.assertEqual(buckets.take("k", 1, 0), (False, 0.0))
+        self.assertEqual(buckets.take("k", 3, 10 ** 9), (True, 2.0))
+
+    def test_refused_request_refunds_the_buckets_it_charged(self):
+        limiter = RateLimiter(SharedBuckets(self.path, 64), token=(5, 60), user=(5, 60), tool=(1, 60))
+        self.assertTrue(limiter.check(token="t", user_id=1, tools=["search"]).allowed)
+        refused = limiter.check(token="t", user_id=1, tools=["search"])
+        self.assertFalse(refused.allowed)
+        self.assertEqual(refused.scope, "tool:search")
+        # the token and user buckets were charged once, not twice
+        decision = limiter.check(token="t", user_id=1)
+        self.assertEqual(decision.remaining, 3)
+
+    def test_headers(self):
+        limiter = RateLimiter(SharedBuckets(self.path, 64), token=(10, 60), user=(2, 30))
+        decision = limiter.check(token="t", user_id=1)
+        self.assertEqual(decision.scope, "user")   # the tightest bucket is reported
+        self.assertEqual(decision.headers(), {
+            "RateLimit-Limit": "2", "RateLimit-Remaining": "1", "RateLimit-Reset": "2",
+            "RateLimit-Policy": "30;w=60;burst=2"})
+        limiter.check(token="t", user_id=1)
+        refused = limiter.check(token="t", user_id=1)
+        self.assertFalse(refused.allowed)
+        self.assertEqual(refused.headers()["Retry-After"], "2")
+        self.assertEqual(refused.headers()["RateLimit-Remaining"], "0")
+
+    def test_token_checksum_stands_in_for_the_token(self):
+        limiter = RateLimiter(SharedBuckets(self.path, 64), token=(1, 60))
+        limiter.check(token="secret")
+        refused = limiter.check(token_checksum=hashlib.sha256(b"secret").hexdigest())
+        self.assertFalse(refused.allowed)
+
+    def test_file_grows_but_never_shrinks(self):
+        large = SharedBuckets(self.path, 1024)
+        large.take("k", 5, 0)
+        size = os.path.getsize(self.path)
+        small = SharedBuckets(self.path, 64)
+        self.assertEqual(small.take("k", 5, 0), (True, 3.0))   # same table, bucket kept
+        self.assertEqual(os.path.getsize(self.path), size)
+        SharedBuckets(self.path, 4096).take("other", 5, 0)
+        self.assertGreater(os.path.getsize(self.path), size)
+        self.assertEqual(large.take("k", 5, 0), (True, 2.0))
+
+
+class _Credentials:
+    def __init__(self, scopes):
+        self.scopes = scopes
+
+
+def _as_request(user=None, scopes=None):
+    """Make the current context look like a /mcp HTTP request by ``user``; returns the reset token."""
+    scope = {"type": "http", "headers": []}
+    if user is not None:
+        scope["user"] = user
+    if scopes is not None:
+        scope["auth"] = _Credentials(scopes)
+    return request_ctx.set(SimpleNamespace(request=SimpleNamespace(scope=scope)))
+
+
+@override_settings(DATABASE_ROUTERS=[])   # permission reads stay in the test transaction
+class ToolPolicyTests(TestCase):
+    """Scope subsets, Django permissions and fail-closed requests."""
+
+    def setUp(self):
+        self.policy = ToolPolicy(default_scopes=["read"])
+        self.policy.declare("plain")                                        # default: read
+        self.policy.declare("writer", scopes=["write"])
+        self.policy.declare("both", scopes=["read", "write"])
+        self.perm = f"{get_user_model()._meta.app_label}.view_user"
+        self.policy.declare("viewer", scopes=["read"], permissions=[self.perm])
+        self.policy.compile(["plain", "writer", "both", "viewer"])
+        User = get_user_model()
+        self.user = User.objects.create_user("policy")
+        self.viewer = User.objects.create_user("viewer")
+        self.viewer.user_permissions.add(Permission.objects.get_by_natural_key(
+            "view_user", *get_user_model()._meta.label_lower.split(".")))
+        self.admin = User.objects.create_superuser("admin", password="x")
+
+    async def test_scope_subsets(self):
+        self.assertEqual(await self.policy.allowed(self.user, {"read"}), {"plain"})
+        self.assertEqual(await self.policy.allowed(self.user, {"write"}), {"writer"})
+        self.assertEqual(await self.policy.allowed(self.user, {"read", "write"}), {"plain", "writer", "both"})
+        self.assertEqual(await self.policy.allowed(self.user, set()), set())
+        # unknown scopes grant nothing extra
+        self.assertEqual(await self.policy.allowed(self.user, {"read", "admin"}), {"plain"})
+
+    async def test_permissions(self):
+        self.assertEqual(await self.policy.allowed(self.viewer, {"read"}), {"plain", "viewer"})
+        self.assertEqual(await self.policy.allowed(self.admin, {"read"}), {"plain", "viewer"})
+        # a session cookie isn't scope-restricted; permissions still are
+        self.assertEqual(await self.policy.allowed(self.user, None), {"plain", "writer", "both"})
+        self.assertEqual(await self.policy.allowed(self.admin, None), {"plain", "writer", "both", "viewer"})
+
+    async def test_inactive_user_loses_permission_tools(self):
+        self.viewer.is_active = False
+        self.assertEqual(await self.policy.allowed(self.viewer, {"read"}), {"plain"})
+
+    def test_requirements(self):
+        self.assertEqual(self.policy.requirements("plain"), ({"read"}, frozenset()))
+        self.assertEqual(self.policy.requirements("viewer"), ({"read"}, {self.perm}))
+
+    def test_request_auth(self):
+        self.assertEqual(request_auth(), (None, None))   # off HTTP
+        token = _as_request()
+        try:
+            user, scopes = request_auth()
+            self.assertIsInstance(user, AnonymousUser)
+            self.assertEqual(scopes, frozenset())
+        finally:
+            request_ctx.reset(token)
+        token = _as_request(self.user, {"read"})
+        try:
+            self.assertEqual(request_auth(), (self.user, {"read"}))
+        finally:
+            request_ctx.reset(token)
+
+    async def test_anonymous_http_gets_no_tools(self):
+        token = _as_request()
+        try:
+            self.assertEqual(await djmcp.allowed_tools(), frozenset())
+            with self.assertRaises(ToolError):
+                await djmcp._call_tool("echo", {"message": "hi"})
+        finally:
+            request_ctx.reset(token)
+
+    async def test_off_http_is_not_restricted(self):
+        self.assertIsNone(await djmcp.allowed_tools())
+        content = await djmcp._call_tool("echo", {"message": "hi"})
+        self.assertIn("hi", content[0].text)
+
+
+class SpillTests(SimpleTestCase):
+    """Spilled results: UTF-8-safe pages and ranges, owner-only reads, expiry."""
+
+    TEXT = "aé€😀" * 50   # 1-, 2-, 3- and 4-byte characters
+
+    def stores(self):
+        """One store per backend: memory and a directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return [SpillStore(threshold=10, page_size=8, ttl=600, directory=backend)
+                for backend in (None, directory.name)]
+
+    def spill(self, store, user):
+        token = _as_request(user)
+        try:
+            content = asyncio.run(store.shrink("tool", [TextContent(type="text", text=self.TEXT)]))
+        finally:
+            request_ctx.reset(token)
+        return json.loads(content[0].text)["spilled"]
+
+    def read(self, store, uri, user):
+        token = _as_request(user)
+        try:
+            return "".join(c.content for c in asyncio.run(store.read(uri)))
+        finally:
+            request_ctx.reset(token)
+
+    def test_pages_cut_on_character_boundaries(self):
+        owner = SimpleNamespace(pk=1, is_authenticated=True)
+        for store in self.stores():
+            link = self.spill(store, owner)
+            self.assertEqual(link["size"], len(self.TEXT.encode()))
+            pages = [self.read(store, link["pageUri"].format(page=i), owner) for i in range(link["pages"])]
+            # a page starts at the character its offset falls in: at most 3 extra bytes
+            self.assertTrue(all(0 < len(page.encode()) <= 8 + 3 for page in pages))
+            self.assertEqual("".join(pages), self.TEXT)
+            # a range starting and ending inside characters still decodes
+            self.assertEqual(self.read(store, link["uri"] + "?offset=2&length=7", owner), "é€")
+
+    def test_only_the_owner_can_read(self):
+        owner = SimpleNamespace(pk=1, is_authenticated=True)
+        other = SimpleNamespace(pk=2, is_authenticated=True)
+        for store in self.stores():
+            link = self.spill(store, owner)
+            for reader in (other, None):
+                with self.assertRaises(NotFoundError):
+                    self.read(store, link["uri"], reader)
+
+    def test_calls_without_a_user_stay_inline(self):
+        for store in self.stores():
+            content = asyncio.run(store.shrink("tool", [TextContent(type="text", text=self.TEXT)]))
+            self.assertEqual(content[0].text, self.TEXT)
+            self.assertEqual(store.stats()["entries"], 0)
+
+    def test_expired_results_are_gone(self):
+        owner = SimpleNamespace(pk=1, is_authenticated=True)
+        for store in self.stores():
+            link = self.spill(store, owner)
+            store.ttl = -1
+            with self.assertRaises(NotFoundError):
+                self.read(store, link["uri"], owner)
+            self.assertEqual(store.stats()["entries"], 0)
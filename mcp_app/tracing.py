@@ -0,0 +1,364 @@
+# mcp_app/tracing.py
+"""
+Span tracing for the /mcp request path, exported without any network.
+
+Each /mcp POST/DELETE is one trace: TracingMiddleware opens the root span,
+CombinedAuthMiddleware adds the auth decision, DjangoFastMCP adds the JSON-RPC
+dispatch and the tool body, and every ORM query issued while a span is
+current becomes a ``db.query`` child (so auth DB time is visible too).
+
+Every request is recorded; when the root span ends the trace is kept if it
+was sampled (MCP_TRACE_SAMPLE_RATE), took MCP_TRACE_SLOW_MS or longer, or
+failed - so p99 outliers are always kept. Kept traces are exported as
+OTLP/JSON, one ``{"resourceSpans": [...]}`` document per trace, to:
+
+- "memory": a ring of the last MCP_TRACE_BUFFER traces per worker
+  (``/mcp-demo/traces/`` for staff)
+- "file":   MCP_TRACE_FILE, rotated at MCP_TRACE_FILE_MAX_BYTES
+
+``python manage.py mcp_traces`` ranks the slowest traces in the file.
+"""
+import contextvars
+import hashlib
+import json
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging import makeLogRecord
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from starlette.datastructures import Headers
+
+SERVICE_NAME = "django_mcp"
+SCOPE_KEY = "mcp.trace_span"    # ASGI scope key holding the root span
+
+# OTLP enum values
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_current = contextvars.ContextVar("mcp_trace_span", default=None)
+
+
+def current_span():
+    return _current.get()
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes",
+                 "start_ns", "end_ns", "status", "message")
+
+    def __init__(self, trace, name, parent_id=None, kind=KIND_INTERNAL, attributes=None):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or ())
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = STATUS_UNSET
+        self.message = ""
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def fail(self, error):
+        self.status = STATUS_ERROR
+        if isinstance(error, BaseException):
+            self.attributes["exception.type"] = type(error).__name__
+            self.message = str(error)[:500]
+        else:
+            self.message = str(error)
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self.trace.finished(self)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    __slots__ = ("tracer", "trace_id", "root", "spans")
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.root = None
+        self.spans = []
+
+    def finished(self, span):
+        self.spans.append(span)
+        if span is self.root:
+            self.tracer.finish_trace(self)
+
+
+# ── OTLP/JSON ───────────────────────────────────────────────────
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+def to_otlp(trace):
+    spans = []
+    for span in trace.spans:
+        doc = {
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _otlp_attributes(span.attributes),
+            "status": {"code": span.status, "message": span.message} if span.message else {"code": span.status},
+        }
+        if span.parent_id:
+            doc["parentSpanId"] = span.parent_id
+        spans.append(doc)
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME, "process.pid": os.getpid()})},
+        "scopeSpans": [{"scope": {"name": "mcp_app.tracing"}, "spans": spans}],
+    }]}
+
+
+def otlp_spans(doc):
+    return [span
+            for resource in doc.get("resourceSpans", ())
+            for scope in resource.get("scopeSpans", ())
+            for span in scope.get("spans", ())]
+
+
+def attribute_dict(span):
+    out = {}
+    for attr in span.get("attributes", ()):
+        (kind, value), = attr["value"].items()
+        out[attr["key"]] = int(value) if kind == "intValue" else value
+    return out
+
+
+def summarize(doc):
+    """One row per trace for ranking: root name/duration plus DB totals."""
+    spans = otlp_spans(doc)
+    if not spans:
+        return None
+    root = next((s for s in spans if not s.get("parentSpanId")), spans[0])
+    start, end = int(root["startTimeUnixNano"]), int(root["endTimeUnixNano"])
+    db = [s for s in spans if s["name"] == "db.query"]
+    tools = [s["name"][len("tool "):] for s in spans if s["name"].startswith("tool ")]
+    return {
+        "trace_id": root["traceId"],
+        "name": root["name"],
+        "start": start / 1e9,
+        "duration_ms": round((end - start) / 1e6, 3),
+        "error": any(s.get("status", {}).get("code") == STATUS_ERROR for s in spans),
+        "spans": len(spans),
+        "db_queries": len(db),
+        "db_ms": round(sum(int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"]) for s in db) / 1e6, 3),
+        "tools": tools,
+        "attributes": attribute_dict(root),
+    }
+
+
+def rank(docs, top=20, name=None):
+    rows = [row for row in map(summarize, docs) if row is not None]
+    if name:
+        rows = [row for row in rows
+                if name in row["name"] or any(name in tool for tool in row["tools"])]
+    rows.sort(key=lambda row: row["duration_ms"], reverse=True)
+    return rows[:top]
+
+
+# ── exporters ───────────────────────────────────────────────────
+class MemoryExporter:
+    def __init__(self, size):
+        self.traces = deque(maxlen=size)
+
+    def export(self, doc):
+        self.traces.append(doc)
+
+
+class FileExporter:
+    def __init__(self, path, max_bytes, backups):
+        os.makedirs(os.path.dirname(os.fspath(path)) or ".", exist_ok=True)
+        self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                           encoding="utf-8", delay=True)
+        self.traces = ()
+
+    def export(self, doc):
+        # handle() takes the handler lock and rolls the file over when full
+        self.handler.handle(makeLogRecord({"msg": json.dumps(doc, separators=(",", ":"))}))
+
+
+# ── tracer ──────────────────────────────────────────────────────
+class Tracer:
+    def __init__(self, exporter, sample_rate=0.0, slow_ms=None):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.kept_total = 0
+        self.dropped_total = 0
+
+    @classmethod
+    def from_settings(cls):
+        kind = getattr(settings, "MCP_TRACE_EXPORTER", "memory")
+        if kind == "file":
+            exporter = FileExporter(
+                getattr(settings, "MCP_TRACE_FILE", os.path.join(settings.BASE_DIR, "traces", "mcp-traces.jsonl")),
+                getattr(settings, "MCP_TRACE_FILE_MAX_BYTES", 10 * 1024 * 1024),
+                getattr(settings, "MCP_TRACE_FILE_BACKUPS", 3),
+            )
+        elif kind == "memory":
+            exporter = MemoryExporter(getattr(settings, "MCP_TRACE_BUFFER", 500))
+        else:
+            exporter = None
+        return cls(
+            exporter,
+            sample_rate=getattr(settings, "MCP_TRACE_SAMPLE_RATE", 0.01),
+            slow_ms=getattr(settings, "MCP_TRACE_SLOW_MS", 1000),
+        )
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def start_trace(self, name, kind=KIND_SERVER, attributes=None):
+        trace = Trace(self)
+        trace.root = Span(trace, name, kind=kind, attributes=attributes)
+        return trace.root
+
+    def finish_trace(self, trace):
+        root = trace.root
+        keep = (root.status == STATUS_ERROR
+                or (self.slow_ms is not None and root.duration_ms >= self.slow_ms)
+                or random.random() < self.sample_rate)
+        if not keep:
+            self.dropped_total += 1
+            return
+        self.kept_total += 1
+        self.exporter.export(to_otlp(trace))
+
+    @contextmanager
+    def span(self, name, attributes=None, kind=KIND_INTERNAL, parent=None):
+        """Child of ``parent`` or of the current span; yields None outside a trace."""
+        parent = parent or _current.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace, name, parent.span_id, kind, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.fail(exc)
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+
+tracer = Tracer.from_settings()
+
+
+# ── ORM ─────────────────────────────────────────────────────────
+def _db_wrapper(execute, sql, params, many, context):
+    if _current.get() is None:
+        return execute(sql, params, many, context)
+    attributes = {"db.system": context["connection"].vendor,
+                  "db.statement": sql[:1000]}
+    if many:
+        attributes["db.operation.batch"] = True
+    with tracer.span("db.query", attributes, kind=KIND_CLIENT):
+        return execute(sql, params, many, context)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def install():
+    """Trace ORM queries on every new DB connection (idempotent)."""
+    if not tracer.enabled:
+        return
+    connection_created.connect(_on_connection_created, dispatch_uid="mcp_app.tracing")
+    for connection in connections.all(initialized_only=True):
+        _on_connection_created(None, connection)
+
+
+# ── hooks ───────────────────────────────────────────────────────
+def traced_handler(handler):
+    """Wrap a low-level MCP request handler in an ``mcp <method>`` span."""
+    from mcp.server.lowlevel.server import request_ctx
+
+    async def wrapper(req):
+        try:
+            ctx = request_ctx.get()
+        except LookupError:
+            return await handler(req)
+        # The handler runs in the session's task, not the HTTP request's, so
+        # the parent span comes from the request scope rather than _current.
+        request = ctx.request
+        parent = getattr(request, "scope", {}).get(SCOPE_KEY)
+        if parent is None:
+            return await handler(req)
+        attributes = {"rpc.system": "jsonrpc", "rpc.method": req.method,
+                      "rpc.jsonrpc.request_id": str(ctx.request_id)}
+        with tracer.span(f"mcp {req.method}", attributes, parent=parent):
+            return await handler(req)
+
+    return wrapper
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening the root span of each /mcp request. The
+    standalone GET SSE stream lives as long as its session and isn't traced.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "GET" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        attributes = {"http.request.method": scope["method"], "url.path": scope["path"]}
+        sid = Headers(scope=scope).get("mcp-session-id")
+        if sid:
+            # the session id works as a credential, so traces only correlate by digest
+            attributes["mcp.session.hash"] = hashlib.sha256(sid.encode()).hexdigest()[:16]
+        root = tracer.start_trace(f"{scope['method']} /mcp", attributes=attributes)
+        scope[SCOPE_KEY] = root
+        token = _current.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.response.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.fail(f"HTTP {message['status']}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            root.fail(exc)
+            raise
+        finally:
+            _current.reset(token)
+            root.end()
@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import mcp_launcher, mcp_finalize
+from .views import mcp_launcher, mcp_finalize, mcp_inspector_status, mcp_sessions, mcp_traces
 
 urlpatterns = [
     path('', mcp_launcher, name='mcp_launcher'),
     path('mcp_finalize/', mcp_finalize, name='mcp_finalize'),
+    path('inspector/<str:instance_id>/', mcp_inspector_status, name='mcp_inspector_status'),
+    path('sessions/', mcp_sessions, name='mcp_sessions'),
+    path('traces/', mcp_traces, name='mcp_traces'),
 ]
\ No newline at end of file
@@ -1,25 +1,21 @@
 # views.py
 import logging
-import atexit
-import os
-import signal
-import subprocess
 import secrets
 import hashlib
 import base64
-import re
 from urllib.parse import urlencode
 
-import requests
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
-from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import get_user_model
 from oauth2_provider.models import get_application_model
 from .forms import MCPLauncherForm, CodeEntryForm
+from .inspector import get_supervisor, inspector_command, inspector_ui_url
+from .oauth_exchange import TokenExchangeError, exchange_code
 
 # Logging setup
 logger = logging.getLogger("mcp.launcher")
-logging.basicConfig(level=logging.INFO)
 
 # Constants
 AUTH_URL       = "http://127.0.0.1:8000/o/authorize/"
@@ -27,39 +23,45 @@ TOKEN_URL      = "http://127.0.0.1:8000/o/token/"
 INTROSPECT_URL = "http://127.0.0.1:8000/o/introspect/"
 REVOKE_URL     = "http://127.0.0.1:8000/o/revoke/"
 INSPECTOR_HTTP = "http://127.0.0.1:8000/mcp/"
-INSPECTOR_UI   = "http://127.0.0.1:6274/"
-REDIRECT_URI   = INSPECTOR_UI + "auth/callback"
+# Registered on apps the launcher creates. Each flow redirects to its own
+# Inspector's UI port; DOT accepts any port on a 127.0.0.1 URI (RFC 8252)
+REGISTERED_REDIRECT_URI = "http://127.0.0.1:6274/auth/callback"
 SCOPE          = "read write"
+MAX_TRACES_SHOWN = 500           # upper bound for mcp_traces' ?top=
 
 
-def kill_processes_on_ports(ports):
-    for port in ports:
-        try:
-            result = subprocess.check_output(["lsof", "-i", f":{port}", "-t"], stderr=subprocess.DEVNULL)
-            pids = result.decode().strip().split("\n")
-            for pid in pids:
-                try:
-                    os.kill(int(pid), signal.SIGTERM)
-                    print(f"Killed PID {pid} on port {port}")
-                except ProcessLookupError:
-                    print(f"Process {pid} not found.")
-        except subprocess.CalledProcessError:
-            print(f"No process found on port {port}")
-
 def generate_pkce_pair():
     verifier = secrets.token_urlsafe(64)[:128]
     digest = hashlib.sha256(verifier.encode("utf-8")).digest()
     challenge = base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
-    logger.info(f"PKCE generated: verifier={verifier}, challenge={challenge}")
+    logger.debug("PKCE pair generated (challenge %s)", challenge)
     return verifier, challenge
 
 
 
+def _inspector_base_command():
+    """Inspector argv shared by pooled and per-user instances (no user credentials)."""
+    return [
+        *inspector_command(), INSPECTOR_HTTP,
+        '--transport', 'streamable-http',
+        '--header', 'Accept:application/json, text/event-stream',
+        '--auth-url', AUTH_URL,
+        '--token-url', TOKEN_URL,
+        '--introspect', INTROSPECT_URL,
+        '--revocation', REVOKE_URL,
+    ]
+
+
 def mcp_launcher(request):
     """
-    Step 1: show form to enter client credentials,
-    then open OAuth in new tab and show code entry form.
+    Step 1: show form to enter client credentials, pick the Inspector
+    instance (its UI port is the redirect URI), then open OAuth in new tab
+    and show code entry form.
     """
+    # Pre-start Inspector instances while the user fills in the form; only
+    # for signed-in users, so anonymous visitors can't make workers spawn them
+    if request.user.is_authenticated:
+        get_supervisor().warm(_inspector_base_command())
     code_form = None
     if request.method == "POST" and "start_auth" in request.POST:
         form = MCPLauncherForm(request.POST)
@@ -82,11 +84,33 @@ def mcp_launcher(request):
                     user=user,
                     client_type=client_type,
                     authorization_grant_type=Application.GRANT_AUTHORIZATION_CODE,
-                    defaults={'redirect_uris': REDIRECT_URI},
+                    defaults={'redirect_uris': REGISTERED_REDIRECT_URI},
                 )
                 client_id = app.client_id
                 client_secret = app.client_secret or client_secret
-                logger.info(f"Created OAuth app: {client_id}, confidential={bool(client_secret)}")
+                logger.info("Created OAuth app %s (confidential=%s)", client_id, bool(client_secret))
+            else:
+                app = Application.objects.get(client_id=client_id)
+
+            # Take a pre-started Inspector if one is ready; otherwise start one
+            # in the background. It acts with the user's token from step 2 on.
+            supervisor = get_supervisor()
+            owner = _owner_key(request)
+            instance = supervisor.checkout(owner)
+            if instance is None:
+                cmd = _inspector_base_command() + ['--client-id', client_id]
+                if client_secret:
+                    cmd += ['--client-secret', client_secret]
+                instance = supervisor.launch(cmd, owner=owner)
+            if instance.redirect_uri is None:
+                return render(request, 'mcp_error.html', {'error': instance.error})
+            if not app.redirect_uri_allowed(instance.redirect_uri):
+                supervisor.stop(instance.id, "redirect URI not registered")
+                return render(request, 'mcp_error.html', {
+                    'error': f"Register {instance.redirect_uri} as a redirect URI of {app.name} "
+                             "(any port of a http://127.0.0.1 URI is accepted)."})
+            request.session['inspector_id'] = instance.id
+            request.session['redirect_uri'] = instance.redirect_uri
 
             # PKCE
             verifier, challenge = generate_pkce_pair()
@@ -98,18 +122,18 @@ def mcp_launcher(request):
             params = {
                 'response_type': 'code',
                 'client_id': client_id,
-                'redirect_uri': REDIRECT_URI,
+                'redirect_uri': instance.redirect_uri,
                 'scope': SCOPE,
                 'code_challenge': challenge,
                 'code_challenge_method': 'S256',
             }
             auth_url = f"{AUTH_URL}?{urlencode(params)}"
-            logger.info(f"Opening OAuth URL: {auth_url}")
+            logger.info("Opening OAuth authorize URL for client %s", client_id)
 
             # In template JS, this will be opened in new tab
             code_form = CodeEntryForm()
         else:
-            logger.warning(f"Launcher form invalid: {form.errors}")
+            logger.warning("Launcher form invalid: %s", form.errors.as_json())
     else:
         form = MCPLauncherForm()
 
@@ -122,7 +146,7 @@ def mcp_launcher(request):
 
 def mcp_finalize(request):
     """
-    Step 2: receive pasted code, exchange for token, launch Inspector CLI.
+    Step 2: receive pasted code, exchange for token, bind it to the Inspector.
     """
     form = CodeEntryForm(request.POST or None)
     if request.method == 'POST' and form.is_valid():
@@ -130,74 +154,105 @@ def mcp_finalize(request):
         verifier = request.session.get('pkce_verifier')
         client_id = request.session.get('client_id')
         client_secret = request.session.get('client_secret')
-        logger.info(f"Finalizing with code={code}")
+        instance_id = request.session.get('inspector_id')
+        supervisor = get_supervisor()
+        owner = _owner_key(request)
+        instance = supervisor.lookup(instance_id) if instance_id else None
+        if instance is None or instance["owner"] != owner or instance["state"] in ("failed", "exited"):
+            return render(request, 'mcp_error.html', {'error': 'The Inspector for this authorization stopped; start again.'})
+        logger.info("Exchanging authorization code for client %s", client_id)
 
         # Exchange code for access token
         data = {
             'grant_type': 'authorization_code',
             'code': code,
-            'redirect_uri': REDIRECT_URI,
+            'redirect_uri': request.session.get('redirect_uri'),
             'code_verifier': verifier,
             'client_id': client_id,
         }
         if client_secret:
             data['client_secret'] = client_secret
-        resp = requests.post(TOKEN_URL, data=data)
-        if not resp.ok:
-            logger.error(f"Token exchange error: {resp.status_code} {resp.text}")
+        # In-process when TOKEN_URL is our own /o/token/, no loopback request
+        try:
+            bearer_token = exchange_code(TOKEN_URL, data).get('access_token')
+        except TokenExchangeError as exc:
+            logger.error("Token exchange error: %s %s", exc.status, exc.payload)
             return render(request, 'mcp_error.html', {'error': 'Token exchange failed.'})
-        bearer_token = resp.json().get('access_token')
-        logger.info(f"Access token: {bearer_token}")
-
-        kill_processes_on_ports([6274, 6277])
-            
-        # Launch the Inspector CLI
-        cmd = [
-            'npx', '@modelcontextprotocol/inspector', INSPECTOR_HTTP,
-            '--transport', 'streamable-http',
-            '--header', 'Accept:application/json, text/event-stream',
-            '--header', f'Authorization: Bearer {bearer_token}',
-            '--auth-url', AUTH_URL,
-            '--token-url', TOKEN_URL,
-            '--introspect', INTROSPECT_URL,
-            '--revocation', REVOKE_URL,
-            '--client-id', client_id,
-            '--redirect', REDIRECT_URI,
-        ]
-        if client_secret:
-            cmd += ['--client-secret', client_secret]
-
-        # Spawn the Inspector in its own session (so we can kill the whole group):
-        logger.info("Spawning Inspector CLI: %s", " ".join(cmd))
-        _inspector_proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            start_new_session=True  # <-- puts it into a new process group
-        )
-
-        # 2) Capture the MCP_PROXY_AUTH_TOKEN from the printed URL
-        proxy_token = None
-        token_re    = re.compile(r"MCP_PROXY_AUTH_TOKEN=([0-9a-f]+)")
-        for line in _inspector_proc.stdout:
-            logger.info("Inspector CLI: %s", line.rstrip())
-            m = token_re.search(line)
-            if m:
-                proxy_token = m.group(1)
-                logger.info("Captured MCP_PROXY_AUTH_TOKEN: %s", proxy_token)
-                break
-
-        if not proxy_token:
-            logger.error("Failed to capture MCP_PROXY_AUTH_TOKEN from Inspector CLI output")
-            return render(request, "mcp_error.html", {
-                "error": "Could not start Inspector (no proxy token)."
-            })
-
-        # 3) Render the “launched” page with that token embedded in the link
-        return render(request, "mcp_launched.html", {
-            "inspector_ui": INSPECTOR_UI,      # e.g. http://127.0.0.1:6274/
-            'bearer_token': bearer_token,
-            'proxy_token': proxy_token,
+        logger.info("Access token issued for client %s", client_id)
+
+        # The instance's requests to /mcp act with bearer_token from now on;
+        # the status page polls it until it is ready
+        supervisor.bind(instance_id, owner, bearer_token)
+        return redirect("mcp_inspector_status", instance_id=instance_id)
+
+    return render(request, 'mcp_launcher.html', {'form': MCPLauncherForm(), 'code_form': form})
+
+
+def _owner_key(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if request.session.session_key is None:
+        request.session.save()
+    return f"session:{request.session.session_key}"
+
+
+def mcp_inspector_status(request, instance_id):
+    """
+    Step 3: "starting" page that polls ``?format=json`` until the Inspector
+    printed its proxy token, then the launched page with the UI link.
+    """
+    supervisor = get_supervisor()
+    instance = supervisor.lookup(instance_id)
+    if instance is None or instance["owner"] != _owner_key(request):
+        if request.GET.get("format") == "json":
+            return JsonResponse({"state": "unknown"}, status=404)
+        return render(request, "mcp_error.html", {"error": "Inspector instance not found (it may have been reaped)."})
+
+    # Any worker can answer: the registry knows instances started elsewhere
+    supervisor.touch(instance_id)
+    if request.GET.get("format") == "json":
+        return JsonResponse(instance)
+    if instance["state"] in ("failed", "exited"):
+        return render(request, "mcp_error.html", {
+            "error": instance["error"] or "Inspector stopped.",
+            "output": instance.get("output", []),
         })
+    context = {"instance": instance}
+    if instance["state"] == "ready":
+        context.update({
+            "proxy_token": instance["proxy_token"],
+            "inspector_ui": f"http://127.0.0.1:{instance['ui_port']}/",
+            "inspector_link": inspector_ui_url(instance, serverUrl=INSPECTOR_HTTP, transport="streamable-http"),
+        })
+    return render(request, "mcp_launched.html", context)
+
+
+@staff_member_required
+def mcp_sessions(request):
+    """Live /mcp session counts and memory for the worker serving this request."""
+    from .sessions import session_table
+    return JsonResponse(session_table.stats())
 
+
+@staff_member_required
+def mcp_traces(request):
+    """Slowest traces kept by this worker's in-memory trace exporter (?trace=<id> for one)."""
+    from .tracing import rank, summarize, tracer
+    docs = list(getattr(tracer.exporter, "traces", ()))
+    trace_id = request.GET.get("trace")
+    if trace_id:
+        for doc in docs:
+            row = summarize(doc)
+            if row and row["trace_id"] == trace_id:
+                return JsonResponse(doc)
+        return JsonResponse({"error": "Unknown trace"}, status=404)
+    try:
+        top = int(request.GET.get("top", 20))
+    except ValueError:
+        return JsonResponse({"error": "top must be an integer"}, status=400)
+    top = min(max(top, 1), MAX_TRACES_SHOWN)
+    return JsonResponse({
+        "kept_total": tracer.kept_total,
+        "dropped_total": tracer.dropped_total,
+        "traces": rank(docs, top=top, name=request.GET.get("name")),
+    })